@@ -0,0 +1,190 @@
+"""
+Almacenes de estado: dónde viven las salas entre reinicios. El juego solo
+habla con la interfaz AlmacenEstado (cargar, precargar, guardar, archivar y
+los veredictos de validación), así que el mismo bucle de juego corre contra MySQL en Azure, contra un
+archivo SQLite local en modo WAL o totalmente en memoria.
+"""
+import json
+import os
+import time
+
+from database import db
+from persistencia import (a_nativo, archivar_salas, buscar_validaciones, cargar_sala, exportar_validaciones,
+                          guardar_salas, guardar_validaciones, instantes_actualizacion, precargar_salas)
+
+
+class AlmacenEstado:
+    """Interfaz común de los almacenes de salas"""
+    nombre = "base"
+
+    def cargar_sala(self, codigo):
+        """Datos de una sala, o None si no existe"""
+        raise NotImplementedError
+
+    def precargar(self, salas, modo="activas"):
+        """Carga en `salas` las salas de `modo`; devuelve los eventos reproducidos"""
+        raise NotImplementedError
+
+    def actualizaciones(self, codigos):
+        """{codigo: instante de su última escritura} de las salas guardadas"""
+        raise NotImplementedError
+
+    def guardar(self, salas, pendientes, parcial=False, modo="upsert", eventos=0):
+        """Escribe las salas pendientes en una transacción (ver guardar_salas)"""
+        raise NotImplementedError
+
+    def archivar(self, limite, excluir=()):
+        """Archiva las salas finalizadas antes de `limite`; devuelve sus códigos"""
+        raise NotImplementedError
+
+    def buscar_validaciones(self, claves):
+        """{clave: (veredicto, razón, confianza, fuente)} de las claves conocidas"""
+        raise NotImplementedError
+
+    def guardar_validaciones(self, registros, sobrescribir=False):
+        """Guarda veredictos {clave: registro} (ver persistencia.guardar_validaciones)"""
+        raise NotImplementedError
+
+    def exportar_validaciones(self):
+        """Todos los veredictos guardados, {clave: (veredicto, razón, confianza, fuente)}"""
+        raise NotImplementedError
+
+
+class AlmacenSQL(AlmacenEstado):
+    """Salas en la BD de Flask-SQLAlchemy: MySQL de Azure o un archivo SQLite"""
+
+    def __init__(self, app):
+        self.app = app
+        with app.app_context():
+            self.nombre = db.engine.dialect.name
+
+    def cargar_sala(self, codigo):
+        with self.app.app_context():
+            return cargar_sala(codigo)
+
+    def precargar(self, salas, modo="activas"):
+        with self.app.app_context():
+            return precargar_salas(salas, modo)
+
+    def actualizaciones(self, codigos):
+        with self.app.app_context():
+            return instantes_actualizacion(codigos)
+
+    def guardar(self, salas, pendientes, parcial=False, modo="upsert", eventos=0):
+        with self.app.app_context():
+            try:
+                return guardar_salas(salas, pendientes, parcial=parcial, modo=modo, eventos=eventos)
+            except Exception:
+                db.session.rollback()
+                raise
+
+    def archivar(self, limite, excluir=()):
+        archivadas = []
+        with self.app.app_context():
+            try:
+                while True:
+                    lote = archivar_salas(limite, excluir=excluir)
+                    archivadas.extend(lote)
+                    if len(lote) < 200:
+                        return archivadas
+            except Exception:
+                db.session.rollback()
+                raise
+
+    def buscar_validaciones(self, claves):
+        with self.app.app_context():
+            return buscar_validaciones(claves)
+
+    def guardar_validaciones(self, registros, sobrescribir=False):
+        with self.app.app_context():
+            try:
+                return guardar_validaciones(registros, sobrescribir=sobrescribir)
+            except Exception:
+                db.session.rollback()
+                raise
+
+    def exportar_validaciones(self):
+        with self.app.app_context():
+            return exportar_validaciones()
+
+
+class AlmacenMemoria(AlmacenEstado):
+    """
+    Salas solo en memoria del proceso (desarrollo local y benchmarks). Guarda
+    el JSON de cada sala para que, como en una BD, lo guardado sea una copia.
+    """
+    nombre = "memoria"
+
+    def __init__(self):
+        self.salas = {}
+        self.archivadas = {}
+        self.actualizadas = {}
+        self.validaciones = {}
+
+    def cargar_sala(self, codigo):
+        texto = self.salas.get(codigo) or self.archivadas.get(codigo)
+        return json.loads(texto) if texto else None
+
+    def precargar(self, salas, modo="activas"):
+        if modo == "ninguna":
+            return 0
+        for codigo, texto in self.salas.items():
+            datos = json.loads(texto)
+            if modo == "todas" or not datos.get("finalizada", False):
+                salas.cargar(codigo, datos)
+        return 0
+
+    def actualizaciones(self, codigos):
+        return {codigo: self.actualizadas[codigo] for codigo in codigos if codigo in self.actualizadas}
+
+    def guardar(self, salas, pendientes, parcial=False, modo="upsert", eventos=0):
+        ahora = time.time()
+        completas = 0
+        for codigo in pendientes:
+            datos_sala = dict.get(salas, codigo)
+            if datos_sala is None:
+                continue
+            self.salas[codigo] = json.dumps(a_nativo(datos_sala), separators=(",", ":"))
+            self.actualizadas[codigo] = ahora
+            completas += 1
+        return {"parciales": 0, "completas": completas, "bytes_parciales": 0, "eventos": 0}
+
+    def archivar(self, limite, excluir=()):
+        archivadas = []
+        for codigo, texto in list(self.salas.items()):
+            if codigo in excluir or self.actualizadas.get(codigo, 0) >= limite:
+                continue
+            if json.loads(texto).get("finalizada", False):
+                self.archivadas[codigo] = self.salas.pop(codigo)
+                self.actualizadas.pop(codigo, None)
+                archivadas.append(codigo)
+        return archivadas
+
+    def buscar_validaciones(self, claves):
+        return {clave: self.validaciones[clave] for clave in claves if clave in self.validaciones}
+
+    def guardar_validaciones(self, registros, sobrescribir=False):
+        for clave, registro in registros.items():
+            if sobrescribir or clave not in self.validaciones:
+                self.validaciones[clave] = tuple(registro)
+        return len(registros)
+
+    def exportar_validaciones(self):
+        return dict(self.validaciones)
+
+
+def uri_almacen(tipo):
+    """URI de SQLAlchemy para el almacén `tipo` ("mysql", "sqlite" o "memoria")"""
+    if tipo == "sqlite":
+        ruta = os.path.abspath(os.getenv("BASTA_SQLITE_RUTA", "basta_estado.db"))
+        return f"sqlite:///{ruta}"
+    if tipo == "memoria":
+        return "sqlite://"  # Flask-SQLAlchemy exige una URI aunque no se use
+    return os.getenv("AZURE_MYSQL_CONNECTIONSTRING")
+
+
+def crear_almacen(tipo, app):
+    """Almacén configurado por BASTA_ALMACEN; la app ya debe tener init_db hecho"""
+    if tipo == "memoria":
+        return AlmacenMemoria()
+    return AlmacenSQL(app)
@@ -1,14 +1,31 @@
 from gevent import monkey
 monkey.patch_all()
+import time
+_inicio_arranque = time.perf_counter()
 from flask import Flask, render_template, request, redirect, url_for, session, jsonify
 from flask_socketio import SocketIO, join_room, emit
-import random, string, json, os, threading, time, hashlib, hmac, base64, re, unicodedata
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import random, string, json, os, threading, time, hashlib, hmac, base64, re, unicodedata, atexit
+from concurrent.futures import wait, FIRST_COMPLETED
+from collections import deque
 from datetime import datetime, timedelta
 from functools import wraps
 import html
 
-from database import db, init_db, SalaDB
+from database import init_db
+from persistencia import SalasRastreadas, EscritorDiferido, ArchivadorSalas
+from almacen import crear_almacen, uri_almacen
+from instantanea import InstantaneaSalas
+from cache_validacion import CacheValidaciones
+from validacion_incremental import ValidadorIncremental
+from ejecutor_ia import EjecutorIA, PRIORIDAD_PUNTUACION, PRIORIDAD_INTERACTIVA, PRIORIDAD_FONDO
+from cliente_ia import ClienteIAProtegido, CircuitoIAAbierto, LimiteIAExcedido
+from enrutador_ia import EnrutadorModelos
+from vuelos_ia import LlamadasEnCurso
+from lexico import LexicoCategorias, normalizar_lexico, nombre_archivo_categoria
+from clasificador import RUTA_MODELO, cargar_clasificador
+from prompts_validacion import (generar_prompt_validacion, generar_prompt_validacion_lote, generar_prompt_compacto,
+                                generar_prompt_compacto_lote, SYSTEM_PROMPT_COMPACTO, FORMATO_COMPACTO,
+                                FORMATO_COMPACTO_LOTE)
 
 # Importar OpenAI para validación con IA
 try:
@@ -45,15 +62,53 @@ except Exception as e:
     openai_client = None
     print(f"⚠️ Error general configurando IA: {e}")
 
+# Todas las llamadas a la IA pasan por un único ejecutor con límite de concurrencia
+ejecutor_ia = EjecutorIA(concurrencia=int(os.getenv("BASTA_IA_CONCURRENCIA", "48")))
+
+# Límite de peticiones/tokens por minuto de la cuenta y cortacircuitos: si la
+# API falla o va lenta, se deja de llamar un rato y se valida en local
+if openai_client:
+    openai_client = ClienteIAProtegido(
+        openai_client,
+        rpm=int(os.getenv("BASTA_IA_RPM", "500")),
+        tpm=int(os.getenv("BASTA_IA_TPM", "200000")),
+        fallos_seguidos=int(os.getenv("BASTA_IA_FALLOS_SEGUIDOS", "5")),
+        latencia_max=float(os.getenv("BASTA_IA_LATENCIA_MAX_S", "5")),
+        lentas_seguidas=int(os.getenv("BASTA_IA_LENTAS_SEGUIDAS", "3")),
+        enfriamiento=float(os.getenv("BASTA_IA_ENFRIAMIENTO_S", "30")),
+        espera_max=float(os.getenv("BASTA_IA_ESPERA_MAX_S", "10")),
+    )
+
+
+# Qué modelo atiende cada petición: el rápido primero, el fuerte solo para
+# veredictos con poca confianza y apelaciones
+enrutador_ia = EnrutadorModelos(
+    rapido=os.getenv("BASTA_MODELO_RAPIDO", "gpt-4o-mini"),
+    fuerte=os.getenv("BASTA_MODELO_FUERTE", "gpt-4o"),
+    umbral_escalado=float(os.getenv("BASTA_UMBRAL_ESCALADO", "0.75")),
+    moderacion=os.getenv("BASTA_MODELO_MODERACION", "gpt-3.5-turbo"),
+)
+
+
+def ia_disponible():
+    """True si hay cliente de IA y el cortacircuitos deja llamarlo ahora mismo"""
+    if not OPENAI_AVAILABLE or not openai_client:
+        return False
+    return not isinstance(openai_client, ClienteIAProtegido) or openai_client.disponible()
+
 
 # ==========================================================
 # CONFIGURACIÓN BASE
 # ==========================================================
 app = Flask(__name__)
 app.secret_key = "basta_secret_2025"
-app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('AZURE_MYSQL_CONNECTIONSTRING')
+# Dónde se guardan las salas: "mysql" (Azure, AZURE_MYSQL_CONNECTIONSTRING),
+# "sqlite" (archivo local en modo WAL, BASTA_SQLITE_RUTA) o "memoria"
+ALMACEN_ESTADO = os.getenv("BASTA_ALMACEN", "mysql")
+app.config['SQLALCHEMY_DATABASE_URI'] = uri_almacen(ALMACEN_ESTADO)
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 init_db(app)
+almacen = crear_almacen(ALMACEN_ESTADO, app)
 socketio = SocketIO(app, cors_allowed_origins="*")
 timers_activos = {}
 iniciando_partida = set()
@@ -65,7 +120,7 @@ player_id_to_sid = {}  # Mapeo de player ID a socket IDs (un jugador puede tener
 player_id_counter = 0  # Contador para generar IDs únicos
 admin_sockets = set()  # Sockets de administradores conectados
 
-state = {"salas": {}}
+state = {"salas": SalasRastreadas()}
 
 # ==========================================================
 # SISTEMA DE LOGS PARA ADMIN
@@ -293,37 +348,116 @@ MODOS_JUEGO = {
 # ==========================================================
 # FUNCIONES AUXILIARES
 # ==========================================================
-def load_state():
-    """Carga el estado desde la base de datos MySQL"""
+# Salas que se cargan al arrancar: "activas" (no finalizadas), "ninguna" o "todas".
+# El resto se hidrata desde la BD la primera vez que alguien las consulta.
+PRECARGA_SALAS = os.getenv("BASTA_PRECARGA_SALAS", "activas")
+
+# Registro de eventos: cada cambio de una sala se añade como una lista compacta de
+# operaciones y cada EVENTOS_POR_SNAPSHOT eventos se guarda la sala completa.
+# Recuperar una sala = snapshot + reproducir como mucho ese número de eventos.
+EVENTOS_SALAS = os.getenv("BASTA_EVENTOS_SALAS", "1") == "1"
+EVENTOS_POR_SNAPSHOT = int(os.getenv("BASTA_EVENTOS_SNAPSHOT", "50")) if EVENTOS_SALAS else 0
+ultima_carga = {}
+
+# Instantánea local de las salas en memoria: al reiniciar se arranca desde ella
+# (sin esperar a la BD) y luego se reconcilia con el almacén en segundo plano
+INSTANTANEA_SALAS = os.getenv("BASTA_INSTANTANEA", "1") == "1"
+instantanea_salas = InstantaneaSalas(
+    os.getenv("BASTA_INSTANTANEA_RUTA", "salas_instantanea.bin"),
+    lambda: state["salas"],
+    almacen,
+    intervalo=int(os.getenv("BASTA_INSTANTANEA_INTERVALO_S", "15")),
+    edad_max=int(os.getenv("BASTA_INSTANTANEA_EDAD_MAX_S", "900")),
+)
+
+def recuperar_sala(codigo):
+    """Recupera una sala de la BD cuando no está en memoria (hidratación bajo demanda)"""
     try:
-        salas_db = SalaDB.query.all()
-        state = {"salas": {}}
-        for sala_db in salas_db:
-            if sala_db.datos:
-                state["salas"][sala_db.codigo] = sala_db.datos
-        return state
+        # Recién arrancados, las salas se sirven desde la instantánea local hasta reconciliarla
+        datos = instantanea_salas.datos(codigo) if INSTANTANEA_SALAS else None
+        if datos is None:
+            datos = almacen.cargar_sala(codigo)
+        if datos:
+            print(f"🔄 Sala {codigo} recuperada de BD")
+        return datos
     except Exception as e:
-        print(f"Error cargando estado desde BD: {e}")
-        return {"salas": {}}
+        print(f"Error recuperando sala {codigo} desde BD: {e}")
+        return None
+
+def load_state(usar_instantanea=True):
+    """
+    Carga el estado desde el almacén (solo las salas de PRECARGA_SALAS), o
+    desde la instantánea local si está activa y usar_instantanea es True
+    """
+    inicio = time.perf_counter()
+    salas = SalasRastreadas(cargador=recuperar_sala, rutas=EVENTOS_SALAS)
+    eventos = 0
+    origen = almacen.nombre
+    en_instantanea = instantanea_salas.cargar() if INSTANTANEA_SALAS and usar_instantanea else None
+    if en_instantanea is not None:
+        # Se sirven bajo demanda desde el archivo; la reconciliación las deja en memoria
+        origen = f"la instantánea local ({en_instantanea} disponibles bajo demanda)"
+        instantanea_salas.reconciliar_en_segundo_plano(salas, PRECARGA_SALAS)
+    else:
+        try:
+            eventos = almacen.precargar(salas, PRECARGA_SALAS)
+        except Exception as e:
+            print(f"Error cargando estado desde BD: {e}")
+    duracion_ms = (time.perf_counter() - inicio) * 1000
+    ultima_carga.update(salas=len(salas), origen=origen, eventos_reproducidos=eventos, duracion_ms=round(duracion_ms, 2))
+    print(f"📂 {len(salas)} salas precargadas de {origen} (modo '{PRECARGA_SALAS}', {eventos} eventos reproducidos) en {duracion_ms:.0f} ms")
+    return {"salas": salas}
 
 # Cargamos el estado al iniciar
-with app.app_context():
-    state = load_state()
+state = load_state()
+
+# Escritor en segundo plano: agrupa las modificaciones de cada sala dentro de
+# una ventana corta y las confirma en una sola transacción
+ESCRITURA_DIFERIDA = os.getenv("BASTA_ESCRITURA_DIFERIDA", "1") == "1"
+escritor_salas = EscritorDiferido(
+    almacen,
+    lambda: state["salas"],
+    intervalo=int(os.getenv("BASTA_ESCRITURA_INTERVALO_MS", "200")) / 1000,
+    max_pendientes=int(os.getenv("BASTA_ESCRITURA_MAX_PENDIENTES", "500")),
+    # Enviar solo las claves de la sala que cambiaron (JSON_SET) en vez del documento entero.
+    # Opcional: solo se aplica con BASTA_EVENTOS_SALAS=0 y BASTA_CODEC_SALAS=json
+    parcial=os.getenv("BASTA_ESCRITURA_PARCIAL", "1") == "1",
+    # "upsert": un solo INSERT ... ON DUPLICATE KEY UPDATE por descarga; "orm": SELECT + UPDATE por sala
+    modo=os.getenv("BASTA_ESCRITURA_MODO", "upsert"),
+    eventos=EVENTOS_POR_SNAPSHOT,
+)
+if ESCRITURA_DIFERIDA:
+    escritor_salas.iniciar()
 
 def save_state(state):
-    """Guarda el estado en la base de datos MySQL usando upsert"""
-    try:
-        for codigo, datos_sala in state.get("salas", {}).items():
-            sala_existente = SalaDB.query.get(codigo)
-            if sala_existente:
-                sala_existente.datos = datos_sala
-            else:
-                nueva_sala = SalaDB(codigo=codigo, datos=datos_sala)
-                db.session.add(nueva_sala)
-        db.session.commit()
-    except Exception as e:
-        print(f"Error guardando estado en BD: {e}")
-        db.session.rollback()
+    """Registra que hubo cambios; el escritor guarda solo las salas modificadas"""
+    if ESCRITURA_DIFERIDA:
+        escritor_salas.notificar()
+    else:
+        escritor_salas.descargar()
+
+def flush_state():
+    """Guarda de inmediato todas las salas pendientes (puntos críticos)"""
+    escritor_salas.descargar()
+
+atexit.register(flush_state)
+
+# Las salas finalizadas pasan al archivo (comprimidas) tras el periodo de gracia
+# y salen de memoria; /recreate_room y el panel de admin las recuperan bajo demanda
+ARCHIVO_SALAS = os.getenv("BASTA_ARCHIVO_SALAS", "1") == "1"
+archivador_salas = ArchivadorSalas(
+    almacen,
+    lambda: state["salas"],
+    escritor_salas,
+    gracia=int(os.getenv("BASTA_ARCHIVO_GRACIA_MIN", "30")) * 60,
+    intervalo=int(os.getenv("BASTA_ARCHIVO_INTERVALO_S", "300")),
+)
+if ARCHIVO_SALAS:
+    archivador_salas.iniciar()
+
+if INSTANTANEA_SALAS:
+    instantanea_salas.iniciar()
+    atexit.register(instantanea_salas.escribir)
 
 
 def generar_codigo():
@@ -369,12 +503,12 @@ def validar_nombre(nombre):
     
     return True, "OK"
 
-def moderar_mensaje_con_ia(mensaje):
+def moderar_mensaje_con_ia(mensaje, sala=""):
     """
     Usa IA para detectar contenido inapropiado en mensajes de chat
     Returns: (es_apropiado, razon, mensaje_censurado)
     """
-    if not OPENAI_AVAILABLE or not openai_client:
+    if not ia_disponible():
         return None, None, None  # Fallback a método tradicional
     
     try:
@@ -398,8 +532,10 @@ Si no es apropiado, censura las palabras problemáticas con asteriscos del mismo
 IMPORTANTE: Solo marca como inapropiado si REALMENTE contiene contenido problemático. 
 Mensajes normales de conversación, emojis, saludos, etc. son apropiados."""
 
-        response = openai_client.chat.completions.create(
-            model="gpt-3.5-turbo",
+        response = ejecutor_ia.ejecutar(
+            openai_client.chat.completions.create,
+            sala=sala,
+            model=enrutador_ia.moderacion,
             messages=[
                 {"role": "system", "content": "Eres un moderador de chat para un juego familiar. Debes ser estricto con groserías e insultos pero permisivo con conversación normal."},
                 {"role": "user", "content": prompt}
@@ -463,7 +599,7 @@ def filtrar_mensaje_chat(mensaje, sala=None, codigo_sala=""):
     contiene_groseria = False
     mensaje_censurado = mensaje_limpio # Usamos el mensaje ya sanitizado
     
-    es_apropiado_ia, razon_ia, censurado_ia = moderar_mensaje_con_ia(mensaje_limpio)
+    es_apropiado_ia, razon_ia, censurado_ia = moderar_mensaje_con_ia(mensaje_limpio, codigo_sala)
     
     if es_apropiado_ia is not None:
         if not es_apropiado_ia:
@@ -580,413 +716,6 @@ def seleccionar_letra_aleatoria(sala):
     
     return letra_seleccionada
 
-# ========================================================== 
-# GENERAR PROMPT MEJORADO PARA VALIDACIÓN 
-# ========================================================== 
-def generar_prompt_validacion(respuesta, categoria, letra):
-    """
-    Genera un prompt mejorado para validación IA con reglas específicas según la categoría
-    """
-    categoria_lower = categoria.lower()
-    
-    # Determinar artículo
-    categorias_femeninas = [
-        "fruta", "profesión", "canción", "marca", "comida", "película", 
-        "serie", "universidad", "empresa", "ciudad"
-    ]
-    articulo = "una" if any(palabra in categoria_lower for palabra in categorias_femeninas) else "un"
-    
-    # ========================================================== 
-    # DEFINICIONES ESTRICTAS POR CATEGORÍA
-    # ========================================================== 
-    definiciones = {
-        # BÁSICAS
-        "nombre": {
-            "definicion": "nombre propio de PERSONA (nombre de pila) real y usado en algún idioma",
-            "ejemplos_si": ["Roberto", "María", "Alejandro", "Sofía", "Ahmed", "Yuki"],
-            "ejemplos_no": [
-                ("Radio", "es un objeto, no nombre de persona"),
-                ("Río", "es un cuerpo de agua"),
-                ("Rápido", "es un adjetivo"),
-                ("Rugido", "es un sonido"),
-            ],
-            "requiere_existencia": False,
-            "reglas_extra": "Debe ser un nombre que personas reales usen.  NO aceptar objetos, lugares, adjetivos o verbos."
-        },
-        "animal": {
-            "definicion": "animal real que existe o existió (incluye extintos como dinosaurios)",
-            "ejemplos_si": ["Rinoceronte", "Rana", "Rata", "Tiburón", "Tiranosaurio"],
-            "ejemplos_no": [
-                ("Río", "es un cuerpo de agua"),
-                ("Reloj", "es un objeto"),
-                ("Rascacielos", "es un edificio"),
-                ("Dragón", "es un animal mitológico/ficticio"),
-                ("Unicornio", "es un animal ficticio"),
-            ],
-            "requiere_existencia": True,
-            "reglas_extra": "Debe ser un animal REAL.  NO aceptar animales mitológicos o ficticios (dragones, unicornios, etc.) a menos que existan en la realidad."
-        },
-        "país o ciudad": {
-            "definicion": "país reconocido internacionalmente O ciudad real que existe",
-            "ejemplos_si": ["Brasil", "Roma", "Tokio", "Argentina", "Rabat"],
-            "ejemplos_no": [
-                ("Manzana", "es una fruta"),
-                ("Río", "solo es un cuerpo de agua, 'Río de Janeiro' sí sería válido"),
-                ("Atlantida", "es una ciudad mitológica"),
-                ("NONDON", "mal escrito, sería 'Londres'"),
-                ("Perro", "es un animal"),
-            ],
-            "requiere_existencia": True,
-            "reglas_extra": "Debe ser un lugar REAL y existente.  Nombres deben estar correctamente escritos."
-        },
-        "fruta": {
-            "definicion": "fruta real comestible que existe botánicamente",
-            "ejemplos_si": ["Manzana", "Rambután", "Frambuesa", "Toronja", "Tamarindo"],
-            "ejemplos_no": [
-                ("Rascacielos", "es un edificio"),
-                ("Brasil", "es un país"),
-                ("Rosa", "es una flor, no una fruta"),
-                ("Tomate", "botánicamente es fruta pero se acepta"),
-                ("Rugido", "es un sonido"),
-            ],
-            "requiere_existencia": True,
-            "reglas_extra": "Debe ser una fruta REAL.  El tomate técnicamente es fruta y se acepta."
-        },
-        "objeto": {
-            "definicion": "objeto físico inanimado, fabricado o creado por humanos",
-            "ejemplos_si": ["Reloj", "Radio", "Televisor", "Silla", "Teléfono", "Raqueta"],
-            "ejemplos_no": [
-                ("Rinoceronte", "es un animal"),
-                ("Río", "es un elemento natural, no fabricado"),
-                ("Rugido", "es un sonido, no un objeto físico"),
-                ("Nariz", "es una parte del cuerpo"),
-                ("Árbol", "es un ser vivo natural"),
-            ],
-            "requiere_existencia": False,
-            "reglas_extra": "Debe ser algo FABRICADO/CREADO por humanos. NO partes del cuerpo, animales, plantas o elementos naturales."
-        },
-        "color": {
-            "definicion": "color real y reconocible (incluye tonalidades)",
-            "ejemplos_si": ["Rojo", "Rosa", "Rubí", "Turquesa", "Terracota", "Índigo"],
-            "ejemplos_no": [
-                ("Rugido", "es un sonido"),
-                ("Río", "es un cuerpo de agua"),
-                ("Rápido", "es un adjetivo de velocidad"),
-                ("Reloj", "es un objeto"),
-            ],
-            "requiere_existencia": False,
-            "reglas_extra": "Debe ser un color reconocido. Se aceptan tonalidades y colores menos comunes si son reales."
-        },
-        
-        # INTERMEDIAS
-        "profesión": {
-            "definicion": "profesión, oficio o trabajo real que personas ejercen",
-            "ejemplos_si": ["Médico", "Profesor", "Piloto", "Taxista", "Tornero", "Reportero"],
-            "ejemplos_no": [
-                ("Mago", "si es de fantasía no, si es ilusionista sí"),
-                ("Dragón", "es un animal ficticio"),
-                ("Teléfono", "es un objeto"),
-                ("Corredor", "depende del contexto - si es atleta sí"),
-            ],
-            "requiere_existencia": False,
-            "reglas_extra": "Debe ser un trabajo REAL que personas ejercen en la vida real."
-        },
-        "canción": {
-            "definicion": "canción real que existe, con título oficial correcto",
-            "ejemplos_si": ["Thriller", "Bohemian Rhapsody", "Despacito", "Toxic", "Titanium"],
-            "ejemplos_no": [
-                ("La Canción Bonita", "título genérico, verificar si existe"),
-                ("Música Alegre", "no es un título real"),
-                ("Song 12345", "inventado"),
-            ],
-            "requiere_existencia": True,
-            "reglas_extra": "DEBE ser una canción REAL y conocida. El título debe ser el oficial o muy reconocible."
-        },
-        "artista musical": {
-            "definicion": "cantante, banda o grupo musical REAL y verificable",
-            "ejemplos_si": ["Tito Doble P", "Taylor Swift", "The Beatles", "Thalía", "Timbiriche", "Twenty One Pilots"],
-            "ejemplos_no": [
-                ("Los Musicales", "banda inventada"),
-                ("DJ Fantasma", "nombre inventado"),
-                ("The Super Band", "no existe"),
-                ("Cantante Famoso", "no es un nombre de artista"),
-            ],
-            "requiere_existencia": True,
-            "reglas_extra": """CRÍTICO: El artista DEBE existir realmente. 
-- La CAPITALIZACIÓN NO IMPORTA ('Tito Doble P' = 'tito doble p' = 'TITO DOBLE P')
-- Verificar que sea un artista/banda REAL y conocido
-- Aceptar nombres artísticos en cualquier idioma"""
-        },
-        "videojuego": {
-            "definicion": "videojuego REAL con título oficial correcto que existe o existió",
-            "ejemplos_si": ["Tetris", "Tekken", "Tomb Raider", "Terraria", "The Last of Us", "Titanfall"],
-            "ejemplos_no": [
-                ("Trilogy GTA", "título incorrecto, sería 'GTA: The Trilogy'"),
-                ("Super Mario 3000", "no existe"),
-                ("Call of Duty Zombies War", "título inventado"),
-                ("FIFA 2099", "no existe"),
-                ("Zelda Adventures", "título incorrecto"),
-            ],
-            "requiere_existencia": True,
-            "reglas_extra": """CRÍTICO: DEBE ser el título OFICIAL o abreviación reconocida.
-- NO aceptar títulos con palabras en orden incorrecto
-- NO aceptar variaciones inventadas de juegos reales
-- 'GTA V' es válido, 'Trilogy GTA' NO es válido"""
-        },
-        "marca": {
-            "definicion": "marca comercial REAL y conocida que existe o existió",
-            "ejemplos_si": ["Toyota", "Tesla", "Target", "Tiffany", "TikTok", "Twitch"],
-            "ejemplos_no": [
-                ("Marcas Buenas", "no es una marca"),
-                ("Super Tienda", "nombre genérico"),
-                ("TechnoMax", "verificar si existe"),
-            ],
-            "requiere_existencia": True,
-            "reglas_extra": "Debe ser una marca REAL y reconocible a nivel nacional o internacional."
-        },
-        "comida": {
-            "definicion": "platillo, alimento o comida real (preparada o ingrediente)",
-            "ejemplos_si": ["Tacos", "Tiramisu", "Tortilla", "Tofu", "Tallarines", "Ternera"],
-            "ejemplos_no": [
-                ("Brasil", "es un país"),
-                ("Teléfono", "es un objeto"),
-                ("Tigre", "es un animal, no comida"),
-            ],
-            "requiere_existencia": True,
-            "reglas_extra": "Debe ser algo que se COME.  Incluye platillos, ingredientes, snacks, etc."
-        },
-        "película": {
-            "definicion": "película cinematográfica REAL con título oficial correcto",
-            "ejemplos_si": ["Titanic", "Toy Story", "Thor", "Transformers", "Trolls"],
-            "ejemplos_no": [
-                ("The Movie", "título genérico"),
-                ("Película de Acción", "no es un título"),
-                ("Avengers 10", "no existe"),
-                ("Zootopia Adventures", "no existe"),
-            ],
-            "requiere_existencia": True,
-            "reglas_extra": "DEBE ser una película REAL.  Usar título oficial en cualquier idioma."
-        },
-        "serie de tv": {
-            "definicion": "serie de televisión o streaming REAL que existe o existió",
-            "ejemplos_si": ["The Office", "True Detective", "The Crown", "Tuca & Bertie", "Ted Lasso"],
-            "ejemplos_no": [
-                ("Zootopia Adventures", "no existe, Zootopia es película"),
-                ("The Series", "título genérico"),
-                ("Netflix Show", "no es un título"),
-                ("Breaking Good", "no existe"),
-            ],
-            "requiere_existencia": True,
-            "reglas_extra": "DEBE ser una serie REAL de TV o streaming. NO confundir películas con series."
-        },
-        
-        # DIFÍCILES
-        "monumento": {
-            "definicion": "monumento, edificio histórico o lugar emblemático REAL",
-            "ejemplos_si": ["Torre Eiffel", "Taj Mahal", "Torre de Pisa", "Teotihuacán", "Teatro Colón"],
-            "ejemplos_no": [
-                ("Brasil", "es un país, no un monumento"),
-                ("Edificio Alto", "nombre genérico"),
-                ("La Torre", "muy genérico"),
-            ],
-            "requiere_existencia": True,
-            "reglas_extra": "Debe ser un monumento o lugar histórico REAL y reconocible."
-        },
-        "libro": {
-            "definicion": "libro REAL con título oficial correcto",
-            "ejemplos_si": ["Twilight", "The Hobbit", "To Kill a Mockingbird", "1984", "The Great Gatsby"],
-            "ejemplos_no": [
-                ("El Libro Bueno", "título genérico"),
-                ("Harry Potter 20", "no existe"),
-                ("The Story", "muy genérico"),
-            ],
-            "requiere_existencia": True,
-            "reglas_extra": "DEBE ser un libro REAL publicado.  Usar título oficial."
-        },
-        "deporte": {
-            "definicion": "deporte o actividad deportiva REAL reconocida",
-            "ejemplos_si": ["Tenis", "Taekwondo", "Triatlón", "Tiro con arco", "Tubing"],
-            "ejemplos_no": [
-                ("Correr Rápido", "es una acción, no un deporte con nombre"),
-                ("Jugar", "muy genérico"),
-                ("Quidditch", "es ficticio de Harry Potter"),
-            ],
-            "requiere_existencia": True,
-            "reglas_extra": "Debe ser un deporte REAL y reconocido oficialmente."
-        },
-        "evento histórico": {
-            "definicion": "evento histórico REAL documentado que ocurrió",
-            "ejemplos_si": ["Tratado de Versalles", "Terremoto de 1985", "Toma de la Bastilla", "Titanic hundimiento"],
-            "ejemplos_no": [
-                ("La Guerra", "muy genérico"),
-                ("Evento Importante", "no es específico"),
-                ("Batalla de los Dioses", "ficticio"),
-            ],
-            "requiere_existencia": True,
-            "reglas_extra": "DEBE ser un evento REAL de la historia.  Debe ser verificable y documentado."
-        },
-        "empresa": {
-            "definicion": "empresa o compañía REAL que existe o existió",
-            "ejemplos_si": ["Tesla", "Toyota", "Twitter", "TikTok", "Telmex", "Televisa"],
-            "ejemplos_no": [
-                ("Empresa Grande", "nombre genérico"),
-                ("Tech Company", "no es un nombre real"),
-                ("Super Corp", "verificar si existe"),
-            ],
-            "requiere_existencia": True,
-            "reglas_extra": "DEBE ser una empresa REAL. Similar a marca pero más enfocado en compañías."
-        },
-        "personaje famoso": {
-            "definicion": "persona famosa REAL (celebridad, histórico, deportista, etc.)",
-            "ejemplos_si": ["Taylor Swift", "Tom Hanks", "Teresa de Calcuta", "Thatcher Margaret", "Tupac"],
-            "ejemplos_no": [
-                ("Tony Stark", "es un personaje ficticio de Marvel"),
-                ("El Famoso", "no es un nombre"),
-                ("Persona Conocida", "no es específico"),
-            ],
-            "requiere_existencia": True,
-            "reglas_extra": "DEBE ser una persona REAL famosa. NO personajes de ficción."
-        },
-        "universidad": {
-            "definicion": "universidad o institución educativa superior REAL",
-            "ejemplos_si": ["UNAM", "Universidad de Tokio", "Trinity College", "Tecnológico de Monterrey", "UCLA"],
-            "ejemplos_no": [
-                ("Universidad Grande", "nombre genérico"),
-                ("Escuela de Magia", "ficticia"),
-                ("Hogwarts", "ficticia de Harry Potter"),
-            ],
-            "requiere_existencia": True,
-            "reglas_extra": "DEBE ser una universidad REAL que existe o existió."
-        },
-        "instrumento musical": {
-            "definicion": "instrumento musical REAL",
-            "ejemplos_si": ["Trompeta", "Tambor", "Triángulo", "Tuba", "Theremin", "Timbal"],
-            "ejemplos_no": [
-                ("Música", "no es un instrumento"),
-                ("Sonido", "no es un instrumento"),
-                ("El Instrumento", "muy genérico"),
-            ],
-            "requiere_existencia": True,
-            "reglas_extra": "Debe ser un instrumento REAL que se use para hacer música."
-        },
-        "superhéroe": {
-            "definicion": "superhéroe o superheroína de cómics, películas o series CONOCIDO",
-            "ejemplos_si": ["Thor", "Thanos", "Thing (La Cosa)", "Tigra", "Teen Titans"],
-            "ejemplos_no": [
-                ("Super Hombre Volador", "nombre inventado"),
-                ("El Héroe", "muy genérico"),
-                ("Captain Fantastico", "verificar si existe"),
-            ],
-            "requiere_existencia": True,
-            "reglas_extra": "DEBE ser un superhéroe REAL de cómics/películas/series conocidas (Marvel, DC, etc.).  NO inventados."
-        },
-    }
-    
-    # ========================================================== 
-    # OBTENER INFORMACIÓN DE LA CATEGORÍA
-    # ========================================================== 
-    
-    # Buscar la categoría en las definiciones
-    info_categoria = None
-    for key, value in definiciones.items():
-        if key in categoria_lower:
-            info_categoria = value
-            break
-    
-    # Si no se encuentra, usar definición genérica
-    if not info_categoria:
-        info_categoria = {
-            "definicion": f"{categoria} real y reconocible",
-            "ejemplos_si": [],
-            "ejemplos_no": [],
-            "requiere_existencia": True,
-            "reglas_extra": "Debe ser real y verificable."
-        }
-    
-    # Formatear ejemplos
-    ejemplos_validos = ""
-    if info_categoria["ejemplos_si"]:
-        ejemplos_validos = "EJEMPLOS VÁLIDOS (SI): " + ", ".join(info_categoria["ejemplos_si"])
-    
-    ejemplos_invalidos = ""
-    if info_categoria["ejemplos_no"]:
-        ejemplos_invalidos = "EJEMPLOS INVÁLIDOS (NO):\n"
-        for ej, razon in info_categoria["ejemplos_no"]:
-            ejemplos_invalidos += f'   - "{ej}" → NO ({razon})\n'
-    
-    verificacion_existencia = ""
-    if info_categoria["requiere_existencia"]:
-        verificacion_existencia = f"""
-⚠️ VERIFICACIÓN DE EXISTENCIA (CRÍTICO):
-- "{respuesta}" DEBE EXISTIR en la realidad
-- Si NO reconoces que existe o tienes dudas → responde NO
-- NO aceptar nombres/títulos inventados, modificados o mal escritos
-- Si parece inventado o no lo puedes verificar → NO"""
-    
-    # ========================================================== 
-    # CONSTRUIR PROMPT FINAL
-    # ========================================================== 
-    
-    prompt = f"""Eres un validador ESTRICTO del juego "BASTA/Stop". 
-
-══════════════════════════════════════════════════════════
-PREGUNTA: ¿"{respuesta}" es {articulo} {categoria} válido/a que empieza con "{letra}"? 
-══════════════════════════════════════════════════════════
-
-DEFINICIÓN DE "{categoria. upper()}": {info_categoria["definicion"]}
-
-{info_categoria["reglas_extra"]}
-
-══════════════════════════════════════════════════════════
-PROCESO DE VALIDACIÓN (sigue TODOS los pasos en orden):
-══════════════════════════════════════════════════════════
-
-PASO 1 - ¿ES UNA PALABRA/NOMBRE VÁLIDO Y BIEN ESCRITO?
-- ¿Está correctamente escrita sin errores ortográficos?
-- La CAPITALIZACIÓN NO IMPORTA (ignorar mayúsculas/minúsculas)
-- RECHAZA INMEDIATAMENTE si:
-  * Parece inventada o sin sentido: "Sasd", "asdas", "Xyzabc"
-  * Está mal escrita: "NONDON" (sería Londres), "Mécsico" (sería México)  
-  * Es combinación sin sentido: "Nohay", "NOse", "Nomanches"
-  * Tiene letras repetidas excesivas: "Holaaaaaa", "Siiiii"
-
-PASO 2 - ¿CORRESPONDE A LA CATEGORÍA "{categoria. upper()}"?
-- "{respuesta}" DEBE ser específicamente: {info_categoria["definicion"]}
-- NO debe ser otra cosa (país cuando piden fruta, objeto cuando piden animal, etc.)
-- Si es claramente OTRA categoría → NO
-{verificacion_existencia}
-
-PASO 3 - ¿EMPIEZA CON LA LETRA "{letra. upper()}"?
-- La primera letra (ignorando acentos) debe ser "{letra.upper()}"
-- Acentos no afectan: "Ángel" empieza con A, "Élefante" empieza con E
-
-══════════════════════════════════════════════════════════
-EJEMPLOS PARA "{categoria.upper()}":
-══════════════════════════════════════════════════════════
-{ejemplos_validos}
-
-{ejemplos_invalidos}
-
-══════════════════════════════════════════════════════════
-POLÍTICA: MUY ESTRICTO - ANTE LA DUDA, RECHAZAR
-══════════════════════════════════════════════════════════
-- Si no estás 100% seguro de que existe → NO
-- Si el nombre/título parece modificado o incorrecto → NO
-- Si no reconoces que es real → NO
-- Si hay CUALQUIER duda → NO
-- Es mejor rechazar 10 dudosas que aceptar 1 incorrecta
-
-══════════════════════════════════════════════════════════
-RESPUESTA REQUERIDA:
-══════════════════════════════════════════════════════════
-Responde ÚNICAMENTE en este formato:
-"SI - [razón breve]" o "NO - [razón breve]"
-"""
-    
-    return prompt
-
-
-
 
 # ==========================================================
 # VALIDACIÓN CON IA (OpenAI) - MEJORADA
@@ -1099,9 +828,501 @@ def validacion_previa_basica(respuesta, categoria, letra):
     return False, ""
 
 
-def validar_respuesta_con_ia(respuesta, categoria, letra):
+# Veredictos de la IA compartidos entre salas y rondas (LRU con caducidad)
+cache_validaciones_ia = CacheValidaciones(
+    capacidad=int(os.getenv("BASTA_CACHE_VALIDACION_MAX", "20000")),
+    ttl=int(os.getenv("BASTA_CACHE_VALIDACION_TTL_H", "24")) * 3600,
+)
+
+def clave_validacion(respuesta, categoria, letra):
+    """Clave de caché: sin acentos ni mayúsculas, para que 'Rána' y 'rana' coincidan"""
+    texto = " ".join(normalizar_texto(respuesta).lower().split())
+    return (normalizar_texto(categoria).lower(), letra.upper(), texto)
+
+# Llamadas a la IA en curso: las salas que piden a la vez lo mismo (la misma
+# validación o la misma pista) esperan una sola llamada en vez de repetirla
+vuelos_ia = LlamadasEnCurso(
+    espera_max=float(os.getenv("BASTA_LLAMADAS_COMPARTIDAS_ESPERA", "30")),
+    activo=os.getenv("BASTA_LLAMADAS_COMPARTIDAS", "1") == "1",
+)
+
+# Léxico local: palabras conocidas de cada categoría (data/lexico) que se dan
+# por válidas sin preguntar a la IA
+LEXICO_LOCAL = os.getenv("BASTA_LEXICO", "1") == "1"
+lexico_local = LexicoCategorias(os.getenv(
+    "BASTA_LEXICO_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "lexico")
+))
+VEREDICTO_LEXICO = (True, "Palabra conocida (léxico local)", 0.98)
+
+def veredicto_lexico(respuesta, categoria):
+    """VEREDICTO_LEXICO si la respuesta está en el léxico de su categoría, si no None"""
+    if LEXICO_LOCAL and lexico_local.contiene(categoria, respuesta):
+        return VEREDICTO_LEXICO
+    return None
+
+# Corrección ortográfica local: una respuesta a 1-2 letras de una palabra del
+# léxico se rechaza si es un error evidente, y si no la IA recibe la pista
+CORRECCION_LOCAL = os.getenv("BASTA_CORRECCION_LOCAL", "1") == "1"
+# Categorías con demasiadas grafías válidas (Marina/Mariana, Rosalía/Rosario) para rechazar en local
+CATEGORIAS_SIN_RECHAZO_ORTOGRAFICO = {"nombre"}
+metricas_correccion = {"rechazadas": 0, "pistas_ia": 0}
+
+def sugerencia_lexico(respuesta, categoria):
+    """(palabra del léxico más parecida, distancia) si está a 1-2 letras, o None"""
+    if not (LEXICO_LOCAL and CORRECCION_LOCAL):
+        return None
+    return lexico_local.sugerencia(categoria, respuesta)
+
+def rechazo_ortografico(respuesta, categoria, sugerencia):
+    """
+    Veredicto de rechazo (apelable) si `respuesta` es un error de escritura
+    evidente de `sugerencia`; None si puede ser otra palabra válida.
+    """
+    if not sugerencia or nombre_archivo_categoria(categoria) in CATEGORIAS_SIN_RECHAZO_ORTOGRAFICO:
+        return None
+    sugerida, distancia = sugerencia
+    texto = normalizar_lexico(respuesta)
+    # Dos letras de diferencia solo en palabras largas ("Medina" no es "Mérida" mal escrita)
+    if distancia > max(1, (len(texto) - 1) // 3):
+        return None
+    # Cambios solo al final (femenino, plural: "Gata", "Leona", "Peras"): que decida la IA
+    if len(os.path.commonprefix([texto, sugerida])) >= len(sugerida) - 2:
+        return None
+    metricas_correccion["rechazadas"] += 1
+    return False, f'Mal escrita (¿quisiste decir "{sugerida}"?)', 0.85
+
+# Clasificador local (n-gramas de caracteres, entrenado con la tabla de
+# validaciones: python clasificador.py entrenar). Solo decide cuando está
+# seguro; lo dudoso sigue a la IA
+CLASIFICADOR_LOCAL = os.getenv("BASTA_CLASIFICADOR", "1") == "1"
+clasificador_local = cargar_clasificador(os.getenv("BASTA_CLASIFICADOR_MODELO", RUTA_MODELO)) if CLASIFICADOR_LOCAL else None
+
+def veredicto_clasificador(respuesta, categoria):
+    """(es_valida, razón, confianza) si el clasificador local está seguro, si no None"""
+    if clasificador_local is None:
+        return None
+    decidido = clasificador_local.veredicto(categoria, respuesta)
+    if decidido is None:
+        return None
+    es_valida, probabilidad = decidido
+    certeza = probabilidad if es_valida else 1 - probabilidad
+    # Por debajo de 0.9: un veredicto del modelo siempre se puede apelar
+    return es_valida, f"Clasificador local ({certeza:.0%})", min(0.89, round(certeza, 2))
+
+# Segundo nivel: tabla de validaciones del almacén (sobrevive a reinicios)
+VALIDACIONES_DURABLES = os.getenv("BASTA_VALIDACIONES_DURABLES", "1") == "1"
+
+def precargar_validaciones(claves):
+    """
+    Resuelve con el léxico local y trae de la tabla de validaciones, en una
+    consulta por categoría, los veredictos que no están en la caché en
+    memoria y los deja en ella; luego los errores de escritura evidentes y lo
+    que el clasificador local decide con seguridad. Devuelve las claves que
+    siguen sin veredicto (las que irán a la IA).
     """
-    Valida una respuesta usando IA de OpenAI
+    faltantes = cache_validaciones_ia.faltantes(claves)
+    if LEXICO_LOCAL and faltantes:
+        conocidas = {clave for clave in faltantes if veredicto_lexico(clave[2], clave[0])}
+        for clave in conocidas:
+            cache_validaciones_ia.guardar(clave, VEREDICTO_LEXICO)
+            enrutador_ia.registrar_decision("lexico", clave[0], clave[2])
+        faltantes = [clave for clave in faltantes if clave not in conocidas]
+    if faltantes and VALIDACIONES_DURABLES:
+        try:
+            encontradas = almacen.buscar_validaciones(faltantes)
+        except Exception as e:
+            print(f"⚠️ Error leyendo la tabla de validaciones: {e}")
+            encontradas = {}
+        for clave, (veredicto, razon, confianza, _fuente) in encontradas.items():
+            cache_validaciones_ia.guardar(clave, (veredicto, razon, confianza))
+        cache_validaciones_ia.registrar_almacen(consultadas=len(faltantes), aciertos=len(encontradas))
+        if encontradas:
+            print(f"💾 {len(encontradas)}/{len(faltantes)} validaciones recuperadas de la tabla de validaciones")
+        faltantes = [clave for clave in faltantes if clave not in encontradas]
+    # Errores de escritura evidentes (después de la tabla: una apelación aceptada manda)
+    if CORRECCION_LOCAL and faltantes:
+        rechazadas = set()
+        for clave in faltantes:
+            rechazo = rechazo_ortografico(clave[2], clave[0], sugerencia_lexico(clave[2], clave[0]))
+            if rechazo:
+                cache_validaciones_ia.guardar(clave, rechazo)
+                enrutador_ia.registrar_decision("ortografia", clave[0], clave[2], rechazo[2])
+                rechazadas.add(clave)
+        faltantes = [clave for clave in faltantes if clave not in rechazadas]
+    # Lo que el clasificador local decide con seguridad (solo en memoria, como lo anterior:
+    # la tabla guarda veredictos de la IA y de personas, que son con lo que se entrena)
+    if clasificador_local is not None and faltantes:
+        decididas = set()
+        for clave in faltantes:
+            veredicto = veredicto_clasificador(clave[2], clave[0])
+            if veredicto:
+                cache_validaciones_ia.guardar(clave, veredicto)
+                enrutador_ia.registrar_decision("clasificador", clave[0], clave[2], veredicto[2])
+                decididas.add(clave)
+        faltantes = [clave for clave in faltantes if clave not in decididas]
+    return faltantes
+
+def guardar_veredictos(registros, sobrescribir=False):
+    """Escribe {clave: (veredicto, razón, confianza, fuente)} en la tabla de validaciones"""
+    if not registros or not VALIDACIONES_DURABLES:
+        return
+    try:
+        guardadas = almacen.guardar_validaciones(registros, sobrescribir=sobrescribir)
+        cache_validaciones_ia.registrar_almacen(guardadas=guardadas)
+    except Exception as e:
+        print(f"⚠️ Error guardando {len(registros)} validaciones: {e}")
+
+def fijar_veredicto(respuesta, categoria, letra, valida, razon, fuente):
+    """Veredicto decidido por personas (apelación o admin): manda sobre el de la IA"""
+    clave = clave_validacion(respuesta.strip(), categoria, letra)
+    cache_validaciones_ia.guardar(clave, (valida, razon, 1.0))
+    guardar_veredictos({clave: (valida, razon, 1.0, fuente)}, sobrescribir=True)
+
+# Validación por lotes: una llamada por categoría y letra en vez de una por respuesta
+VALIDACION_POR_LOTES = os.getenv("BASTA_VALIDACION_LOTES", "1") == "1"
+# Tope de respuestas por llamada: con lotes de 10 la ronda es más rápida que con
+# 25 o 50 (ver benchmarks/bench_validacion_lote.py)
+MAX_RESPUESTAS_POR_LOTE = int(os.getenv("BASTA_VALIDACION_LOTE_MAX", "10"))
+metricas_lotes = {
+    "lotes": 0,
+    "respuestas_enviadas": 0,
+    "respuestas_cubiertas": 0,
+    "a_individual": 0,
+    "errores": 0,
+}
+
+# Modo de los prompts de validación: "completo" (reglas y ejemplos largos) o
+# "compacto" (prompt corto y salida JSON con esquema estricto)
+MODO_PROMPT = os.getenv("BASTA_MODO_PROMPT", "completo")
+# Tokens y latencia de cada llamada de validación por modo y tipo, para comparar los modos
+metricas_llamadas_ia = {}
+ultimas_llamadas_ia = deque(maxlen=500)
+
+def _metricas_llamada(modo, tipo):
+    return metricas_llamadas_ia.setdefault(f"{modo}/{tipo}", {
+        "llamadas": 0, "respuestas": 0, "tokens_entrada": 0, "tokens_salida": 0, "segundos": 0.0, "errores_formato": 0
+    })
+
+def registrar_llamada_ia(modo, tipo, response, segundos, respuestas=1, modelo=""):
+    """Anota tokens (los que informa la API) y latencia de una llamada de validación"""
+    uso = getattr(response, "usage", None)
+    entrada = getattr(uso, "prompt_tokens", 0) or 0
+    salida = getattr(uso, "completion_tokens", 0) or 0
+    metricas = _metricas_llamada(modo, tipo)
+    metricas["llamadas"] += 1
+    metricas["respuestas"] += respuestas
+    metricas["tokens_entrada"] += entrada
+    metricas["tokens_salida"] += salida
+    metricas["segundos"] += segundos
+    ultimas_llamadas_ia.append({"modo": modo, "tipo": tipo, "modelo": modelo, "respuestas": respuestas,
+                                "tokens_entrada": entrada, "tokens_salida": salida, "ms": round(segundos * 1000, 1)})
+
+def registrar_error_formato(modo, tipo):
+    _metricas_llamada(modo, tipo)["errores_formato"] += 1
+
+def resumen_llamadas_ia():
+    """Medias por modo y tipo de llamada (panel de admin)"""
+    resumen = {}
+    for nombre, metricas in metricas_llamadas_ia.items():
+        llamadas = metricas["llamadas"] or 1
+        resumen[nombre] = {
+            **metricas,
+            "segundos": round(metricas["segundos"], 2),
+            "tokens_entrada_medios": round(metricas["tokens_entrada"] / llamadas, 1),
+            "tokens_salida_medios": round(metricas["tokens_salida"] / llamadas, 1),
+            "latencia_media_ms": round(metricas["segundos"] * 1000 / llamadas, 1),
+        }
+    return {"modo": MODO_PROMPT, "por_modo": resumen}
+
+SYSTEM_PROMPT_LOTE = """Eres un validador ESTRICTO del juego BASTA/Stop.
+Recibes VARIAS respuestas de la misma categoría y letra. Juzga cada una por separado.
+
+REGLAS CRÍTICAS:
+1. Si NO reconoces que algo existe → NO
+2. Si el nombre/título parece inventado o modificado → NO
+3. Si tienes CUALQUIER duda → NO
+4. La capitalización NO importa (mayúsculas/minúsculas son equivalentes)
+
+Responde SOLO con un array JSON válido, sin texto adicional, un objeto por respuesta:
+[{"n": 1, "valida": true/false, "razon": "explicación breve", "confianza": 0.0-1.0}, ...]"""
+
+SYSTEM_PROMPT_INDIVIDUAL = """Eres un validador ESTRICTO del juego BASTA/Stop.
+Tu trabajo es verificar si las respuestas son REALES y corresponden a la categoría. 
+
+REGLAS CRÍTICAS:
+1. Si NO reconoces que algo existe → responde NO
+2. Si el nombre/título parece inventado o modificado → responde NO  
+3. Si tienes CUALQUIER duda → responde NO
+4. La capitalización NO importa (mayúsculas/minúsculas son equivalentes)
+5.  Sé MUY ESTRICTO: es mejor rechazar algo válido que aceptar algo inválido
+
+Responde SOLO con JSON válido, sin texto adicional:
+{"valida": true/false, "razon": "explicación breve", "confianza": 0.0-1.0}"""
+
+def extraer_veredictos_lote(texto, total):
+    """
+    Lee el array JSON de una validación por lotes.
+    Retorna: {indice (desde 0): (es_valida, razon, confianza)} de los elementos bien formados
+    """
+    if "```" in texto:
+        match = re.search(r'```(?:json)?\s*(.*?)\s*```', texto, re.DOTALL)
+        if match:
+            texto = match.group(1)
+    try:
+        datos = json.loads(texto)
+    except json.JSONDecodeError:
+        match = re.search(r'\[.*\]', texto, re.DOTALL)
+        if not match:
+            return {}
+        try:
+            datos = json.loads(match.group())
+        except json.JSONDecodeError:
+            return {}
+    if isinstance(datos, dict):
+        # Algunos modelos envuelven el array: {"resultados": [...]}
+        datos = next((v for v in datos.values() if isinstance(v, list)), [])
+    if not isinstance(datos, list):
+        return {}
+    
+    veredictos = {}
+    for posicion, elemento in enumerate(datos):
+        if not isinstance(elemento, dict) or not isinstance(elemento.get("valida"), bool):
+            continue
+        try:
+            indice = int(elemento.get("n", posicion + 1)) - 1
+            confianza = max(0.0, min(1.0, float(elemento.get("confianza", 0.5))))
+        except (TypeError, ValueError):
+            continue
+        if 0 <= indice < total and indice not in veredictos:
+            veredictos[indice] = (elemento["valida"], str(elemento.get("razon", "Sin razón especificada")), confianza)
+    return veredictos
+
+def validar_lote_con_ia(respuestas, categoria, letra):
+    """
+    Valida en una sola llamada varias respuestas de una categoría (ya limpias
+    y sin duplicados, que pasaron la validación previa). Las que otra sala ya
+    está validando no se vuelven a pedir: se espera su veredicto.
+    Retorna: {respuesta: (es_valida, razon, confianza)} solo de las que la IA
+    cubrió; las que falten se validan una a una con validar_respuesta_con_ia.
+    """
+    claves = {respuesta: clave_validacion(respuesta, categoria, letra) for respuesta in respuestas}
+    propias, ajenas = vuelos_ia.tomar(claves.values())
+    propias = set(propias)
+    resultados = {}
+    pedir = []
+    try:
+        for respuesta in respuestas:
+            if claves[respuesta] not in propias:
+                continue
+            # Pudo terminar otra llamada con esta respuesta justo antes de reservarla
+            en_cache = cache_validaciones_ia.ver(claves[respuesta])
+            if en_cache is not None:
+                resultados[respuesta] = en_cache
+            else:
+                pedir.append(respuesta)
+        if pedir:
+            resultados.update(consultar_lote_con_ia(pedir, categoria, letra))
+    finally:
+        for respuesta in respuestas:
+            if claves[respuesta] in propias:
+                vuelos_ia.terminar(claves[respuesta], resultados.get(respuesta))
+    
+    for respuesta in respuestas:
+        vuelo = ajenas.get(claves[respuesta])
+        if vuelo is None:
+            continue
+        try:
+            veredicto = vuelos_ia.esperar(vuelo)
+        except Exception:
+            veredicto = None  # Irá a la validación individual
+        if veredicto is not None:
+            resultados[respuesta] = veredicto
+    return resultados
+
+def consultar_lote_con_ia(respuestas, categoria, letra, nivel="rapido"):
+    """
+    Una llamada de validación por lote al modelo del nivel `nivel`. Las que el
+    modelo rápido devuelve con poca confianza se repiten en otro lote con el
+    fuerte. Retorna {respuesta: (es_valida, razon, confianza)} de las cubiertas.
+    """
+    metricas_lotes["lotes"] += 1
+    metricas_lotes["respuestas_enviadas"] += len(respuestas)
+    sugerencias = {}
+    for respuesta in respuestas:
+        sugerencia = sugerencia_lexico(respuesta, categoria)
+        if sugerencia:
+            sugerencias[respuesta] = sugerencia
+    metricas_correccion["pistas_ia"] += len(sugerencias)
+    modo = MODO_PROMPT
+    if modo == "compacto":
+        mensajes = [
+            {"role": "system", "content": SYSTEM_PROMPT_COMPACTO},
+            {"role": "user", "content": generar_prompt_compacto_lote(respuestas, categoria, letra, sugerencias)}
+        ]
+        formato = {"response_format": FORMATO_COMPACTO_LOTE}
+        max_tokens = 25 * len(respuestas) + 20  # razón corta: ~25 tokens por veredicto
+    else:
+        mensajes = [
+            {"role": "system", "content": SYSTEM_PROMPT_LOTE},
+            {"role": "user", "content": generar_prompt_validacion_lote(respuestas, categoria, letra, sugerencias)}
+        ]
+        formato = {}
+        max_tokens = 40 * len(respuestas) + 20  # ~40 tokens por veredicto
+    inicio_llamada = time.perf_counter()
+    try:
+        response = openai_client.chat.completions.create(
+            model=enrutador_ia.modelo(nivel),
+            messages=mensajes,
+            temperature=0.1,
+            max_tokens=max_tokens,
+            timeout=min(15, 6 + 0.2 * len(respuestas)),
+            **formato
+        )
+        segundos = time.perf_counter() - inicio_llamada
+        cache_validaciones_ia.registrar_llamada(segundos)
+        enrutador_ia.registrar_llamada(nivel, segundos)
+        registrar_llamada_ia(modo, "lote", response, segundos, len(respuestas), modelo=enrutador_ia.modelo(nivel))
+        veredictos = extraer_veredictos_lote(response.choices[0].message.content.strip(), len(respuestas))
+        if not veredictos:
+            registrar_error_formato(modo, "lote")
+    except (CircuitoIAAbierto, LimiteIAExcedido):
+        return {}  # Cada respuesta irá a la validación local
+    except Exception as e:
+        enrutador_ia.registrar_llamada(nivel, time.perf_counter() - inicio_llamada, error=True)
+        print(f"⚠️ Error en validación por lote ({categoria}, {len(respuestas)} respuestas): {type(e).__name__}: {e}")
+        metricas_lotes["errores"] += 1
+        return {}
+    
+    resultados = {}
+    for indice, veredicto in veredictos.items():
+        respuesta = respuestas[indice]
+        cache_validaciones_ia.guardar(clave_validacion(respuesta, categoria, letra), veredicto)
+        resultados[respuesta] = veredicto
+    metricas_lotes["respuestas_cubiertas"] += len(resultados)
+    print(f"🤖 IA ({enrutador_ia.modelo(nivel)}) validó en lote {len(resultados)}/{len(respuestas)} respuestas "
+          f"de {categoria} (letra {letra}) en {time.perf_counter() - inicio_llamada:.2f}s")
+    if nivel != "rapido":
+        return resultados
+    
+    # Las dudosas, otra vez en un lote al modelo fuerte (si falla, vale el veredicto rápido)
+    dudosas = [respuesta for respuesta, veredicto in resultados.items() if enrutador_ia.debe_escalar(veredicto[2])]
+    fuertes = consultar_lote_con_ia(dudosas, categoria, letra, nivel="fuerte") if dudosas else {}
+    for respuesta, veredicto in resultados.items():
+        if respuesta in fuertes:
+            cambio = fuertes[respuesta][0] != veredicto[0]
+            resultados[respuesta] = fuertes[respuesta]
+            enrutador_ia.registrar_decision("escalada_confianza", categoria, respuesta, fuertes[respuesta][2], cambio)
+        else:
+            enrutador_ia.registrar_decision("rapido", categoria, respuesta, veredicto[2])
+    return resultados
+
+def consultar_modelo_validacion(respuesta_limpia, categoria, letra, sugerencia=None, nivel="rapido"):
+    """
+    Una llamada de validación al modelo del nivel `nivel` del enrutador.
+    Retorna: (es_valida, razon, confianza); lanza la excepción si la llamada o el JSON fallan
+    """
+    modo = MODO_PROMPT
+    inicio_llamada = time.perf_counter()
+    if modo == "compacto":
+        # Prompt corto; el formato lo garantiza el esquema JSON de la API
+        mensajes = [
+            {"role": "system", "content": SYSTEM_PROMPT_COMPACTO},
+            {"role": "user", "content": generar_prompt_compacto(respuesta_limpia, categoria, letra, sugerencia)}
+        ]
+        formato = {"response_format": FORMATO_COMPACTO}
+        max_tokens = 40
+    else:
+        mensajes = [
+            {"role": "system", "content": SYSTEM_PROMPT_INDIVIDUAL},
+            {"role": "user", "content": generar_prompt_validacion(respuesta_limpia, categoria, letra, sugerencia)}
+        ]
+        formato = {}
+        max_tokens = 60  # Reducido de 80 a 60 para máxima velocidad
+
+    try:
+        response = openai_client. chat.completions.create(
+            model=enrutador_ia.modelo(nivel),
+            messages=mensajes,
+            temperature=0.1,  # Más bajo = más consistente y estricto
+            max_tokens=max_tokens,
+            timeout=6,  # Aumentado de 4 a 6 para soportar más concurrencia
+            **formato
+        )
+    except (CircuitoIAAbierto, LimiteIAExcedido):
+        raise  # Rechazada antes de llegar al modelo: no es un error suyo
+    except Exception:
+        enrutador_ia.registrar_llamada(nivel, time.perf_counter() - inicio_llamada, error=True)
+        raise
+    
+    segundos = time.perf_counter() - inicio_llamada
+    cache_validaciones_ia.registrar_llamada(segundos)
+    latencias_ia_individuales.append(segundos)
+    enrutador_ia.registrar_llamada(nivel, segundos)
+    registrar_llamada_ia(modo, "individual", response, segundos, modelo=enrutador_ia.modelo(nivel))
+    resultado_texto = response.choices[0].message.content.strip()
+    
+    # Limpiar respuesta de markdown si viene envuelta
+    if "```" in resultado_texto:
+        # Extraer contenido entre ```
+        match = re.search(r'```(?:json)?\s*(.*?)\s*```', resultado_texto, re.DOTALL)
+        if match:
+            resultado_texto = match.group(1)
+    
+    # Intentar parsear JSON
+    try:
+        resultado = json.loads(resultado_texto)
+    except json.JSONDecodeError:
+        registrar_error_formato(modo, "individual")
+        # Intentar extraer JSON de texto mixto
+        match = re.search(r'\{[^{}]*\}', resultado_texto)
+        if match:
+            resultado = json.loads(match.group())
+        else:
+            raise ValueError(f"No se pudo extraer JSON de: {resultado_texto}")
+    
+    es_valida = bool(resultado.get("valida", False))
+    razon = str(resultado.get("razon", "Sin razón especificada"))
+    # Asegurar que confianza esté en rango válido
+    confianza = max(0.0, min(1.0, float(resultado.get("confianza", 0.5))))
+    return es_valida, razon, confianza
+
+def validar_con_modelos(respuesta_limpia, categoria, letra, sugerencia, clave):
+    """
+    Veredicto del modelo rápido, confirmado por el fuerte si llega con poca
+    confianza; lo deja en la caché. Lanza la excepción si la llamada falla.
+    """
+    # Pudo terminar otra llamada con esta respuesta justo antes de reservarla
+    en_cache = cache_validaciones_ia.ver(clave)
+    if en_cache is not None:
+        return en_cache
+    if sugerencia:
+        metricas_correccion["pistas_ia"] += 1
+    es_valida, razon, confianza = consultar_modelo_validacion(respuesta_limpia, categoria, letra, sugerencia)
+    decision, cambio = "rapido", False
+    
+    # Poca confianza: lo confirma el modelo fuerte (si falla, vale el del rápido)
+    if enrutador_ia.debe_escalar(confianza):
+        try:
+            fuerte = consultar_modelo_validacion(respuesta_limpia, categoria, letra, sugerencia, nivel="fuerte")
+            decision, cambio = "escalada_confianza", fuerte[0] != es_valida
+            es_valida, razon, confianza = fuerte
+        except Exception as e:
+            print(f"⚠️ No se pudo escalar '{respuesta_limpia}' al modelo fuerte: {type(e).__name__}: {e}")
+    enrutador_ia.registrar_decision(decision, categoria, respuesta_limpia, confianza, cambio)
+    
+    # Log de resultado
+    emoji = "✅" if es_valida else "❌"
+    print(f"🤖 IA validó '{respuesta_limpia}' ({categoria}, letra {letra}): {emoji} - {razon} (confianza: {confianza:.0%})")
+    
+    # Solo se cachean veredictos reales (no los errores de parseo o de API)
+    cache_validaciones_ia.guardar(clave, (es_valida, razon, confianza))
+    return es_valida, razon, confianza
+
+def validar_respuesta_con_ia(respuesta, categoria, letra, compartir=True):
+    """
+    Valida una respuesta usando IA de OpenAI. Con `compartir`, si otra sala
+    ya está preguntando lo mismo se espera su veredicto (las coberturas no
+    comparten: existen para no esperar a una llamada lenta).
     Retorna: (es_valida: bool, razon: str, confianza: float)
     """
     
@@ -1116,71 +1337,40 @@ def validar_respuesta_con_ia(respuesta, categoria, letra):
     
     respuesta_limpia = respuesta. strip()
     
+    # Palabra conocida de la categoría: válida sin preguntar a nadie
+    conocida = veredicto_lexico(respuesta_limpia, categoria)
+    if conocida:
+        enrutador_ia.registrar_decision("lexico", categoria, respuesta_limpia, conocida[2])
+        return conocida
+    
     # ==========================================================
-    # PASO 2: VALIDACIÓN CON IA
+    # PASO 2: VALIDACIÓN CON IA (primero la caché compartida)
     # ==========================================================
     if OPENAI_AVAILABLE and openai_client:
+        clave = clave_validacion(respuesta_limpia, categoria, letra)
+        en_cache = cache_validaciones_ia.obtener(clave)
+        if en_cache is not None:
+            return en_cache
+        # Error de escritura evidente de una palabra conocida: rechazo local (apelable)
+        sugerencia = sugerencia_lexico(respuesta_limpia, categoria)
+        rechazo = rechazo_ortografico(respuesta_limpia, categoria, sugerencia)
+        if rechazo:
+            print(f"✏️ Rechazado en local '{respuesta_limpia}': {rechazo[1]}")
+            enrutador_ia.registrar_decision("ortografia", categoria, respuesta_limpia, rechazo[2])
+            return rechazo
+        clasificada = veredicto_clasificador(respuesta_limpia, categoria)
+        if clasificada:
+            enrutador_ia.registrar_decision("clasificador", categoria, respuesta_limpia, clasificada[2])
+            return clasificada
         try:
-            # Generar prompt optimizado
-            prompt = generar_prompt_validacion(respuesta_limpia, categoria, letra)
-            
-            # Instrucción de sistema clara
-            system_prompt = """Eres un validador ESTRICTO del juego BASTA/Stop.
-Tu trabajo es verificar si las respuestas son REALES y corresponden a la categoría. 
-
-REGLAS CRÍTICAS:
-1. Si NO reconoces que algo existe → responde NO
-2. Si el nombre/título parece inventado o modificado → responde NO  
-3. Si tienes CUALQUIER duda → responde NO
-4. La capitalización NO importa (mayúsculas/minúsculas son equivalentes)
-5.  Sé MUY ESTRICTO: es mejor rechazar algo válido que aceptar algo inválido
-
-Responde SOLO con JSON válido, sin texto adicional:
-{"valida": true/false, "razon": "explicación breve", "confianza": 0.0-1.0}"""
-
-            response = openai_client. chat.completions.create(
-                model="gpt-4o-mini",  # Más preciso que gpt-3.5-turbo para validaciones
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.1,  # Más bajo = más consistente y estricto
-                max_tokens=60,  # Reducido de 80 a 60 para máxima velocidad
-                timeout=6  # Aumentado de 4 a 6 para soportar más concurrencia
-            )
-            
-            resultado_texto = response.choices[0].message.content.strip()
-            
-            # Limpiar respuesta de markdown si viene envuelta
-            if "```" in resultado_texto:
-                # Extraer contenido entre ```
-                match = re.search(r'```(? :json)?\s*(.*? )\s*```', resultado_texto, re.DOTALL)
-                if match:
-                    resultado_texto = match.group(1)
-            
-            # Intentar parsear JSON
-            try:
-                resultado = json.loads(resultado_texto)
-            except json.JSONDecodeError:
-                # Intentar extraer JSON de texto mixto
-                match = re.search(r'\{[^{}]*\}', resultado_texto)
-                if match:
-                    resultado = json.loads(match.group())
-                else:
-                    raise ValueError(f"No se pudo extraer JSON de: {resultado_texto}")
-            
-            es_valida = bool(resultado.get("valida", False))
-            razon = str(resultado.get("razon", "Sin razón especificada"))
-            confianza = float(resultado.get("confianza", 0.5))
+            if not compartir:
+                return validar_con_modelos(respuesta_limpia, categoria, letra, sugerencia, clave)
+            # Si otra sala ya está preguntando por lo mismo, se espera su veredicto
+            return vuelos_ia.ejecutar(clave, validar_con_modelos, respuesta_limpia, categoria, letra, sugerencia, clave)
             
-            # Asegurar que confianza esté en rango válido
-            confianza = max(0.0, min(1.0, confianza))
-            
-            # Log de resultado
-            emoji = "✅" if es_valida else "❌"
-            print(f"🤖 IA validó '{respuesta_limpia}' ({categoria}, letra {letra}): {emoji} - {razon} (confianza: {confianza:.0%})")
-            
-            return es_valida, razon, confianza
+        except (CircuitoIAAbierto, LimiteIAExcedido) as e:
+            # La IA está en pausa o sin cupo: se valida en local al instante (PASO 3)
+            print(f"🔌 IA no disponible ahora ({e})")
             
         except json.JSONDecodeError as e:
             print(f"⚠️ Error parseando JSON de IA: {e}")
@@ -1196,7 +1386,14 @@ Responde SOLO con JSON válido, sin texto adicional:
     # PASO 3: FALLBACK sin IA (muy básico, ser conservador)
     # ==========================================================
     print(f"⚠️ IA no disponible. Validación básica para '{respuesta_limpia}'")
-    
+    return validacion_basica_sin_ia(respuesta_limpia, categoria)
+
+def validacion_basica_sin_ia(respuesta_limpia, categoria=None):
+    """
+    Veredicto local para una respuesta que ya pasó la validación previa
+    (sin IA o cuando no contesta a tiempo).
+    Retorna: (es_valida, razon, confianza)
+    """
     # Sin IA, solo aceptamos si pasa todas las validaciones básicas
     # y rechazamos casos sospechosos
     
@@ -1204,12 +1401,301 @@ Responde SOLO con JSON válido, sin texto adicional:
     if len(respuesta_limpia) < 3:
         return False, "Respuesta muy corta (IA no disponible)", 0.5
     
+    # Error de escritura evidente de una palabra del léxico
+    if categoria:
+        rechazo = rechazo_ortografico(respuesta_limpia, categoria, sugerencia_lexico(respuesta_limpia, categoria))
+        if rechazo:
+            return rechazo
+        clasificada = veredicto_clasificador(respuesta_limpia, categoria)
+        if clasificada:
+            return clasificada
+    
     # Si llegó aquí, aceptar con baja confianza
     return True, "Validación básica (IA no disponible)", 0.4
 
 
 
 
+# Validación incremental: las respuestas se validan mientras se juega la ronda
+VALIDACION_INCREMENTAL = os.getenv("BASTA_VALIDACION_INCREMENTAL", "1") == "1"
+
+def validar_en_lotes(items, letra, sala="", prioridad=PRIORIDAD_PUNTUACION):
+    """
+    Valida [(respuesta, categoria, clave)] fuera del final de ronda con el
+    mismo reparto: primero la tabla de validaciones, luego un lote por
+    categoría y llamadas individuales para lo que el lote no cubra (todo en
+    el ejecutor compartido, a nombre de `sala`). Los veredictos quedan en la
+    caché compartida y en la tabla de validaciones.
+    """
+    pendientes = set(precargar_validaciones([clave for _, _, clave in items]))
+    por_categoria = {}
+    for respuesta, categoria, clave in items:
+        if clave in pendientes:
+            por_categoria.setdefault(categoria, []).append(respuesta)
+    if not por_categoria:
+        return
+    
+    lotes, individuales = [], []
+    for categoria, respuestas in por_categoria.items():
+        if VALIDACION_POR_LOTES and len(respuestas) > 1:
+            for i in range(0, len(respuestas), MAX_RESPUESTAS_POR_LOTE):
+                lotes.append((categoria, respuestas[i:i + MAX_RESPUESTAS_POR_LOTE]))
+        else:
+            individuales.extend((respuesta, categoria) for respuesta in respuestas)
+    
+    def enviar(funcion, *args):
+        return ejecutor_ia.enviar(funcion, *args, sala=sala, prioridad=prioridad)
+    
+    futures = {enviar(validar_lote_con_ia, respuestas, categoria, letra): (categoria, respuestas)
+               for categoria, respuestas in lotes}
+    for respuesta, categoria in individuales:
+        futures[enviar(validar_respuesta_con_ia, respuesta, categoria, letra)] = None
+    while futures:
+        hechos, _ = wait(futures, return_when=FIRST_COMPLETED)
+        for future in hechos:
+            lote = futures.pop(future)
+            if lote is None:
+                continue
+            categoria, respuestas = lote
+            cubiertas = future.result()
+            for respuesta in respuestas:
+                if respuesta not in cubiertas:
+                    metricas_lotes["a_individual"] += 1
+                    futures[enviar(validar_respuesta_con_ia, respuesta, categoria, letra)] = None
+    
+    nuevos_veredictos = {}
+    for clave in pendientes:
+        veredicto = cache_validaciones_ia.ver(clave)
+        if veredicto is not None:
+            nuevos_veredictos[clave] = (*veredicto, "ia")
+    guardar_veredictos(nuevos_veredictos)
+
+def validar_respuesta_incremental(respuesta, categoria, letra, clave, codigo):
+    validar_en_lotes([(respuesta, categoria, clave)], letra, sala=codigo, prioridad=PRIORIDAD_FONDO)
+
+validador_incremental = ValidadorIncremental(
+    validar_respuesta_incremental,
+    conocida=lambda clave: cache_validaciones_ia.ver(clave) is not None,
+    hilos=int(os.getenv("BASTA_VALIDACION_INCREMENTAL_HILOS", "4")),
+)
+if VALIDACION_INCREMENTAL:
+    validador_incremental.iniciar()
+
+# Cuánto trabajo de IA quedaba por hacer al final de cada ronda
+metricas_final_ronda = {
+    "rondas": 0,
+    "respuestas_ia": 0,  # Respuestas únicas que necesitaban veredicto de la IA
+    "resueltas_antes": 0,  # ... que ya lo tenían al terminar la ronda
+    "esperadas": 0,  # ... que estaban validándose y se esperaron
+    "rezagadas": 0,  # ... que se validaron al final
+    "segundos_validacion": 0.0,
+    "ultima_validacion_s": 0.0,
+}
+
+# Al gritar ¡BASTA! se valida lo que ya hay en la sala durante la cuenta atrás
+VALIDACION_AL_BASTA = os.getenv("BASTA_VALIDACION_AL_BASTA", "1") == "1"
+
+def prevalidar_respuestas(codigo):
+    """
+    Lanza en segundo plano la validación por lotes de las respuestas de la
+    sala que aún no tienen veredicto. calcular_puntuaciones espera a las que
+    sigan en curso y valida solo las que lleguen después.
+    """
+    sala = state["salas"].get(codigo)
+    if not sala or not VALIDACION_AL_BASTA or not (OPENAI_AVAILABLE and openai_client):
+        return 0
+    letra = sala.get("letra", "?").upper()
+    trabajos = {}
+    for respuestas in list(sala.get("respuestas_ronda", {}).values()):
+        for categoria, respuesta in list(respuestas.items()):
+            respuesta_limpia = str(respuesta or "").strip()
+            if validacion_previa_basica(respuesta_limpia, categoria, letra)[0]:
+                continue
+            clave = clave_validacion(respuesta_limpia, categoria, letra)
+            trabajos.setdefault(clave, (respuesta_limpia, categoria, clave))
+    lanzadas = validador_incremental.lanzar(trabajos, lambda items: validar_en_lotes(items, letra, sala=codigo))
+    if lanzadas:
+        print(f"⚡ Validando {lanzadas} respuestas de la sala {codigo} durante la cuenta atrás")
+    return lanzadas
+
+def encolar_respuestas_nuevas(codigo, sala, respuestas, anteriores):
+    """Manda a validar en segundo plano las respuestas nuevas o cambiadas de un jugador"""
+    if not VALIDACION_INCREMENTAL or not (OPENAI_AVAILABLE and openai_client):
+        return 0
+    letra = sala.get("letra", "?").upper()
+    encoladas = 0
+    for categoria, respuesta in respuestas.items():
+        respuesta_limpia = str(respuesta or "").strip()
+        if respuesta_limpia == str(anteriores.get(categoria) or "").strip():
+            continue
+        if validacion_previa_basica(respuesta_limpia, categoria, letra)[0]:
+            continue
+        clave = clave_validacion(respuesta_limpia, categoria, letra)
+        if validador_incremental.encolar(clave, respuesta_limpia, categoria, letra, clave, codigo):
+            encoladas += 1
+    return encoladas
+
+
+# ==========================================================
+# PUNTUACIÓN CON PLAZO: COBERTURA Y RESULTADOS PROVISIONALES
+# ==========================================================
+# Segundos máximos que round_results espera a la IA; lo que no llegue a tiempo
+# se puntúa con la validación local y se corrige con round_results_update
+PRESUPUESTO_VALIDACION_S = float(os.getenv("BASTA_PRESUPUESTO_VALIDACION_S", "5"))
+# Una llamada individual más lenta que este percentil de las recientes se
+# duplica (la primera respuesta que llegue gana)
+COBERTURA_PERCENTIL = float(os.getenv("BASTA_COBERTURA_PERCENTIL", "0.9"))
+COBERTURA_MIN_S = float(os.getenv("BASTA_COBERTURA_MIN_S", "1.5"))
+# Cuánto se sigue esperando a la IA tras el plazo para corregir los provisionales
+CORRECCION_MAX_S = float(os.getenv("BASTA_CORRECCION_MAX_S", "20"))
+
+latencias_ia_individuales = deque(maxlen=200)
+rondas_provisionales = {}  # {codigo: lo pendiente de la última ronda, hasta que conteo_final lo lanza}
+metricas_plazo = {
+    "rondas": 0,
+    "rondas_provisionales": 0,
+    "respuestas_provisionales": 0,
+    "coberturas": 0,
+    "coberturas_ganadoras": 0,
+    "correcciones": 0,
+    "veredictos_cambiados": 0,
+}
+
+def umbral_cobertura():
+    """Segundos a partir de los que una validación individual se duplica"""
+    muestras = sorted(latencias_ia_individuales)
+    if len(muestras) < 20:
+        return max(COBERTURA_MIN_S, 2.5)
+    return max(COBERTURA_MIN_S, muestras[int(COBERTURA_PERCENTIL * (len(muestras) - 1))])
+
+def validacion_provisional(respuesta, categoria, letra):
+    """Veredicto inmediato (sin IA) para una respuesta que la IA no validó a tiempo"""
+    debe_rechazar, razon_rechazo = validacion_previa_basica(respuesta, categoria, letra)
+    if debe_rechazar:
+        return {"validada_ia": False, "razon_ia": razon_rechazo, "confianza": 1.0, "apelable": False}
+    es_valida, _, confianza = validacion_basica_sin_ia(respuesta.strip(), categoria)
+    return {
+        "validada_ia": es_valida,
+        "razon_ia": "Provisional: la IA aún no respondió",
+        "confianza": confianza,
+        "apelable": True,
+        "provisional": True
+    }
+
+def puntos_por_respuesta_ronda(sala, respuestas_por_jugador, validaciones_ia, letra, puntos_base=100):
+    """
+    {jugador: {categoria: puntos}}: puntos_base por cada respuesta que la IA
+    validó y empieza por la letra, con el multiplicador del modo de juego
+    """
+    multiplicador = {"rapido": 1.5, "duelo": 2.0}.get(sala.get("modo_juego", "clasico"), 1.0)
+    puntos = {}
+    for jugador, respuestas in respuestas_por_jugador.items():
+        puntos[jugador] = {}
+        for categoria, respuesta in respuestas.items():
+            respuesta_limpia = respuesta.strip().upper()
+            validacion_jugador = validaciones_ia.get(jugador, {}).get(categoria, {})
+            if respuesta_limpia and respuesta_limpia.startswith(letra) and validacion_jugador.get("validada_ia", False):
+                puntos[jugador][categoria] = int(puntos_base * multiplicador)
+            else:
+                puntos[jugador][categoria] = 0
+    return puntos
+
+def puntos_mostrados_ronda(sala, respuestas_por_jugador, validaciones_ia, letra):
+    """Los puntos por respuesta que se muestran en los resultados (los de la dificultad de la sala)"""
+    config = DIFICULTADES.get(sala.get("dificultad", "normal"), DIFICULTADES["normal"])
+    return puntos_por_respuesta_ronda(sala, respuestas_por_jugador, validaciones_ia, letra, config["puntos_unico"])
+
+def corregir_ronda_provisional(codigo, pendiente):
+    """
+    Tras emitir round_results con veredictos provisionales: espera a que la
+    IA termine (hasta CORRECCION_MAX_S), cambia los veredictos que difieran,
+    ajusta las puntuaciones y emite round_results_update. Los power-ups y la
+    penalización del BASTA se quedan como se calcularon.
+    """
+    letra = pendiente["letra"]
+    wait(pendiente["futures"], timeout=CORRECCION_MAX_S)
+    # Las validaciones terminadas ya están en la caché; lo que falte (lotes que
+    # no lo cubrieron, errores) se valida ahora y se guarda en la tabla
+    items = {}
+    for tarea in pendiente["provisionales"]:
+        clave = clave_validacion(tarea['respuesta'], tarea['categoria'], letra)
+        items.setdefault(clave, (tarea['respuesta'], tarea['categoria'], clave))
+    try:
+        validar_en_lotes(list(items.values()), letra, sala=codigo)
+    except Exception as e:
+        print(f"⚠️ Error completando la validación provisional de la sala {codigo}: {e}")
+
+    definitivos = {}
+    nuevos_veredictos = {}
+    for tarea in pendiente["provisionales"]:
+        clave = clave_validacion(tarea['respuesta'], tarea['categoria'], letra)
+        veredicto = cache_validaciones_ia.ver(clave)
+        if veredicto is not None:
+            definitivos[tarea['clave_cache']] = veredicto
+            nuevos_veredictos[clave] = (*veredicto, "ia")
+    # Los que llegaron tras el plazo no los guardó calcular_puntuaciones
+    guardar_veredictos(nuevos_veredictos)
+
+    sala = state["salas"].get(codigo)
+    if not sala or sala.get("en_curso") or sala.get("letra", "?").upper() != letra:
+        print(f"⌛ Corrección de la sala {codigo} descartada: ya empezó otra ronda")
+        return
+
+    respuestas_por_jugador = {j: r for j, r in sala.get("respuestas_ronda", {}).items() if j in pendiente["jugadores"]}
+    validaciones_ia = sala.get("validaciones_ia", {})
+    antes = puntos_por_respuesta_ronda(sala, respuestas_por_jugador, validaciones_ia, letra)
+    corregidas = []
+    for jugador, respuestas in respuestas_por_jugador.items():
+        for categoria, respuesta in respuestas.items():
+            actual = validaciones_ia.get(jugador, {}).get(categoria)
+            veredicto = definitivos.get(f"{categoria}:{respuesta.strip().upper()}")
+            if not actual or not actual.get("provisional") or veredicto is None:
+                continue  # Ya definitiva (p. ej. resuelta por apelación) o la IA no contestó
+            es_valida, razon, confianza = veredicto
+            validaciones_ia[jugador][categoria] = {
+                "validada_ia": es_valida,
+                "razon_ia": razon,
+                "confianza": confianza,
+                "apelable": confianza < 0.9
+            }
+            if es_valida != actual.get("validada_ia"):
+                corregidas.append({"jugador": jugador, "categoria": categoria, "respuesta": respuesta, "validada_ia": es_valida})
+    despues = puntos_por_respuesta_ronda(sala, respuestas_por_jugador, validaciones_ia, letra)
+
+    puntuaciones = sala.get("puntuaciones", {})
+    scores_ronda = dict(pendiente["scores_ronda"])
+    for jugador in respuestas_por_jugador:
+        diferencia = sum(despues[jugador].values()) - sum(antes[jugador].values())
+        if jugador in pendiente["con_multiplicador"]:
+            diferencia *= 2
+        if diferencia:
+            puntuaciones[jugador] = max(0, puntuaciones.get(jugador, 0) + diferencia)
+            scores_ronda[jugador] = scores_ronda.get(jugador, 0) + diferencia
+    sala["puntuaciones"] = puntuaciones
+
+    puntuaciones_equipos = {}
+    if sala.get("modo_juego") == "equipos" and sala.get("equipos"):
+        for nombre_equipo, miembros in sala["equipos"].items():
+            puntuaciones_equipos[nombre_equipo] = sum(puntuaciones.get(j, 0) for j in miembros)
+        sala["puntuaciones_equipos"] = puntuaciones_equipos
+
+    metricas_plazo["correcciones"] += 1
+    metricas_plazo["veredictos_cambiados"] += len(corregidas)
+    socketio.emit("round_results_update", {
+        "ronda": pendiente["ronda"],
+        "letra": letra,
+        "validaciones_ia": validaciones_ia,
+        "puntos_por_respuesta": puntos_mostrados_ronda(sala, respuestas_por_jugador, validaciones_ia, letra),
+        "scores_ronda": scores_ronda,
+        "scores_total": puntuaciones,
+        "puntuaciones_equipos": puntuaciones_equipos,
+        "corregidas": corregidas
+    }, room=codigo)
+    save_state(state)
+    print(f"🔁 round_results_update emitido a sala {codigo}: {len(definitivos)} veredictos definitivos, "
+          f"{len(corregidas)} cambiados")
+
+
 # ==========================================================
 # FUNCIÓN DE PUNTUACIÓN
 # ==========================================================
@@ -1227,9 +1713,8 @@ def calcular_puntuaciones(codigo):
              
     puntuaciones_ronda = {jugador: 0 for jugador in jugadores}
     
-    # 1. VALIDAR CON IA primero y agrupar respuestas válidas por categoría
-    # OPTIMIZACIÓN: Validar en paralelo usando ThreadPoolExecutor + Cache de respuestas duplicadas
-    respuestas_validas_por_categoria = {}
+    # 1. VALIDAR CON IA primero
+    # OPTIMIZACIÓN: Validar en paralelo usando el ejecutor de IA + Cache de respuestas duplicadas
     validaciones_ia = {}  # Almacenar resultados de IA para mostrar en UI
     cache_validaciones = {}  # Cache para respuestas duplicadas
     
@@ -1261,90 +1746,199 @@ def calcular_puntuaciones(codigo):
     
     print(f"   → {len(tareas_validacion)} respuestas únicas de {sum(len(r) for r in respuestas_por_jugador.values())} totales")
     
+    # Veredictos ya conocidos (validados durante la ronda, o de otras rondas,
+    # salas o instancias a través de la tabla de validaciones)
+    # Plazo total de la validación: lo que no llegue a tiempo se puntúa provisionalmente
+    limite_validacion = time.time() + PRESUPUESTO_VALIDACION_S
+    claves_ia = []
+    if OPENAI_AVAILABLE and openai_client:
+        claves_ia = list({
+            clave_validacion(tarea['respuesta'], tarea['categoria'], letra)
+            for tarea in tareas_validacion
+            if not validacion_previa_basica(tarea['respuesta'], tarea['categoria'], letra)[0]
+        })
+        total_ia = len(claves_ia)
+        esperadas, _ = validador_incremental.reclamar(claves_ia, limite=PRESUPUESTO_VALIDACION_S / 2)
+        resueltas_antes = total_ia - len(cache_validaciones_ia.faltantes(claves_ia))
+        claves_ia = precargar_validaciones(claves_ia)
+        metricas_final_ronda["rondas"] += 1
+        metricas_final_ronda["respuestas_ia"] += total_ia
+        metricas_final_ronda["resueltas_antes"] += resueltas_antes
+        metricas_final_ronda["esperadas"] += esperadas
+        metricas_final_ronda["rezagadas"] += len(claves_ia)
+        print(f"   → {resueltas_antes}/{total_ia} respuestas ya validadas antes del final "
+              f"({esperadas} en curso esperadas), {len(claves_ia)} pendientes")
+    
+    inicio_tareas = {}  # {id(tarea): cuándo empezó su primera validación}
+    
     # Función auxiliar para validar una respuesta
-    def validar_tarea(tarea):
+    def validar_tarea(tarea, cobertura=False):
+        inicio_tareas.setdefault(id(tarea), time.perf_counter())
         categoria = tarea['categoria']
         respuesta = tarea['respuesta']
         clave_cache = tarea['clave_cache']
         
-        # Sistema de reintentos para alta concurrencia
-        max_reintentos = 2
-        for intento in range(max_reintentos):
-            try:
-                es_valida_ia, razon_ia, confianza_ia = validar_respuesta_con_ia(
-                    respuesta, categoria, letra
-                )
-                
-                return {
-                    'clave_cache': clave_cache,
-                    'categoria': categoria,
-                    'respuesta': respuesta,
-                    'es_valida_ia': es_valida_ia,
-                    'razon_ia': razon_ia,
-                    'confianza_ia': confianza_ia
-                }
-            except Exception as e:
-                if intento < max_reintentos - 1:
-                    # Esperar un poco antes de reintentar
-                    time.sleep(0.5)
-                    continue
-                else:
-                    # Último intento falló, devolver error
-                    print(f"⚠️ Error tras {max_reintentos} intentos: {e}")
-                    return {
-                        'clave_cache': clave_cache,
-                        'categoria': categoria,
-                        'respuesta': respuesta,
-                        'es_valida_ia': False,
-                        'razon_ia': f"Error de validación tras reintentos",
-                        'confianza_ia': 0.3
-                    }
+        # El ritmo y los errores de la API los gestiona el cliente protegido
+        # (límite por minuto y cortacircuitos), así que aquí no se reintenta
+        try:
+            es_valida_ia, razon_ia, confianza_ia = validar_respuesta_con_ia(
+                respuesta, categoria, letra, compartir=not cobertura
+            )
+        except Exception as e:
+            print(f"⚠️ Error validando '{respuesta}': {e}")
+            es_valida_ia, razon_ia, confianza_ia = False, "Error de validación", 0.3
+        
+        return {
+            'clave_cache': clave_cache,
+            'categoria': categoria,
+            'respuesta': respuesta,
+            'es_valida_ia': es_valida_ia,
+            'razon_ia': razon_ia,
+            'confianza_ia': confianza_ia
+        }
+    
+    # Las respuestas que irán a la IA se agrupan por categoría: un lote por
+    # llamada, con todas las formas de escribir cada respuesta juntas
+    lotes = []
+    if VALIDACION_POR_LOTES and len(claves_ia) > 1:
+        pendientes_ia = set(claves_ia)
+        por_categoria = {}
+        for tarea in tareas_validacion:
+            clave = clave_validacion(tarea['respuesta'], tarea['categoria'], letra)
+            if clave in pendientes_ia:
+                por_categoria.setdefault(tarea['categoria'], {}).setdefault(clave, []).append(tarea)
+        for categoria, por_clave in por_categoria.items():
+            grupos = list(por_clave.values())
+            if len(grupos) < 2:
+                continue  # Una sola respuesta: la llamada individual es más corta
+            for i in range(0, len(grupos), MAX_RESPUESTAS_POR_LOTE):
+                lotes.append((categoria, grupos[i:i + MAX_RESPUESTAS_POR_LOTE]))
+    en_lote = {id(tarea) for _, grupos in lotes for grupo in grupos for tarea in grupo}
+    
+    resueltas = set()  # id() de las tareas que ya tienen veredicto
+    
+    def registrar_resultado(resultado):
+        clave_cache = resultado['clave_cache']
+        es_valida_ia = resultado['es_valida_ia']
+        razon_ia = resultado['razon_ia']
+        confianza_ia = resultado['confianza_ia']
+        
+        # Guardar en cache
+        cache_validaciones[clave_cache] = {
+            "validada_ia": es_valida_ia,
+            "razon_ia": razon_ia,
+            "confianza": confianza_ia,
+            "apelable": confianza_ia < 0.9
+        }
+    
+    # Ejecutar validaciones en paralelo en el ejecutor compartido de la IA,
+    # que limita las llamadas simultáneas de todo el proceso y reparte turnos
+    # entre las salas que terminan la ronda a la vez
+    print(f"   → Validación paralela: {len(lotes)} lotes, {len(tareas_validacion) - len(en_lote)} individuales "
+          f"({ejecutor_ia.estado()['pendientes']} tareas de IA ya en cola)")
     
-    # Ejecutar validaciones en paralelo (escalado dinámico según número de jugadores)
-    # Para 40+ jugadores, usar más workers
-    num_workers = min(20, max(10, len(tareas_validacion) // 4))  # Entre 10-20 workers
-    print(f"   → Usando {num_workers} workers para validación paralela")
+    def enviar(funcion, *args):
+        return ejecutor_ia.enviar(funcion, *args, sala=codigo, prioridad=PRIORIDAD_PUNTUACION)
     
     tiempo_inicio = time.time()
-    with ThreadPoolExecutor(max_workers=num_workers) as executor:
-        # Enviar todas las tareas
-        futures = {executor.submit(validar_tarea, tarea): tarea for tarea in tareas_validacion}
-        
-        # Procesar resultados conforme vayan llegando
-        for future in as_completed(futures):
+    # Enviar todas las tareas
+    futures = {enviar(validar_tarea, tarea): tarea
+               for tarea in tareas_validacion if id(tarea) not in en_lote}
+    for categoria, grupos in lotes:
+        respuestas_lote = [grupo[0]['respuesta'] for grupo in grupos]
+        futures[enviar(validar_lote_con_ia, respuestas_lote, categoria, letra)] = grupos
+    
+    # Procesar resultados conforme vayan llegando, hasta el plazo. Una
+    # validación individual que tarda más de lo habitual se pide otra vez
+    umbral = umbral_cobertura()
+    cubiertas = set()
+    primera_peticion = {}  # {id(tarea): future original de las tareas cubiertas}
+    max_coberturas = max(2, len(tareas_validacion) // 10)
+    while futures:
+        restante = limite_validacion - time.time()
+        if restante <= 0:
+            break
+        hechos, _ = wait(futures, timeout=min(restante, 0.25), return_when=FIRST_COMPLETED)
+        for future in hechos:
+            tarea = futures.pop(future)
+            if isinstance(tarea, list):
+                # Lote: lo que la IA no cubrió se valida respuesta por respuesta
+                try:
+                    veredictos = future.result()
+                except Exception as e:
+                    print(f"⚠️ Error validando un lote: {e}")
+                    veredictos = {}
+                for grupo in tarea:
+                    veredicto = veredictos.get(grupo[0]['respuesta'])
+                    for tarea_grupo in grupo:
+                        if veredicto is None:
+                            metricas_lotes["a_individual"] += 1
+                            futures[enviar(validar_tarea, tarea_grupo)] = tarea_grupo
+                            continue
+                        resueltas.add(id(tarea_grupo))
+                        registrar_resultado({
+                            'clave_cache': tarea_grupo['clave_cache'],
+                            'categoria': tarea_grupo['categoria'],
+                            'respuesta': tarea_grupo['respuesta'],
+                            'es_valida_ia': veredicto[0],
+                            'razon_ia': veredicto[1],
+                            'confianza_ia': veredicto[2]
+                        })
+                continue
+            if id(tarea) in resueltas:
+                continue  # Ganó la otra copia (cobertura)
+            resueltas.add(id(tarea))
+            if id(tarea) in cubiertas and future is not primera_peticion[id(tarea)]:
+                metricas_plazo["coberturas_ganadoras"] += 1
             try:
-                resultado = future.result()
-                clave_cache = resultado['clave_cache']
-                categoria = resultado['categoria']
-                respuesta = resultado['respuesta']
-                es_valida_ia = resultado['es_valida_ia']
-                razon_ia = resultado['razon_ia']
-                confianza_ia = resultado['confianza_ia']
-                
-                # Guardar en cache
-                cache_validaciones[clave_cache] = {
-                    "validada_ia": es_valida_ia,
-                    "razon_ia": razon_ia,
-                    "confianza": confianza_ia,
-                    "apelable": confianza_ia < 0.9
-                }
-                
-                # Agregar a válidas si IA aprueba
-                respuesta_upper = respuesta.strip().upper()
-                if es_valida_ia and respuesta_upper.startswith(letra):
-                    if categoria not in respuestas_validas_por_categoria:
-                        respuestas_validas_por_categoria[categoria] = []
-                    respuestas_validas_por_categoria[categoria].append(respuesta_upper)
-                    
+                registrar_resultado(future.result())
             except Exception as e:
                 print(f"⚠️ Error validando: {e}")
-                tarea = futures[future]
                 cache_validaciones[tarea['clave_cache']] = {
                     "validada_ia": False,
                     "razon_ia": f"Error de validación: {str(e)[:50]}",
                     "confianza": 0.5,
                     "apelable": True
                 }
+        
+        # Las copias que perdieron ya no hacen falta
+        for future, tarea in list(futures.items()):
+            if not isinstance(tarea, list) and id(tarea) in resueltas:
+                del futures[future]
+                future.cancel()
+        
+        ahora = time.perf_counter()
+        for future, tarea in list(futures.items()):
+            if len(cubiertas) >= max_coberturas:
+                break
+            if isinstance(tarea, list) or id(tarea) in cubiertas:
+                continue
+            iniciada = inicio_tareas.get(id(tarea))
+            if iniciada is not None and ahora - iniciada > umbral:
+                cubiertas.add(id(tarea))
+                primera_peticion[id(tarea)] = future
+                metricas_plazo["coberturas"] += 1
+                futures[enviar(validar_tarea, tarea, True)] = tarea  # Sin esperar a la llamada lenta
+    
+    # Plazo agotado: lo pendiente se puntúa ya con la validación local y la IA
+    # sigue en segundo plano (ver corregir_ronda_provisional)
+    metricas_plazo["rondas"] += 1
+    provisionales = []
+    for tarea in futures.values():
+        for grupo in (tarea if isinstance(tarea, list) else [[tarea]]):
+            for tarea_grupo in grupo:
+                if id(tarea_grupo) in resueltas:
+                    continue
+                resueltas.add(id(tarea_grupo))
+                validacion = validacion_provisional(tarea_grupo['respuesta'], tarea_grupo['categoria'], letra)
+                cache_validaciones[tarea_grupo['clave_cache']] = validacion
+                if not validacion.get("provisional"):
+                    continue
+                provisionales.append(tarea_grupo)
+    if provisionales:
+        metricas_plazo["rondas_provisionales"] += 1
+        metricas_plazo["respuestas_provisionales"] += len(provisionales)
+        print(f"⌛ Plazo de {PRESUPUESTO_VALIDACION_S:.1f}s agotado: {len(provisionales)} respuestas con veredicto provisional")
     
     # Aplicar resultados cacheados a todos los jugadores
     for jugador, respuestas in respuestas_por_jugador.items():
@@ -1359,6 +1953,17 @@ def calcular_puntuaciones(codigo):
     
     tiempo_total = time.time() - tiempo_inicio
     print(f"✅ Validación paralela completada en {tiempo_total:.2f} segundos ({len(tareas_validacion)} validaciones únicas)")
+    metricas_final_ronda["segundos_validacion"] += tiempo_total
+    metricas_final_ronda["ultima_validacion_s"] = round(tiempo_total, 2)
+    
+    # Los veredictos nuevos de la IA pasan a la tabla de validaciones en segundo plano
+    nuevos_veredictos = {}
+    for clave in claves_ia:
+        veredicto = cache_validaciones_ia.ver(clave)
+        if veredicto is not None:
+            nuevos_veredictos[clave] = (*veredicto, "ia")
+    if nuevos_veredictos:
+        threading.Thread(target=guardar_veredictos, args=(nuevos_veredictos,)).start()
     
     # Procesar respuestas vacías o muy cortas (las que no se validaron)
     for jugador, respuestas in respuestas_por_jugador.items():
@@ -1373,32 +1978,17 @@ def calcular_puntuaciones(codigo):
                     "apelable": False
                 }
 
-    # 2. Calcular puntos para cada jugador
-    modo_juego = sala.get("modo_juego", "clasico")
-    multiplicador = 1.0
-    
-    # Aplicar multiplicadores según el modo
-    if modo_juego == "rapido":
-        multiplicador = 1.5  # Más puntos en modo rápido
-    elif modo_juego == "duelo":
-        multiplicador = 2.0  # Doble puntos en duelo
-    
-    for jugador, respuestas in respuestas_por_jugador.items():
-        if jugador not in jugadores: continue
-        for categoria, respuesta in respuestas.items():
-            respuesta_limpia = respuesta.strip().upper()
-            
-            if respuesta_limpia and respuesta_limpia.startswith(letra):
-                lista_respuestas = respuestas_validas_por_categoria.get(categoria, [])
-                
-                if lista_respuestas.count(respuesta_limpia) == 1:
-                    puntuaciones_ronda[jugador] += int(100 * multiplicador)
-                elif lista_respuestas.count(respuesta_limpia) > 1:
-                    puntuaciones_ronda[jugador] += int(50 * multiplicador)
+    # 2. Calcular puntos para cada jugador (con la misma función que usa
+    # corregir_ronda_provisional, para que la corrección deshaga esto exactamente)
+    respuestas_jugadores = {j: r for j, r in respuestas_por_jugador.items() if j in jugadores}
+    puntos_ganados_ronda = puntos_por_respuesta_ronda(sala, respuestas_jugadores, validaciones_ia, letra)
+    for jugador, puntos_jugador in puntos_ganados_ronda.items():
+        puntuaciones_ronda[jugador] += sum(puntos_jugador.values())
 
     # 3. Actualizar puntuaciones totales Y OTORGAR POWER-UPS
     puntuaciones_totales = sala.get("puntuaciones", {j: 0 for j in jugadores})
     powerups_ganados = {}  # Registrar power-ups ganados en esta ronda
+    con_multiplicador = set()
     
     for jugador, puntos in puntuaciones_ronda.items():
         if jugador not in puntuaciones_totales:
@@ -1409,25 +1999,16 @@ def calcular_puntuaciones(codigo):
         if "multiplicador" in powerups_activos_jugador:
             puntos *= 2
             powerups_activos_jugador.remove("multiplicador")
+            con_multiplicador.add(jugador)
             print(f"💎 {jugador} usó multiplicador x2 - Puntos: {puntos//2} → {puntos}")
         
         puntuaciones_totales[jugador] += puntos
         
         # ========== OTORGAR POWER-UPS AUTOMÁTICAMENTE ==========
-        # Contar respuestas únicas y totales del jugador
-        respuestas_jugador = respuestas_por_jugador.get(jugador, {})
-        respuestas_unicas = 0
-        respuestas_totales = 0
-        
-        for categoria, respuesta in respuestas_jugador.items():
-            respuesta_limpia = respuesta.strip().upper()
-            if respuesta_limpia and respuesta_limpia.startswith(letra):
-                validacion_jugador = validaciones_ia.get(jugador, {}).get(categoria, {})
-                if validacion_jugador.get("validada_ia", False):
-                    respuestas_totales += 1
-                    lista_respuestas = respuestas_validas_por_categoria.get(categoria, [])
-                    if lista_respuestas.count(respuesta_limpia) == 1:
-                        respuestas_unicas += 1
+        # Contar respuestas únicas y totales del jugador (toda respuesta que
+        # puntúa cuenta como única: las repetidas no se distinguen al puntuar)
+        respuestas_totales = sum(1 for p in puntos_ganados_ronda.get(jugador, {}).values() if p > 0)
+        respuestas_unicas = respuestas_totales
         
         # Inicializar powerups del jugador si no existen
         if "powerups_jugadores" not in sala:
@@ -1470,30 +2051,7 @@ def calcular_puntuaciones(codigo):
         sala["puntuaciones_equipos"] = puntuaciones_equipos
     
     # Calcular cuántos puntos dio cada respuesta por categoría
-    puntos_por_respuesta = {}
-    dificultad = sala.get("dificultad", "normal")
-    config = DIFICULTADES.get(dificultad, DIFICULTADES["normal"])
-    
-    for jugador, respuestas in respuestas_por_jugador.items():
-        if jugador not in jugadores: continue
-        puntos_por_respuesta[jugador] = {}
-        
-        for categoria, respuesta in respuestas.items():
-            respuesta_limpia = respuesta.strip().upper()
-            puntos = 0
-            
-            if respuesta_limpia and respuesta_limpia.startswith(letra):
-                # Verificar si la IA la validó
-                validacion_jugador = validaciones_ia.get(jugador, {}).get(categoria, {})
-                if validacion_jugador.get("validada_ia", False):
-                    lista_respuestas = respuestas_validas_por_categoria.get(categoria, [])
-                    
-                    if lista_respuestas.count(respuesta_limpia) == 1:
-                        puntos = int(config["puntos_unico"] * multiplicador)
-                    elif lista_respuestas.count(respuesta_limpia) > 1:
-                        puntos = int(config["puntos_duplicado"] * multiplicador)
-            
-            puntos_por_respuesta[jugador][categoria] = puntos
+    puntos_por_respuesta = puntos_mostrados_ronda(sala, respuestas_jugadores, validaciones_ia, letra)
     
     # Guardar validaciones en la sala para que persistan (necesario para apelaciones)
     sala["validaciones_ia"] = validaciones_ia
@@ -1553,9 +2111,22 @@ def calcular_puntuaciones(codigo):
         "anfitrion": sala.get("anfitrion"),
         "modo_juego": modo_juego,
         "equipos": equipos,
-        "puntuaciones_equipos": puntuaciones_equipos
+        "puntuaciones_equipos": puntuaciones_equipos,
+        "provisional": bool(provisionales)  # Nueva: llegará un round_results_update
     }
     
+    if provisionales:
+        # conteo_final lanza la corrección cuando ya emitió round_results
+        rondas_provisionales[codigo] = {
+            "futures": list(futures),
+            "provisionales": provisionales,
+            "letra": letra,
+            "ronda": sala.get("ronda_actual"),
+            "jugadores": list(jugadores),
+            "scores_ronda": dict(puntuaciones_ronda),
+            "con_multiplicador": con_multiplicador
+        }
+    
     print(f"📦 Results packet preparado con validaciones_ia: {len(validaciones_ia)} jugadores")
     return results_packet
 
@@ -1809,15 +2380,7 @@ def join_room_route():
 
 @app.route("/waiting/<codigo>")
 def waiting_room(codigo):
-    # --- BLOQUE DE RECUPERACIÓN ---
-    if codigo not in state["salas"]:
-        with app.app_context():
-            sala_db = db.session.get(SalaDB, codigo)
-            if sala_db:
-                state["salas"][codigo] = sala_db.datos
-                print(f"🔄 Sala {codigo} recuperada de BD en waiting")
-    # -----------------------------
-
+    # Si la sala no está en memoria, state["salas"] la recupera de la BD (recuperar_sala)
     sala = state["salas"].get(codigo)
     if not sala:
         return "❌ Sala no encontrada", 404
@@ -1936,15 +2499,7 @@ def start_game(codigo):
 
 @app.route("/game/<codigo>")
 def game(codigo):
-    # --- BLOQUE DE RECUPERACIÓN ---
-    if codigo not in state["salas"]:
-        with app.app_context():
-            sala_db = db.session.get(SalaDB, codigo)
-            if sala_db:
-                state["salas"][codigo] = sala_db.datos
-                print(f"🔄 Sala {codigo} recuperada de BD en game")
-    # -----------------------------
-
+    # Si la sala no está en memoria, state["salas"] la recupera de la BD (recuperar_sala)
     if codigo not in state["salas"]:
         return "Sala no encontrada", 404
 
@@ -2448,11 +3003,26 @@ def handle_enviar_respuestas(data):
             }, room=request.sid)
             return
         
+        if not isinstance(respuestas, dict):
+            return
+        
+        # Envíos parciales durante la ronda: se ignoran los que llegan tarde
+        # (otra letra o la ronda ya terminó) para no pisar las respuestas finales
+        parcial = bool(data.get("parcial", False))
+        if parcial and (not sala.get("en_curso", False) or sala.get("basta_activado", False)
+                        or str(data.get("letra", "")).upper() != sala.get("letra", "?").upper()):
+            return
+        
         if "respuestas_ronda" not in sala:
             sala["respuestas_ronda"] = {}
+        anteriores = sala["respuestas_ronda"].get(jugador) or {}
         sala["respuestas_ronda"][jugador] = respuestas
         save_state(state)
-        print(f"📋 Respuestas recibidas de {jugador} en sala {codigo}")
+        encoladas = encolar_respuestas_nuevas(codigo, sala, respuestas, anteriores)
+        if parcial:
+            print(f"📝 Respuestas parciales de {jugador} en sala {codigo} ({encoladas} a validar)")
+        else:
+            print(f"📋 Respuestas recibidas de {jugador} en sala {codigo}")
 
 @socketio.on("anfitrion_recrear_sala")
 def handle_anfitrion_recrear_sala(data):
@@ -2487,6 +3057,10 @@ def handle_anfitrion_recrear_sala(data):
 def conteo_final(codigo):
     with app.app_context():
         for s in range(5, 0, -1):
+            if s in (5, 3):
+                # La validación empieza ya; a mitad de la cuenta atrás se suman
+                # las respuestas que los jugadores enviaron al recibir el ¡BASTA!
+                prevalidar_respuestas(codigo)
             socketio.emit("update_timer", {"tiempo": s, "fase": "basta"}, room=codigo)
             time.sleep(1)
         
@@ -2503,6 +3077,7 @@ def conteo_final(codigo):
             fin_del_juego = True
             sala["en_curso"] = False
             sala["finalizada"] = True  # Marcar partida como finalizada
+            sala["finalizada_en"] = time.time()  # Para archivarla tras el periodo de gracia
         else:
             sala["ronda_actual"] = ronda_actual + 1
             sala["en_curso"] = False
@@ -2535,6 +3110,10 @@ def conteo_final(codigo):
             socketio.emit("round_results", results_packet, room=codigo)
             print(f"✅ round_results emitido correctamente")
         
+        pendiente = rondas_provisionales.pop(codigo, None)
+        if pendiente:
+            threading.Thread(target=corregir_ronda_provisional, args=(codigo, pendiente), daemon=True).start()
+        
         sala["basta_activado"] = False
         # NO limpiar respuestas_ronda todavía - se necesitan para apelaciones
         # sala["respuestas_ronda"] = {}
@@ -2560,7 +3139,8 @@ def conteo_final(codigo):
         
         sala["jugadores_desconectados"] = jugadores_realmente_desconectados
         
-        save_state(state)
+        # Punto crítico: fin de ronda/partida se guarda de forma síncrona
+        flush_state()
         
         # Notificar a todos sobre el estado actualizado de jugadores listos
         socketio.emit("player_joined", {
@@ -2717,6 +3297,11 @@ def handle_usar_powerup(data):
             emit("powerup_error", {"error": "IA no disponible"})
             return
         
+        if not ia_disponible():
+            # Cortacircuitos abierto: no se consume el power-up
+            emit("powerup_error", {"error": "La IA está saturada, inténtalo en unos segundos"})
+            return
+        
         if not categoria:
             emit("powerup_error", {"error": "Debes especificar una categoría"})
             return
@@ -2738,8 +3323,13 @@ IMPORTANTE:
 
 Ejemplo: Si categoría es "Animal" y letra "R", responde: Rinoceronte"""
 
-            response = openai_client.chat.completions.create(
-                model="gpt-4o-mini",
+            # La misma pista pedida a la vez desde varias salas: una sola llamada
+            response = vuelos_ia.ejecutar(
+                ("pista", normalizar_texto(categoria).lower(), letra.upper()),
+                ejecutor_ia.ejecutar,
+                openai_client.chat.completions.create,
+                sala=codigo,
+                model=enrutador_ia.modelo("rapido"),
                 messages=[
                     {"role": "system", "content": "Eres un asistente que sugiere palabras válidas para el juego BASTA/Stop."},
                     {"role": "user", "content": prompt}
@@ -2973,16 +3563,22 @@ def handle_solicitar_apelacion(data):
     codigo = data.get("codigo")
     jugador = data.get("jugador")
     categoria = data.get("categoria")
-    respuesta = data.get("respuesta")
     
     emit_admin_log(f"⚠️ [APELACIÓN] Solicitud de {jugador}", "apelacion", codigo)
-    print(f"   → Categoría: {categoria}, Respuesta: '{respuesta}'")
     
     sala = state["salas"].get(codigo)
     if not sala:
         print(f"❌ Sala {codigo} no encontrada")
         return
     
+    # La respuesta apelada es la que guardó el servidor, no la que manda el cliente:
+    # si la apelación se acepta, su veredicto vale para todas las salas
+    respuesta = (sala.get("respuestas_ronda", {}).get(jugador) or {}).get(categoria)
+    if not isinstance(respuesta, str) or not respuesta.strip():
+        print(f"❌ {jugador} no tiene respuesta en {categoria} que apelar")
+        return
+    print(f"   → Categoría: {categoria}, Respuesta: '{respuesta}'")
+    
     # Crear key única para la apelación
     key = f"{jugador}:{categoria}"
     
@@ -3009,6 +3605,38 @@ def handle_solicitar_apelacion(data):
         "respuesta": respuesta
     }, room=codigo)
     emit_admin_log(f"📤 Votación de apelación iniciada", "apelacion", codigo)
+    
+    # Segunda opinión del modelo fuerte mientras se vota (deciden los votos)
+    if enrutador_ia.puede_escalar() and respuesta and sala.get("letra") and ia_disponible():
+        ejecutor_ia.enviar(segunda_opinion_apelacion, codigo, key, respuesta, categoria, sala["letra"],
+                           sala=codigo, prioridad=PRIORIDAD_INTERACTIVA)
+
+
+def segunda_opinion_apelacion(codigo, key, respuesta, categoria, letra):
+    """Revalida con el modelo fuerte una respuesta apelada y manda su opinión a la sala"""
+    respuesta_limpia = respuesta.strip()
+    try:
+        valida, razon, confianza = consultar_modelo_validacion(respuesta_limpia, categoria, letra, nivel="fuerte")
+    except Exception as e:
+        print(f"⚠️ Sin segunda opinión para la apelación {key}: {type(e).__name__}: {e}")
+        return
+    clave = clave_validacion(respuesta_limpia, categoria, letra)
+    anterior = cache_validaciones_ia.ver(clave)
+    cambio = anterior is not None and anterior[0] != valida
+    enrutador_ia.registrar_decision("escalada_apelacion", categoria, respuesta_limpia, confianza, cambio)
+    # Solo es una opinión para la sala: no se guarda en la caché, donde podría pisar
+    # el veredicto de la votación (o de un admin), que nunca deshace la IA
+    socketio.emit("apelacion_opinion_ia", {
+        "key": key,
+        "categoria": categoria,
+        "respuesta": respuesta,
+        "valida": valida,
+        "razon": razon,
+        "confianza": confianza,
+        "modelo": enrutador_ia.modelo("fuerte"),
+    }, room=codigo)
+    emit_admin_log(f"🤖 [APELACIÓN] {enrutador_ia.modelo('fuerte')} opina que '{respuesta_limpia}' "
+                   f"{'es válida' if valida else 'no es válida'} ({confianza:.0%}): {razon}", "apelacion", codigo)
 
 
 @socketio.on("votar_apelacion")
@@ -3076,6 +3704,15 @@ def handle_votar_apelacion(data):
                 "apelable": False
             }
             
+            # La próxima vez que alguien escriba esta respuesta ya cuenta como válida
+            # (la respuesta guardada en el servidor, nunca la que mandó el cliente)
+            respuesta_apelada = (sala.get("respuestas_ronda", {}).get(jugador_apelado) or {}).get(categoria)
+            if isinstance(respuesta_apelada, str) and respuesta_apelada.strip():
+                threading.Thread(target=fijar_veredicto, args=(
+                    respuesta_apelada, categoria, sala.get("letra", "?"), True,
+                    "Apelación aceptada por votación de jugadores", "apelacion"
+                )).start()
+            
             # Calcular y dar puntos
             respuestas_ronda = sala.get("respuestas_ronda", {})
             puntos_ganados = 0
@@ -3619,6 +4256,71 @@ def get_estadisticas():
         }
     })
 
+@app.route("/api/admin/persistencia", methods=["GET"])
+@require_admin_auth
+def get_metricas_persistencia():
+    """Métricas del escritor de salas en segundo plano (solo admin)"""
+    return jsonify({
+        "ok": True,
+        "diferida": ESCRITURA_DIFERIDA,
+        "escritor": escritor_salas.estado(),
+        "archivo": archivador_salas.estado() if ARCHIVO_SALAS else None,
+        "instantanea": instantanea_salas.estado() if INSTANTANEA_SALAS else None
+    })
+
+@app.route("/api/admin/cache_validacion", methods=["GET"])
+@require_admin_auth
+def get_metricas_cache_validacion():
+    """Aciertos de la caché de validaciones y llamadas a la IA ahorradas (solo admin)"""
+    return jsonify({
+        "ok": True,
+        "cache": cache_validaciones_ia.estadisticas(),
+        "lotes": {**metricas_lotes, "activos": VALIDACION_POR_LOTES, "max_por_lote": MAX_RESPUESTAS_POR_LOTE},
+        "incremental": {**validador_incremental.estado(), "activa": VALIDACION_INCREMENTAL},
+        "ejecutor": ejecutor_ia.estado(),
+        "lexico": {**lexico_local.estado(), "activo": LEXICO_LOCAL},
+        "correccion": {**metricas_correccion, "activa": CORRECCION_LOCAL},
+        "clasificador": clasificador_local.estado() if clasificador_local is not None else None,
+        "llamadas": resumen_llamadas_ia(),
+        "enrutado": enrutador_ia.estado(),
+        "llamadas_compartidas": vuelos_ia.estado(),
+        "plazo": {
+            **metricas_plazo,
+            "presupuesto_s": PRESUPUESTO_VALIDACION_S,
+            "umbral_cobertura_s": round(umbral_cobertura(), 2)
+        },
+        "cliente": openai_client.estado() if isinstance(openai_client, ClienteIAProtegido) else None,
+        "final_ronda": {
+            **metricas_final_ronda,
+            "segundos_validacion": round(metricas_final_ronda["segundos_validacion"], 2),
+            "fraccion_resuelta_antes": round(
+                metricas_final_ronda["resueltas_antes"] / metricas_final_ronda["respuestas_ia"], 3
+            ) if metricas_final_ronda["respuestas_ia"] else 0.0
+        }
+    })
+
+@app.route("/api/admin/validacion", methods=["POST"])
+@require_admin_auth
+def fijar_validacion():
+    """Fijar a mano el veredicto de una respuesta para todas las salas (solo admin)"""
+    data = request.get_json() or {}
+    respuesta = (data.get("respuesta") or "").strip()
+    categoria = (data.get("categoria") or "").strip()
+    letra = (data.get("letra") or "").strip()
+    if not respuesta or not categoria or len(letra) != 1:
+        return jsonify({"ok": False, "error": "Faltan respuesta, categoria o letra"}), 400
+    
+    valida = bool(data.get("valida", True))
+    razon = data.get("razon") or ("Aceptada por el administrador" if valida else "Rechazada por el administrador")
+    fijar_veredicto(respuesta, categoria, letra, valida, razon, "admin")
+    print(f"🛠️ [ADMIN] Veredicto fijado para '{respuesta}' ({categoria}, letra {letra.upper()}): {'✅' if valida else '❌'}")
+    
+    return jsonify({
+        "ok": True,
+        "clave": list(clave_validacion(respuesta, categoria, letra)),
+        "valida": valida
+    })
+
 @app.route("/api/admin/sala/<codigo>/pausar", methods=["POST"])
 @require_admin_auth
 def pausar_ronda(codigo):
@@ -3776,11 +4478,21 @@ def recover():
         if os.path.exists(crash_lock_path):
             os.remove(crash_lock_path)
         global state
-        state = load_state()
-        return jsonify({"ok": True, "message": "Recuperación exitosa"}), 200
+        # Lo pendiente de las salas actuales se guarda antes de descartarlas
+        flush_state()
+        # Desde la BD: la instantánea puede ser anterior a lo que se acaba de guardar
+        state = load_state(usar_instantanea=False)
+        return jsonify({"ok": True, "message": "Recuperación exitosa", "carga": ultima_carga}), 200
     except Exception as e:
         return jsonify({"ok": False, "error": str(e)}), 500
 
+try:
+    import resource
+    _rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+except ImportError:
+    _rss_mb = 0
+print(f"🚀 Arranque completado en {(time.perf_counter() - _inicio_arranque) * 1000:.0f} ms (RSS máx: {_rss_mb:.0f} MB)")
+
 # ==========================================================
 # EJECUCIÓN LOCAL
 # ==========================================================
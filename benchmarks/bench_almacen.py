@@ -0,0 +1,73 @@
+"""
+Latencia de cada almacén de estado (memoria, SQLite en WAL y MySQL si se
+indica BASTA_BENCH_MYSQL con una URI de SQLAlchemy): guardar todas las
+salas, guardar un cambio en una sala, cargar todas al arrancar y recuperar
+una sala suelta.
+
+Uso: python benchmarks/bench_almacen.py [num_salas]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+from comun import crear_app_sqlite, medir, sala_de_prueba
+
+from flask import Flask
+
+from almacen import AlmacenMemoria, AlmacenSQL
+from database import db, init_db
+from persistencia import SalasRastreadas
+
+
+def almacenes(directorio):
+    yield "memoria", AlmacenMemoria()
+    yield "sqlite (WAL)", AlmacenSQL(crear_app_sqlite(os.path.join(directorio, "estado.db")))
+    uri_mysql = os.getenv("BASTA_BENCH_MYSQL")
+    if uri_mysql:
+        app = Flask("bench_mysql")
+        app.config["SQLALCHEMY_DATABASE_URI"] = uri_mysql
+        app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+        init_db(app)
+        yield "mysql", AlmacenSQL(app)
+
+
+def main():
+    num_salas = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    print(f"{num_salas} salas de 8 jugadores")
+    print(f"{'almacén':>13} | {'guardar todas ms':>16} | {'guardar 1 cambio ms':>19} | {'cargar todas ms':>15} | {'recuperar 1 ms':>14}")
+    print("-" * 91)
+    with tempfile.TemporaryDirectory() as directorio:
+        for nombre, almacen in almacenes(directorio):
+            salas = SalasRastreadas(rutas=True)
+            for i in range(num_salas):
+                salas[f"S{i:04d}"] = sala_de_prueba(jugadores=8)
+
+            inicio = time.perf_counter()
+            almacen.guardar(salas, salas.tomar_sucias(), eventos=50)
+            ms_todas = (time.perf_counter() - inicio) * 1000
+
+            codigos = list(salas)
+
+            def un_cambio():
+                sala = salas[random.choice(codigos)]
+                sala["puntuaciones"][sala["jugadores"][0]] += 10
+                almacen.guardar(salas, salas.tomar_sucias(), eventos=50)
+
+            def cargar_todas():
+                almacen.precargar(SalasRastreadas(), "todas")
+
+            def recuperar_una():
+                almacen.cargar_sala(random.choice(codigos))
+
+            print(f"{nombre:>13} | {ms_todas:>16.1f} | {medir(un_cambio, 50):>19.2f} | "
+                  f"{medir(cargar_todas, 3):>15.1f} | {medir(recuperar_una, 50):>14.2f}")
+            if isinstance(almacen, AlmacenSQL):
+                with almacen.app.app_context():
+                    db.session.remove()
+                    db.engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
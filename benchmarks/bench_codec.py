@@ -0,0 +1,55 @@
+"""
+Tamaño de fila y costo de codificar/decodificar una sala con cada codec de la
+columna salas.datos (JSON original, JSON compacto, zlib y zstd si está
+instalado), sobre las salas de checkpoint.json y salas sintéticas grandes.
+
+Uso: python benchmarks/bench_codec.py
+"""
+import json
+import os
+
+from comun import RAIZ, medir, sala_de_prueba
+
+from database import codificar, decodificar, zstandard
+
+
+def salas_de_checkpoint():
+    ruta = os.path.join(RAIZ, "checkpoint.json")
+    if not os.path.exists(ruta):
+        return []
+    with open(ruta, encoding="utf-8") as f:
+        return list(json.load(f).get("salas", {}).values())
+
+
+def codecs():
+    lista = [("json original", lambda s: json.dumps(s)), ("json compacto", lambda s: codificar(s, "json")),
+             ("zlib", lambda s: codificar(s, "zlib"))]
+    if zstandard is not None:
+        lista.append(("zstd", lambda s: codificar(s, "zstd")))
+    return lista
+
+
+def comparar(nombre, salas):
+    if not salas:
+        return
+    base = sum(len(json.dumps(s).encode("utf-8")) for s in salas) / len(salas)
+    print(f"\n{nombre}: {len(salas)} salas, {base / 1024:.1f} KB de media en JSON original")
+    print(f"{'codec':>14} | {'bytes/sala':>10} | {'ratio':>6} | {'codificar ms':>12} | {'decodificar ms':>14}")
+    print("-" * 68)
+    for codec, codificador in codecs():
+        textos = [codificador(s) for s in salas]
+        tamano = sum(len(t.encode("utf-8")) for t in textos) / len(salas)
+        ms_cod = medir(lambda: [codificador(s) for s in salas], 5) / len(salas)
+        ms_dec = medir(lambda: [decodificar(t) for t in textos], 5) / len(salas)
+        assert all(decodificar(t) == s for t, s in zip(textos, salas))
+        print(f"{codec:>14} | {tamano:>10.0f} | {base / tamano:>5.1f}x | {ms_cod:>12.3f} | {ms_dec:>14.3f}")
+
+
+def main():
+    comparar("checkpoint.json", salas_de_checkpoint())
+    comparar("Sintéticas (8 jugadores)", [sala_de_prueba(jugadores=8) for _ in range(50)])
+    comparar("Sintéticas (35 jugadores)", [sala_de_prueba(jugadores=35) for _ in range(20)])
+
+
+if __name__ == "__main__":
+    main()
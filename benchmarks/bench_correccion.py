@@ -0,0 +1,78 @@
+"""
+Corrección ortográfica local: índice de borrados simétricos (IndiceSymSpell)
+frente a recorrer todo el léxico calculando la distancia de edición. Para
+cada categoría se generan respuestas con 1 y 2 errores (borrar, cambiar,
+insertar o trasponer letras) y respuestas inventadas, y se mide cuánto
+tarda cada consulta y cuántas veces se encuentra la palabra original.
+
+Uso: python benchmarks/bench_correccion.py
+"""
+import os
+import random
+import string
+import time
+
+from comun import RAIZ
+
+from lexico import IndiceSymSpell, LexicoCategorias, distancia_edicion
+
+LETRAS = string.ascii_lowercase
+
+
+def con_errores(palabra, errores, aleatorio):
+    for _ in range(errores):
+        i = aleatorio.randrange(len(palabra))
+        tipo = aleatorio.choice(("borrar", "cambiar", "insertar", "trasponer"))
+        if tipo == "borrar" and len(palabra) > 3:
+            palabra = palabra[:i] + palabra[i + 1:]
+        elif tipo == "trasponer" and i + 1 < len(palabra):
+            palabra = palabra[:i] + palabra[i + 1] + palabra[i] + palabra[i + 2:]
+        elif tipo == "insertar":
+            palabra = palabra[:i] + aleatorio.choice(LETRAS) + palabra[i:]
+        else:
+            palabra = palabra[:i] + aleatorio.choice(LETRAS) + palabra[i + 1:]
+    return palabra
+
+
+def fuerza_bruta(palabras, texto, maximo=2):
+    mejor = None
+    for palabra in palabras:
+        distancia = distancia_edicion(texto, palabra, maximo)
+        if distancia <= maximo and (mejor is None or distancia < mejor[1]):
+            mejor = (palabra, distancia)
+    return mejor
+
+
+def us_por_consulta(consultar, consultas):
+    inicio = time.perf_counter()
+    resultados = [consultar(texto) for texto in consultas]
+    return (time.perf_counter() - inicio) * 1e6 / len(consultas), resultados
+
+
+def main():
+    aleatorio = random.Random(3)
+    lexico = LexicoCategorias(os.path.join(RAIZ, "data", "lexico"))
+    print(f"{'categoría':>20} | {'palabras':>8} | {'borrados':>8} | {'crear ms':>8} | {'errores':>7} | "
+          f"{'symspell µs':>11} | {'bruta µs':>8} | {'encontrada':>10} | {'inventadas con sugerencia':>25}")
+    print("-" * 122)
+    for categoria, trie in sorted(lexico.tries.items()):
+        palabras = list(trie.con_prefijo())
+        inicio = time.perf_counter()
+        indice = IndiceSymSpell(palabras)
+        ms_crear = (time.perf_counter() - inicio) * 1000
+        inventadas = ["".join(aleatorio.choices(LETRAS, k=aleatorio.randint(4, 9))) for _ in range(300)]
+        _, sugeridas = us_por_consulta(indice.sugerir, inventadas)
+        falsas = sum(1 for s in sugeridas if s)
+        for errores in (1, 2):
+            originales = [aleatorio.choice(palabras) for _ in range(300)]
+            consultas = [con_errores(p, errores, aleatorio) for p in originales]
+            us_sym, encontradas = us_por_consulta(indice.sugerir, consultas)
+            us_bruta, _ = us_por_consulta(lambda t: fuerza_bruta(palabras, t), consultas[:100])
+            aciertos = sum(1 for original, s in zip(originales, encontradas) if s and s[0] == original)
+            print(f"{categoria:>20} | {len(palabras):>8} | {len(indice.borrados):>8} | {ms_crear:>8.0f} | {errores:>7} | "
+                  f"{us_sym:>11.1f} | {us_bruta:>8.0f} | {aciertos / len(consultas):>10.0%} | "
+                  f"{falsas / len(inventadas):>25.0%}")
+
+
+if __name__ == "__main__":
+    main()
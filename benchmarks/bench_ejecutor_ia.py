@@ -0,0 +1,110 @@
+"""
+Diez salas terminan la ronda a la vez (una grande y nueve pequeñas): un
+ThreadPoolExecutor de 20 hilos por sala (camino anterior) vs el ejecutor de
+IA compartido con límite global y turnos por sala. La API falsa tarda
+LATENCIA_S por llamada y responde 429 si hay más de LIMITE_API llamadas en
+vuelo; el que recibe un 429 reintenta a los 0.5 s, como validar_tarea.
+
+Uso: python benchmarks/bench_ejecutor_ia.py [concurrencia_compartida]
+"""
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RAIZ not in sys.path:
+    sys.path.insert(0, RAIZ)
+
+from ejecutor_ia import EjecutorIA, PRIORIDAD_PUNTUACION
+
+LATENCIA_S = 0.3
+LIMITE_API = 60
+SALAS = {"GRANDE": 300, **{f"S{i}": 30 for i in range(9)}}
+
+
+class ApiFalsa:
+    def __init__(self):
+        self.en_vuelo = 0
+        self.max_en_vuelo = 0
+        self.rechazos = 0
+        self._lock = threading.Lock()
+
+    def llamar(self):
+        while True:
+            with self._lock:
+                if self.en_vuelo >= LIMITE_API:
+                    self.rechazos += 1
+                    rechazada = True
+                else:
+                    self.en_vuelo += 1
+                    self.max_en_vuelo = max(self.max_en_vuelo, self.en_vuelo)
+                    rechazada = False
+            if rechazada:
+                time.sleep(0.5)  # Reintento tras el 429
+                continue
+            time.sleep(LATENCIA_S)
+            with self._lock:
+                self.en_vuelo -= 1
+            return True
+
+
+def ronda(api, enviar):
+    """Lanza todas las salas a la vez; devuelve {sala: segundos hasta terminar}"""
+    tiempos = {}
+    inicio = time.perf_counter()
+
+    def sala(codigo, tareas):
+        futuros = enviar(codigo, tareas)
+        wait(futuros)
+        tiempos[codigo] = time.perf_counter() - inicio
+
+    hilos = [threading.Thread(target=sala, args=item) for item in SALAS.items()]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    return tiempos
+
+
+def por_sala(api):
+    def enviar(codigo, tareas):
+        executor = ThreadPoolExecutor(max_workers=20)
+        futuros = [executor.submit(api.llamar) for _ in range(tareas)]
+        executor.shutdown(wait=False)
+        return futuros
+    return ronda(api, enviar)
+
+
+def compartido(api, concurrencia):
+    ejecutor = EjecutorIA(concurrencia=concurrencia)
+
+    def enviar(codigo, tareas):
+        return [ejecutor.enviar(api.llamar, sala=codigo, prioridad=PRIORIDAD_PUNTUACION) for _ in range(tareas)]
+    return ronda(api, enviar), ejecutor.estado()
+
+
+def main():
+    concurrencia = int(sys.argv[1]) if len(sys.argv) > 1 else 48
+    print(f"{len(SALAS)} salas ({SALAS['GRANDE']} llamadas la grande, 30 las demás), latencia {LATENCIA_S}s, "
+          f"la API rechaza por encima de {LIMITE_API} en vuelo")
+    print(f"{'camino':>22} | {'máx en vuelo':>12} | {'429':>5} | {'salas pequeñas s (mediana/máx)':>30} | {'sala grande s':>13}")
+    print("-" * 96)
+    api = ApiFalsa()
+    tiempos = por_sala(api)
+    pequenas = [t for c, t in tiempos.items() if c != "GRANDE"]
+    print(f"{'pool de 20 por sala':>22} | {api.max_en_vuelo:>12} | {api.rechazos:>5} | "
+          f"{statistics.median(pequenas):>14.2f} / {max(pequenas):<13.2f} | {tiempos['GRANDE']:>13.2f}")
+    api = ApiFalsa()
+    tiempos, estado = compartido(api, concurrencia)
+    pequenas = [t for c, t in tiempos.items() if c != "GRANDE"]
+    nombre = f"compartido ({concurrencia})"
+    print(f"{nombre:>22} | {api.max_en_vuelo:>12} | {api.rechazos:>5} | "
+          f"{statistics.median(pequenas):>14.2f} / {max(pequenas):<13.2f} | {tiempos['GRANDE']:>13.2f}")
+    print(f"cola máx {estado['max_pendientes']}, espera máx en cola {estado['max_espera_ms']:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
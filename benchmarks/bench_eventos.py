@@ -0,0 +1,107 @@
+"""
+Registro de eventos: bytes escritos por cada cambio típico de una sala
+(documento completo vs evento) y tiempo de recuperación de una sala según
+cuántos eventos hay que reproducir sobre su snapshot. Antes comprueba que
+reproducir los eventos devuelve la sala tal cual, también con listas
+anidadas dentro de listas.
+
+Uso: python benchmarks/bench_eventos.py
+"""
+import json
+import time
+
+from comun import crear_app_sqlite, medir, sala_de_prueba
+
+from database import db
+from persistencia import SalasRastreadas, a_nativo, cargar_sala, guardar_salas, _operaciones
+
+
+def cambios(sala):
+    jugador = sala["jugadores"][3]
+    return [
+        ("unirse", lambda: (sala["jugadores"].append("Nuevo"), sala["puntuaciones"].__setitem__("Nuevo", 0))),
+        ("respuestas", lambda: sala["respuestas_ronda"].__setitem__(jugador, {"Fruta": "Manzana", "Color": "Marrón"})),
+        ("basta", lambda: (sala.__setitem__("en_curso", False), sala.__setitem__("estado", "basta"))),
+        ("puntuación", lambda: sala["puntuaciones"].__setitem__(jugador, sala["puntuaciones"][jugador] + 100)),
+        ("voto", lambda: sala["votos_validacion"].setdefault(jugador, []).append("Jugador1")),
+        ("chat", lambda: sala["mensajes_chat"].append({"jugador": jugador, "mensaje": "hola",
+                                                       "timestamp": time.time(), "tipo": "usuario"})),
+    ]
+
+
+def bytes_por_cambio():
+    salas = SalasRastreadas(rutas=True)
+    salas.cargar("S0001", sala_de_prueba(jugadores=35))
+    sala = salas["S0001"]
+    print(f"{'cambio':>12} | {'documento (bytes)':>17} | {'evento (bytes)':>14}")
+    print("-" * 50)
+    for nombre, aplicar in cambios(sala):
+        salas.tomar_sucias()
+        aplicar()
+        arbol = salas.tomar_sucias()["S0001"][2]
+        evento = json.dumps(_operaciones(sala, arbol), separators=(",", ":"))
+        print(f"{nombre:>12} | {len(json.dumps(a_nativo(sala))):>17} | {len(evento):>14}")
+
+
+def cambios_anidados(sala):
+    """Anexos a listas que cuelgan de elementos de otra lista (por debajo de la profundidad rastreada)"""
+    sala["matriz"] = [[1], [2]]
+    sala["historial"] = [{"v": []}, {"v": []}]
+    sala["extra"] = {"filas": [[1]], "mapa": {"z": [1]}}
+    return [
+        lambda: sala["matriz"][0].append(5),
+        lambda: sala["historial"][0]["v"].append(7),
+        lambda: sala["extra"]["filas"][0].extend([2, 3]),
+        lambda: sala["extra"]["mapa"]["z"].append(2),
+        lambda: sala["matriz"].append([9]),
+        lambda: sala["votos_validacion"].setdefault("Jugador2", []).append("Jugador1"),
+    ]
+
+
+def reproduccion():
+    app = crear_app_sqlite()
+    with app.app_context():
+        salas = SalasRastreadas(rutas=True)
+        salas["S0001"] = sala_de_prueba(jugadores=5)
+        sala = salas["S0001"]
+        anidados = cambios_anidados(sala)
+        guardar_salas(salas, salas.tomar_sucias(), eventos=100)
+        for aplicar in anidados + [aplicar for _, aplicar in cambios(sala)]:
+            aplicar()
+            guardar_salas(salas, salas.tomar_sucias(), eventos=100)
+            db.session.expire_all()
+            assert cargar_sala("S0001") == a_nativo(sala)
+    print("✓ Reproducir los eventos devuelve la sala tal cual (incluidas listas anidadas)\n")
+
+
+def recuperacion():
+    print(f"\n{'eventos en cola':>15} | {'recuperar sala (ms)':>19}")
+    print("-" * 38)
+    for cola in (0, 10, 50, 200):
+        app = crear_app_sqlite()
+        with app.app_context():
+            salas = SalasRastreadas(rutas=True)
+            salas["S0001"] = sala_de_prueba(jugadores=35)
+            guardar_salas(salas, salas.tomar_sucias(), eventos=cola + 1)
+            sala = salas["S0001"]
+            for i in range(cola):
+                _, aplicar = cambios(sala)[i % 6]
+                aplicar()
+                guardar_salas(salas, salas.tomar_sucias(), eventos=cola + 1)
+            assert cargar_sala("S0001") == a_nativo(sala)
+
+            def recuperar():
+                db.session.expire_all()
+                cargar_sala("S0001")
+
+            print(f"{cola:>15} | {medir(recuperar, 10):>19.2f}")
+
+
+def main():
+    reproduccion()
+    bytes_por_cambio()
+    recuperacion()
+
+
+if __name__ == "__main__":
+    main()
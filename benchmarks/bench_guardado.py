@@ -0,0 +1,65 @@
+"""
+Costo en BD de un evento (un mensaje de chat) según el número de salas vivas:
+guardado completo (save_state original) vs guardado de salas sucias.
+
+Uso: python benchmarks/bench_guardado.py
+"""
+import time
+
+from comun import ContadorSQL, crear_app_sqlite, medir, sala_de_prueba
+
+from database import db, SalaDB
+from persistencia import SalasRastreadas, guardar_salas
+
+
+def guardar_todas(salas):
+    """Réplica del save_state original: recorre y reescribe todas las salas"""
+    for codigo, datos_sala in salas.items():
+        sala_existente = db.session.get(SalaDB, codigo)
+        if sala_existente:
+            sala_existente.datos = datos_sala
+        else:
+            db.session.add(SalaDB(codigo=codigo, datos=datos_sala))
+    db.session.commit()
+
+
+def evento_chat(sala, i):
+    sala["mensajes_chat"].append({"jugador": "Jugador1", "mensaje": f"hola {i}",
+                                  "timestamp": time.time(), "tipo": "usuario"})
+    if len(sala["mensajes_chat"]) > 50:
+        sala["mensajes_chat"] = sala["mensajes_chat"][-50:]
+
+
+def main():
+    print(f"{'salas':>6} | {'SQL/evento (todas)':>18} | {'ms (todas)':>10} | {'SQL/evento (sucias)':>19} | {'ms (sucias)':>11}")
+    print("-" * 78)
+    for num_salas in (10, 50, 200, 500):
+        app = crear_app_sqlite()
+        with app.app_context():
+            contador = ContadorSQL(db.engine)
+            salas = SalasRastreadas({f"S{i:04d}": sala_de_prueba(jugadores=8) for i in range(num_salas)})
+            guardar_todas(salas)
+            objetivo = salas["S0000"]
+            i = [0]
+
+            def con_guardado_completo():
+                i[0] += 1
+                evento_chat(objetivo, i[0])
+                guardar_todas(salas)
+
+            def con_salas_sucias():
+                i[0] += 1
+                evento_chat(objetivo, i[0])
+                guardar_salas(salas, salas.tomar_sucias())
+
+            contador.reiniciar()
+            ms_todas = medir(con_guardado_completo, 5)
+            sql_todas = contador.total / 5
+            contador.reiniciar()
+            ms_sucias = medir(con_salas_sucias, 5)
+            sql_sucias = contador.total / 5
+        print(f"{num_salas:>6} | {sql_todas:>18.1f} | {ms_todas:>10.2f} | {sql_sucias:>19.1f} | {ms_sucias:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
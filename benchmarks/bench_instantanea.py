@@ -0,0 +1,59 @@
+"""
+Arranque en frío: tiempo hasta poder servir una sala cargando las salas
+activas desde la BD (SQLite local; en Azure la red lo hace más lento) vs
+abriendo la instantánea local con mmap y sirviendo la sala desde ella.
+También mide la reconciliación en segundo plano y cuánto cuesta reescribir
+la instantánea tras un cambio.
+
+Uso: python benchmarks/bench_instantanea.py
+"""
+import os
+import tempfile
+
+from comun import crear_app_sqlite, medir, sala_de_prueba
+
+from almacen import AlmacenSQL
+from instantanea import InstantaneaSalas
+from persistencia import SalasRastreadas
+
+
+def main():
+    print(f"{'salas':>6} | {'desde BD ms':>11} | {'desde instantánea ms':>20} | {'reconciliar ms':>14} | "
+          f"{'archivo KB':>10} | {'reescribir tras 1 cambio ms':>27}")
+    print("-" * 105)
+    for num_salas in (50, 200, 1000):
+        with tempfile.TemporaryDirectory() as directorio:
+            almacen = AlmacenSQL(crear_app_sqlite(os.path.join(directorio, "estado.db")))
+            salas = SalasRastreadas()
+            for i in range(num_salas):
+                salas[f"S{i:04d}"] = sala_de_prueba(jugadores=8)
+            almacen.guardar(salas, salas.tomar_sucias())
+            instantanea = InstantaneaSalas(os.path.join(directorio, "salas.bin"), lambda: salas, almacen)
+            instantanea.escribir()
+
+            def desde_bd():
+                nuevas = SalasRastreadas(cargador=almacen.cargar_sala)
+                almacen.precargar(nuevas, "activas")
+                return nuevas["S0001"]
+
+            def desde_instantanea():
+                nuevas = SalasRastreadas(cargador=lambda c: instantanea.datos(c) or almacen.cargar_sala(c))
+                instantanea.cargar()
+                return nuevas["S0001"]
+
+            ms_bd = medir(desde_bd, 3)
+            ms_instantanea = medir(desde_instantanea, 3)
+            ms_reconciliar = medir(lambda: instantanea.reconciliar(SalasRastreadas()), 1)
+
+            def un_cambio():
+                salas["S0000"]["puntuaciones"]["Jugador1"] += 1
+                instantanea.escribir()
+
+            ms_cambio = medir(un_cambio, 10)
+            kb = os.path.getsize(instantanea.ruta) / 1024
+        print(f"{num_salas:>6} | {ms_bd:>11.1f} | {ms_instantanea:>20.1f} | {ms_reconciliar:>14.1f} | "
+              f"{kb:>10.0f} | {ms_cambio:>27.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Léxico local: memoria y velocidad del trie compacto (minimizado, en arrays)
+frente a un set de Python con las mismas cadenas normalizadas y frente a un
+trie de dicts anidados. Se mide con el léxico real de data/lexico y con
+léxicos sintéticos más grandes (palabras con sufijos repetidos, como un
+diccionario de verdad).
+
+Uso: python benchmarks/bench_lexico.py
+"""
+import os
+import random
+import string
+import sys
+import time
+
+from comun import RAIZ
+
+from lexico import LexicoCategorias, TrieCompacto, normalizar_lexico
+
+SUFIJOS = ["a", "o", "as", "os", "ero", "era", "ito", "ita", "ción", "ciones", "mente", "dor", "dora", "ado", "ada"]
+
+
+def palabras_sinteticas(cantidad, semilla=7):
+    aleatorio = random.Random(semilla)
+    raices = ["".join(aleatorio.choices(string.ascii_lowercase, k=aleatorio.randint(3, 8)))
+              for _ in range(cantidad // 4)]
+    palabras = set()
+    while len(palabras) < cantidad:
+        palabras.add(normalizar_lexico(aleatorio.choice(raices) + aleatorio.choice(SUFIJOS)))
+    return sorted(palabras)
+
+
+def kb_trie(trie):
+    return sum(sys.getsizeof(parte) for parte in (trie.inicio, trie.destinos, trie.final, trie.etiquetas)) / 1024
+
+
+def kb_set(conjunto):
+    """El set y sus cadenas (las necesita para existir, igual que el trie sus arrays)"""
+    return (sys.getsizeof(conjunto) + sum(sys.getsizeof(texto) for texto in conjunto)) / 1024
+
+
+def kb_dicts(raiz):
+    pila, total = [raiz], 0
+    while pila:
+        nodo = pila.pop()
+        total += sys.getsizeof(nodo)
+        pila.extend(hijo for hijo in nodo.values() if isinstance(hijo, dict))
+    return total / 1024
+
+
+def trie_dicts(palabras):
+    raiz = {}
+    for palabra in palabras:
+        nodo = raiz
+        for caracter in palabra:
+            nodo = nodo.setdefault(caracter, {})
+        nodo[""] = True
+    return raiz
+
+
+def en_trie_dicts(raiz, texto):
+    nodo = raiz
+    for caracter in texto:
+        nodo = nodo.get(caracter)
+        if nodo is None:
+            return False
+    return "" in nodo
+
+
+def ns_por_consulta(consultar, consultas, repeticiones=5):
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        for texto in consultas:
+            consultar(texto)
+    return (time.perf_counter() - inicio) * 1e9 / (repeticiones * len(consultas))
+
+
+def comparar(nombre, palabras):
+    aleatorio = random.Random(1)
+    consultas = aleatorio.sample(palabras, min(2000, len(palabras)))
+    consultas += [texto + "x" for texto in consultas]  # Mitad fallos
+
+    inicio = time.perf_counter()
+    trie = TrieCompacto(palabras)
+    ms_construir = (time.perf_counter() - inicio) * 1000
+    conjunto = set(palabras)
+    dicts = trie_dicts(palabras)
+
+    ns_trie = ns_por_consulta(trie.__contains__, consultas)
+    ns_set = ns_por_consulta(conjunto.__contains__, consultas)
+    ns_dicts = ns_por_consulta(lambda t: en_trie_dicts(dicts, t), consultas)
+    print(f"{nombre:>22} | {len(palabras):>7} | {trie.nodos():>7} | {kb_trie(trie):>9.0f} | {kb_set(conjunto):>8.0f} | "
+          f"{kb_dicts(dicts):>10.0f} | {ns_trie:>8.0f} | {ns_set:>6.0f} | {ns_dicts:>10.0f} | {ms_construir:>9.0f}")
+
+
+def main():
+    print(f"{'léxico':>22} | {'palabras':>7} | {'nodos':>7} | {'trie KB':>9} | {'set KB':>8} | "
+          f"{'dicts KB':>10} | {'trie ns':>8} | {'set ns':>6} | {'dicts ns':>10} | {'crear ms':>9}")
+    print("-" * 120)
+    lexico = LexicoCategorias(os.path.join(RAIZ, "data", "lexico"))
+    todas = []
+    for categoria, trie in sorted(lexico.tries.items()):
+        palabras = list(trie.con_prefijo())
+        todas.extend(palabras)
+        comparar(categoria, palabras)
+    comparar("data/lexico (todo)", sorted(set(todas)))
+    for cantidad in (10_000, 100_000):
+        comparar(f"sintético {cantidad}", palabras_sinteticas(cantidad))
+
+    inicio = time.perf_counter()
+    LexicoCategorias(os.path.join(RAIZ, "data", "lexico"))
+    print(f"\nCarga de data/lexico al arrancar: {(time.perf_counter() - inicio) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
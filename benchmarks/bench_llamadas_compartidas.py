@@ -0,0 +1,118 @@
+"""
+Varias salas con la misma letra que terminan la ronda a la vez: cada una
+valida sus respuestas por lotes (una llamada por categoría) y muchas
+respuestas se repiten entre salas ("Roma", "Rusia"...). Sin llamadas
+compartidas cada sala pregunta por todas las que no están aún en la caché;
+con ellas, la primera sala que pregunta por una respuesta hace la llamada y
+las demás esperan su veredicto. Cuenta llamadas a la IA, respuestas enviadas
+y el tiempo hasta que todas las salas tienen sus veredictos.
+
+Uso: python benchmarks/bench_llamadas_compartidas.py [salas] [jugadores]
+"""
+import os
+import sys
+
+os.environ.setdefault("BASTA_ALMACEN", "memoria")
+os.environ.setdefault("BASTA_INSTANTANEA", "0")
+os.environ.setdefault("BASTA_ARCHIVO_SALAS", "0")
+os.environ.setdefault("BASTA_VALIDACIONES_DURABLES", "0")
+for variable in ("BASTA_LEXICO", "BASTA_CORRECCION_LOCAL", "BASTA_CLASIFICADOR"):
+    os.environ[variable] = "0"  # Que todo llegue a la IA
+os.environ["OPENAI_API_KEY"] = ""
+
+from comun import CATEGORIAS
+
+import json
+import random
+import re
+import threading
+import time
+import types
+
+import app as basta
+
+LATENCIA_S = 0.4
+# Respuestas populares (las que repiten muchas salas) y propias de cada jugador
+POPULARES = 8
+
+
+class ClienteFalso:
+    """Devuelve un veredicto válido por respuesta del lote; cuenta llamadas y respuestas"""
+
+    def __init__(self):
+        self.llamadas = 0
+        self.respuestas = 0
+        self._lock = threading.Lock()
+        self.chat = types.SimpleNamespace(completions=types.SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        numeros = re.findall(r'^(\d+)\. "', kwargs["messages"][-1]["content"], re.MULTILINE)
+        veredicto = {"valida": True, "razon": "Existe y es de la categoría", "confianza": 0.95}
+        if numeros:
+            texto = json.dumps([{"n": int(n), **veredicto} for n in numeros])
+        else:
+            texto = json.dumps(veredicto)
+        with self._lock:
+            self.llamadas += 1
+            self.respuestas += max(1, len(numeros))
+        time.sleep(LATENCIA_S)
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=types.SimpleNamespace(content=texto))])
+
+
+def respuestas_salas(salas, jugadores, letra):
+    """{sala: {categoría: [respuestas]}}: la mitad populares, la mitad propias"""
+    rng = random.Random(9)
+    populares = {c: [f"{letra}popular{i}{c[:3]}" for i in range(POPULARES)] for c in CATEGORIAS}
+    return {
+        f"SALA{s}": {
+            c: sorted({rng.choice(populares[c]) if rng.random() < 0.5 else f"{letra}propia{s}x{j}{c[:3]}"
+                       for j in range(jugadores)})
+            for c in CATEGORIAS
+        }
+        for s in range(salas)
+    }
+
+
+def ronda(compartidas, por_sala, letra):
+    basta.cache_validaciones_ia.limpiar()
+    basta.vuelos_ia.activo = compartidas
+    cliente = ClienteFalso()
+    basta.openai_client = cliente
+
+    def validar_sala(respuestas):
+        hilos = [threading.Thread(target=basta.validar_lote_con_ia, args=(lista, categoria, letra))
+                 for categoria, lista in respuestas.items()]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+    inicio = time.perf_counter()
+    hilos = [threading.Thread(target=validar_sala, args=(respuestas,)) for respuestas in por_sala.values()]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    return cliente, time.perf_counter() - inicio
+
+
+def main():
+    salas = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    jugadores = int(sys.argv[2]) if len(sys.argv) > 2 else 6
+    basta.OPENAI_AVAILABLE = True
+    letra = "R"
+    por_sala = respuestas_salas(salas, jugadores, letra)
+    distintas = len({(c, r) for respuestas in por_sala.values() for c, lista in respuestas.items() for r in lista})
+    print(f"{salas} salas × {jugadores} jugadores × {len(CATEGORIAS)} categorías, letra {letra}: "
+          f"{distintas} respuestas distintas\n")
+    print(f"{'compartidas':>11} | {'llamadas IA':>11} | {'respuestas enviadas':>19} | {'segundos':>8}")
+    print("-" * 60)
+    for compartidas in (False, True):
+        cliente, segundos = ronda(compartidas, por_sala, letra)
+        print(f"{'sí' if compartidas else 'no':>11} | {cliente.llamadas:>11} | {cliente.respuestas:>19} | "
+              f"{segundos:>8.2f}")
+    print(f"\n{basta.vuelos_ia.estado()}")
+
+
+if __name__ == "__main__":
+    main()
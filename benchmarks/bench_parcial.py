@@ -0,0 +1,41 @@
+"""
+Bytes enviados y tiempo por guardado cuando solo cambia `jugadores_listos`
+en una sala de 35 jugadores: reescritura completa vs JSON_SET de las claves.
+
+Uso: python benchmarks/bench_parcial.py
+"""
+import json
+
+from comun import crear_app_sqlite, medir, sala_de_prueba
+
+from persistencia import SalasRastreadas, guardar_salas
+
+
+def main():
+    app = crear_app_sqlite()
+    with app.app_context():
+        salas = SalasRastreadas()
+        salas["SALA1"] = sala_de_prueba(jugadores=35)
+        guardar_salas(salas, salas.tomar_sucias())
+        sala = salas["SALA1"]
+        print(f"Documento completo: {len(json.dumps(sala)) / 1024:.1f} KB")
+
+        for parcial in (False, True):
+            enviados = []
+
+            def marcar_listo():
+                jugador = sala["jugadores"][len(sala["jugadores_listos"]) % 35]
+                if jugador in sala["jugadores_listos"]:
+                    sala["jugadores_listos"].remove(jugador)
+                else:
+                    sala["jugadores_listos"].append(jugador)
+                resultado = guardar_salas(salas, salas.tomar_sucias(), parcial=parcial)
+                enviados.append(resultado["bytes_parciales"] if resultado["parciales"] else len(json.dumps(sala)))
+
+            ms = medir(marcar_listo, 50)
+            modo = "parcial (JSON_SET)" if parcial else "completo"
+            print(f"{modo:>20}: {ms:6.2f} ms/guardado, {sum(enviados) / len(enviados):8.0f} bytes/guardado")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Construcción de los prompts de validación: formatear desde cero en cada
+llamada (buscar la categoría, formatear ejemplos y reglas y el f-string
+completo, como se hacía antes) frente a las plantillas precompiladas por
+categoría de prompts_validacion. Mide µs por prompt y el CPU de construir
+todos los prompts de una ronda (una llamada por respuesta y una por lote).
+
+Nota: el código anterior además reconstruía el diccionario literal de
+definiciones en cada llamada, así que el "antes" real era algo más lento.
+
+Uso: python benchmarks/bench_prompts.py
+"""
+import random
+import time
+
+from comun import CATEGORIAS
+
+from prompts_validacion import (generar_prompt_validacion, generar_prompt_validacion_lote,
+                                renderizar_prompt_lote, renderizar_prompt_validacion)
+
+
+def prompt_desde_cero(respuesta, categoria, letra):
+    return renderizar_prompt_validacion(respuesta, categoria, letra)
+
+
+def lote_desde_cero(respuestas, categoria, letra):
+    lista = "\n".join(f'{i}. "{respuesta}"' for i, respuesta in enumerate(respuestas, 1))
+    return renderizar_prompt_lote(lista, len(respuestas), categoria, letra)
+
+
+def respuestas_ronda(jugadores, letra, aleatorio):
+    return {categoria: [letra + "".join(aleatorio.choices("aeioulmnrst", k=aleatorio.randint(3, 9)))
+                        for _ in range(jugadores)]
+            for categoria in CATEGORIAS}
+
+
+def us_por_prompt(construir, consultas, repeticiones=3):
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        for respuesta, categoria, letra in consultas:
+            construir(respuesta, categoria, letra)
+    return (time.perf_counter() - inicio) * 1e6 / (repeticiones * len(consultas))
+
+
+def ms_cpu_ronda(individual, lote, ronda, letra, repeticiones=20):
+    """CPU de construir los prompts de una ronda: uno por respuesta y uno por categoría (lote)"""
+    inicio = time.process_time()
+    for _ in range(repeticiones):
+        for categoria, respuestas in ronda.items():
+            for respuesta in respuestas:
+                individual(respuesta, categoria, letra)
+            lote(respuestas, categoria, letra)
+    return (time.process_time() - inicio) * 1000 / repeticiones
+
+
+def main():
+    aleatorio = random.Random(5)
+    consultas = [(f"Resp{i}", aleatorio.choice(CATEGORIAS), aleatorio.choice("ABCDEFGMPRST")) for i in range(3000)]
+    # Que la primera compilación de cada plantilla no cuente en el "después"
+    for categoria in CATEGORIAS:
+        generar_prompt_validacion("x", categoria, "X")
+        generar_prompt_validacion_lote(["x"], categoria, "X")
+
+    antes = us_por_prompt(prompt_desde_cero, consultas)
+    despues = us_por_prompt(generar_prompt_validacion, consultas)
+    print(f"Prompt individual: {antes:.1f} µs desde cero → {despues:.1f} µs con plantilla ({antes / despues:.1f}x)\n")
+
+    print(f"{'jugadores':>9} | {'respuestas':>10} | {'antes ms CPU':>12} | {'después ms CPU':>14} | {'mejora':>6}")
+    print("-" * 64)
+    for jugadores in (4, 10, 40):
+        ronda = respuestas_ronda(jugadores, "M", aleatorio)
+        ms_antes = ms_cpu_ronda(prompt_desde_cero, lote_desde_cero, ronda, "M")
+        ms_despues = ms_cpu_ronda(generar_prompt_validacion, generar_prompt_validacion_lote, ronda, "M")
+        print(f"{jugadores:>9} | {jugadores * len(CATEGORIAS):>10} | {ms_antes:>12.2f} | {ms_despues:>14.2f} | "
+              f"{ms_antes / ms_despues:>5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
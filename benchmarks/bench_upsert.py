@@ -0,0 +1,42 @@
+"""
+Guardado de N salas sucias: bucle ORM (SELECT + UPDATE/INSERT por sala) vs
+un único INSERT ... ON CONFLICT/ON DUPLICATE KEY UPDATE.
+
+Se ejecuta sobre SQLite en archivo; en MySQL la diferencia crece con la
+latencia de red, porque el bucle ORM paga un round trip por SELECT.
+
+Uso: python benchmarks/bench_upsert.py
+"""
+import os
+import tempfile
+
+from comun import ContadorSQL, crear_app_sqlite, medir, sala_de_prueba
+
+from database import db
+from persistencia import SalasRastreadas, guardar_salas
+
+
+def main():
+    print(f"{'salas':>6} | {'modo':>7} | {'SQL/descarga':>12} | {'ms/descarga':>11}")
+    print("-" * 48)
+    for num_salas in (10, 100, 1000):
+        for modo in ("orm", "upsert"):
+            ruta = os.path.join(tempfile.mkdtemp(), "bench.db")
+            app = crear_app_sqlite(ruta)
+            with app.app_context():
+                contador = ContadorSQL(db.engine)
+                salas = SalasRastreadas({f"S{i:05d}": sala_de_prueba(jugadores=6, mensajes=10) for i in range(num_salas)})
+                guardar_salas(salas, {c: [0, None] for c in salas}, modo=modo)
+
+                def descargar_todas():
+                    for sala in salas.values():
+                        sala["tiempo_restante"] = sala.get("tiempo_restante", 0) + 1
+                    guardar_salas(salas, {c: [0, None] for c in salas.tomar_sucias()}, modo=modo)
+
+                contador.reiniciar()
+                ms = medir(descargar_todas, 3)
+            print(f"{num_salas:>6} | {modo:>7} | {contador.total / 3:>12.1f} | {ms:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Validación al final de la ronda: una llamada a la IA por respuesta única
+(camino anterior) vs una llamada por categoría y letra con un array JSON de
+veredictos, con varios tamaños máximos de lote. Usa un cliente OpenAI falso
+cuya latencia crece con los tokens de salida (como gpt-4o-mini) y cuenta los
+tokens de cada llamada (aprox. 4 caracteres por token). Un porcentaje de
+veredictos se omite en las respuestas por lote para medir el coste de la
+vuelta a llamadas individuales.
+
+Uso: python benchmarks/bench_validacion_lote.py [jugadores] [categorias]
+"""
+import os
+import sys
+
+os.environ.setdefault("BASTA_ALMACEN", "memoria")
+os.environ.setdefault("BASTA_INSTANTANEA", "0")
+os.environ.setdefault("BASTA_ARCHIVO_SALAS", "0")
+os.environ.setdefault("BASTA_VALIDACIONES_DURABLES", "0")
+os.environ["OPENAI_API_KEY"] = ""
+
+from comun import CATEGORIAS, sala_de_prueba
+
+import json
+import random
+import re
+import threading
+import time
+import types
+
+import app as basta
+
+LATENCIA_BASE_S = 0.35  # Hasta el primer token
+LATENCIA_POR_TOKEN_S = 0.012  # ~80 tokens de salida por segundo
+OMISION_LOTE = 0.05  # Fracción de veredictos que el lote "olvida"
+
+
+def tokens(texto):
+    return max(1, len(texto) // 4)
+
+
+class ClienteFalso:
+    """Responde como el modelo: un objeto por respuesta o un array por lote"""
+
+    def __init__(self):
+        self.llamadas = 0
+        self.tokens_entrada = 0
+        self.tokens_salida = 0
+        self._lock = threading.Lock()
+        self.chat = types.SimpleNamespace(completions=types.SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        mensajes = kwargs["messages"]
+        prompt = mensajes[-1]["content"]
+        if mensajes[0]["content"] == basta.SYSTEM_PROMPT_LOTE:
+            respuestas = re.findall(r'^(\d+)\. "', prompt, re.MULTILINE)
+            texto = json.dumps([
+                {"n": int(n), "valida": True, "razon": "Existe y es de la categoría", "confianza": 0.95}
+                for n in respuestas if random.random() >= OMISION_LOTE
+            ], ensure_ascii=False)
+        else:
+            texto = json.dumps({"valida": True, "razon": "Existe y es de la categoría", "confianza": 0.95},
+                               ensure_ascii=False)
+        entrada = sum(tokens(m["content"]) for m in mensajes)
+        salida = tokens(texto)
+        with self._lock:
+            self.llamadas += 1
+            self.tokens_entrada += entrada
+            self.tokens_salida += salida
+        time.sleep(LATENCIA_BASE_S + LATENCIA_POR_TOKEN_S * salida)
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=types.SimpleNamespace(content=texto))])
+
+
+def palabra(letra, rng):
+    return letra + "".join(rng.choice(["a", "e", "i", "o", "u"]) + rng.choice("lmnrst") for _ in range(3))
+
+
+def sala_con_respuestas(jugadores, categorias):
+    """Sala con ~20 respuestas distintas por categoría repartidas entre los jugadores"""
+    rng = random.Random(7)
+    sala = sala_de_prueba(jugadores=jugadores)
+    letra = sala["letra"]
+    sala["categorias"] = categorias
+    sala["validaciones_ia"] = {}
+    variantes = {c: [palabra(letra, rng) for _ in range(20)] for c in categorias}
+    sala["respuestas_ronda"] = {j: {c: rng.choice(variantes[c]) for c in categorias} for j in sala["jugadores"]}
+    return sala
+
+
+def ronda(jugadores, categorias, lotes, max_por_lote):
+    basta.VALIDACION_POR_LOTES = lotes
+    basta.MAX_RESPUESTAS_POR_LOTE = max_por_lote
+    basta.cache_validaciones_ia.limpiar()
+    cliente = ClienteFalso()
+    basta.openai_client = cliente
+    basta.OPENAI_AVAILABLE = True
+    basta.state["salas"]["BENCH"] = sala_con_respuestas(jugadores, categorias)
+    salida = sys.stdout
+    sys.stdout = open(os.devnull, "w")  # calcular_puntuaciones es muy verboso
+    try:
+        inicio = time.perf_counter()
+        basta.calcular_puntuaciones("BENCH")
+        segundos = time.perf_counter() - inicio
+    finally:
+        sys.stdout.close()
+        sys.stdout = salida
+    return segundos, cliente
+
+
+def main():
+    jugadores = int(sys.argv[1]) if len(sys.argv) > 1 else 35
+    num_categorias = int(sys.argv[2]) if len(sys.argv) > 2 else 15
+    categorias = (CATEGORIAS + [f"Categoría {i}" for i in range(num_categorias)])[:num_categorias]
+    print(f"{jugadores} jugadores, {num_categorias} categorías, latencia {LATENCIA_BASE_S}s "
+          f"+ {LATENCIA_POR_TOKEN_S * 1000:.0f} ms/token de salida, {OMISION_LOTE:.0%} omitidas por lote")
+    print(f"{'camino':>16} | {'tiempo s':>8} | {'llamadas':>8} | {'tokens entrada':>14} | {'tokens salida':>13}")
+    print("-" * 72)
+    casos = [("por respuesta", False, 0)] + [(f"lotes de {n}", True, n) for n in (10, 25, 50)]
+    for nombre, lotes, max_por_lote in casos:
+        segundos, cliente = ronda(jugadores, categorias, lotes, max_por_lote)
+        print(f"{nombre:>16} | {segundos:>8.2f} | {cliente.llamadas:>8} | {cliente.tokens_entrada:>14} | "
+              f"{cliente.tokens_salida:>13}")
+
+
+if __name__ == "__main__":
+    main()
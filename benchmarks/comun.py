@@ -0,0 +1,99 @@
+"""
+Utilidades compartidas por los benchmarks: app Flask sobre SQLite y salas
+sintéticas con el mismo formato que crea app.py.
+"""
+import os
+import random
+import sys
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RAIZ not in sys.path:
+    sys.path.insert(0, RAIZ)
+
+from flask import Flask
+from sqlalchemy import event
+
+from database import init_db
+
+CATEGORIAS = ["Nombre", "Animal", "País o Ciudad", "Fruta", "Objeto", "Color",
+              "Profesión", "Comida", "Película", "Marca", "Deporte"]
+
+
+def crear_app_sqlite(ruta=None):
+    """App Flask mínima con la BD en SQLite (archivo temporal o memoria)"""
+    app = Flask("bench")
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{ruta}" if ruta else "sqlite://"
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    init_db(app)
+    return app
+
+
+class ContadorSQL:
+    """Cuenta las sentencias SQL que ejecuta el engine"""
+
+    def __init__(self, engine):
+        self.total = 0
+        event.listen(engine, "before_cursor_execute", self._contar)
+
+    def _contar(self, *args, **kwargs):
+        self.total += 1
+
+    def reiniciar(self):
+        self.total = 0
+
+
+def sala_de_prueba(jugadores=35, mensajes=50, validada=True):
+    """Sala en mitad de partida con respuestas, validaciones y chat"""
+    nombres = [f"Jugador{i}" for i in range(jugadores)]
+    letra = random.choice("ABCDEFGLMPRST")
+    respuestas = {n: {c: f"{letra}respuesta{i}{c[:3]}" for c in CATEGORIAS} for i, n in enumerate(nombres)}
+    validaciones = {
+        n: {c: {"validada_ia": True, "razon_ia": "Es válida para la categoría",
+                "confianza": 0.95, "apelable": False} for c in CATEGORIAS}
+        for n in nombres
+    } if validada else {}
+    return {
+        "anfitrion": nombres[0],
+        "jugadores": nombres,
+        "rondas": 3,
+        "estado": "espera",
+        "puntuaciones": {n: random.randint(0, 2000) for n in nombres},
+        "respuestas_ronda": respuestas,
+        "ronda_actual": 2,
+        "jugadores_listos": nombres[:jugadores // 2],
+        "jugadores_desconectados": [],
+        "jugadores_ids": {n: f"P{i:06d}" for i, n in enumerate(nombres)},
+        "ids_jugadores": {f"P{i:06d}": n for i, n in enumerate(nombres)},
+        "dificultad": "normal",
+        "modo_juego": "clasico",
+        "categorias": CATEGORIAS,
+        "categorias_personalizadas": None,
+        "powerups_habilitados": True,
+        "chat_habilitado": True,
+        "sonidos_habilitados": True,
+        "validacion_activa": True,
+        "equipos": {},
+        "puntuaciones_equipos": {},
+        "mensajes_chat": [{"jugador": nombres[i % jugadores], "mensaje": f"mensaje {i}",
+                           "timestamp": time.time(), "tipo": "usuario"} for i in range(mensajes)],
+        "powerups_jugadores": {n: {"tiempo_extra": 0, "pista_ia": 1, "multiplicador": 0} for n in nombres},
+        "powerups_activos": {n: [] for n in nombres},
+        "respuestas_cuestionadas": {},
+        "votos_validacion": {},
+        "penalizaciones": {n: 0 for n in nombres},
+        "finalizada": False,
+        "pausada": False,
+        "letras_usadas": [letra],
+        "letra": letra,
+        "en_curso": True,
+        "validaciones_ia": validaciones,
+    }
+
+
+def medir(funcion, repeticiones=20):
+    """Devuelve el tiempo medio en milisegundos de `funcion()`"""
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        funcion()
+    return (time.perf_counter() - inicio) * 1000 / repeticiones
@@ -0,0 +1,169 @@
+"""
+Reproduce un corpus de validaciones con los dos modos de prompt
+("completo": reglas y ejemplos largos; "compacto": prompt corto y salida
+JSON con esquema) y compara, por modo, tokens de entrada y salida (los que
+informa la API), latencia, errores de formato y acuerdo con el veredicto
+guardado.
+
+El corpus sale de --corpus (JSONL con categoria, letra, respuesta y valida
+por línea) o, si no se da, de la tabla de validaciones del almacén
+configurado como en el juego (BASTA_ALMACEN, AZURE_MYSQL_CONNECTIONSTRING...).
+--exportar guarda la muestra usada para repetir la comparación más tarde.
+
+Sin OPENAI_API_KEY se usa un cliente falso (tokens ≈ caracteres / 4, misma
+latencia en los dos modos): sirve para comparar el tamaño de los prompts,
+no la latencia ni el acuerdo.
+
+Uso: python benchmarks/replay_validacion.py [--corpus c.jsonl] [--muestra 100] [--lotes] [--exportar c.jsonl]
+"""
+import argparse
+import json
+import os
+import random
+import re
+import statistics
+import sys
+import time
+import types
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RAIZ not in sys.path:
+    sys.path.insert(0, RAIZ)
+
+MODOS = ("completo", "compacto")
+
+
+class ClienteFalso:
+    """Responde JSON con el formato que pide cada modo; cuenta tokens como ~4 caracteres"""
+
+    def __init__(self):
+        self.chat = types.SimpleNamespace(completions=types.SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        time.sleep(0.05)
+        veredicto = {"valida": True, "confianza": 0.9, "razon": "existe"}
+        formato = kwargs.get("response_format")
+        numeros = re.findall(r'^(\d+)\. "', kwargs["messages"][-1]["content"], re.MULTILINE)
+        if numeros and formato:
+            texto = json.dumps({"veredictos": [{"n": int(n), **veredicto} for n in numeros]})
+        elif numeros:
+            texto = json.dumps([{"n": int(n), **veredicto, "razon": "Existe y es de la categoría"} for n in numeros])
+        elif formato:
+            texto = json.dumps(veredicto)
+        else:
+            texto = json.dumps({**veredicto, "razon": "Existe y es de la categoría pedida"})
+        entrada = sum(len(m["content"]) for m in kwargs["messages"]) // 4
+        uso = types.SimpleNamespace(prompt_tokens=entrada, completion_tokens=len(texto) // 4,
+                                    total_tokens=entrada + len(texto) // 4)
+        mensaje = types.SimpleNamespace(content=texto)
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=mensaje)], usage=uso)
+
+
+def leer_corpus(args):
+    if args.corpus:
+        with open(args.corpus, encoding="utf-8") as f:
+            return [json.loads(linea) for linea in f if linea.strip()]
+    from clasificador import registros_almacen
+    return [{"categoria": categoria, "letra": letra, "respuesta": respuesta, "valida": bool(veredicto)}
+            for (categoria, letra, respuesta), (veredicto, _razon, _confianza, _fuente) in registros_almacen().items()]
+
+
+def percentil(valores, p):
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(p * len(valores)))] if valores else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--corpus")
+    parser.add_argument("--muestra", type=int, default=100)
+    parser.add_argument("--lotes", action="store_true", help="validar por lotes en vez de una a una")
+    parser.add_argument("--exportar")
+    args = parser.parse_args()
+
+    # Solo la IA: sin caché durable ni niveles locales que respondan antes
+    for variable, valor in (("BASTA_INSTANTANEA", "0"), ("BASTA_ARCHIVO_SALAS", "0"),
+                            ("BASTA_VALIDACIONES_DURABLES", "0"), ("BASTA_LEXICO", "0"),
+                            ("BASTA_CORRECCION_LOCAL", "0"), ("BASTA_CLASIFICADOR", "0"),
+                            ("BASTA_VALIDACION_INCREMENTAL", "0")):
+        os.environ[variable] = valor
+    if args.corpus:
+        os.environ.setdefault("BASTA_ALMACEN", "memoria")
+
+    corpus = leer_corpus(args)
+    random.Random(11).shuffle(corpus)
+    corpus = corpus[:args.muestra]
+    if not corpus:
+        sys.exit("Corpus vacío")
+    if args.exportar:
+        with open(args.exportar, "w", encoding="utf-8") as f:
+            for item in corpus:
+                f.write(json.dumps(item, ensure_ascii=False) + "\n")
+        print(f"💾 {len(corpus)} casos guardados en {args.exportar}")
+
+    import app as basta
+    con_api = bool(basta.openai_client)
+    if not con_api:
+        basta.openai_client = ClienteFalso()
+        basta.OPENAI_AVAILABLE = True
+        print("⚠️ Sin OPENAI_API_KEY: cliente falso, solo es comparable el tamaño de los prompts\n")
+
+    llamadas = {modo: [] for modo in MODOS}
+    aciertos = {modo: 0 for modo in MODOS}
+    juzgadas = {modo: 0 for modo in MODOS}
+    veredictos = {modo: {} for modo in MODOS}
+
+    def ejecutar(modo, grupo):
+        basta.MODO_PROMPT = modo
+        basta.cache_validaciones_ia.limpiar()
+        antes = len(basta.ultimas_llamadas_ia)
+        if args.lotes:
+            resultados = basta.validar_lote_con_ia([i["respuesta"] for i in grupo], grupo[0]["categoria"], grupo[0]["letra"])
+            obtenidos = [(i, resultados.get(i["respuesta"])) for i in grupo]
+        else:
+            obtenidos = [(i, basta.validar_respuesta_con_ia(i["respuesta"], i["categoria"], i["letra"])) for i in grupo]
+        if len(basta.ultimas_llamadas_ia) == antes:
+            return  # Rechazada antes de llegar a la IA
+        llamadas[modo].append(basta.ultimas_llamadas_ia[-1])
+        for item, veredicto in obtenidos:
+            if veredicto is None:
+                continue
+            juzgadas[modo] += 1
+            aciertos[modo] += veredicto[0] == item["valida"]
+            veredictos[modo][(item["categoria"], item["letra"], item["respuesta"])] = veredicto[0]
+
+    if args.lotes:
+        grupos = {}
+        for item in corpus:
+            grupos.setdefault((item["categoria"], item["letra"]), []).append(item)
+        trabajos = [g[i:i + basta.MAX_RESPUESTAS_POR_LOTE] for g in grupos.values()
+                    for i in range(0, len(g), basta.MAX_RESPUESTAS_POR_LOTE)]
+    else:
+        trabajos = [[item] for item in corpus]
+    for numero, grupo in enumerate(trabajos):
+        # Se alterna qué modo va primero para no favorecer a ninguno
+        for modo in (MODOS if numero % 2 == 0 else MODOS[::-1]):
+            ejecutar(modo, grupo)
+
+    print(f"\n{len(corpus)} casos, {'por lotes' if args.lotes else 'una a una'}\n")
+    print(f"{'modo':>9} | {'llamadas':>8} | {'tokens ent.':>11} | {'tokens sal.':>11} | {'p50 ms':>7} | "
+          f"{'p95 ms':>7} | {'err. formato':>12} | {'acuerdo':>7}")
+    print("-" * 92)
+    resumen = basta.resumen_llamadas_ia()["por_modo"]
+    tipo = "lote" if args.lotes else "individual"
+    for modo in MODOS:
+        registro = llamadas[modo]
+        latencias = [r["ms"] for r in registro]
+        errores = resumen.get(f"{modo}/{tipo}", {}).get("errores_formato", 0)
+        print(f"{modo:>9} | {len(registro):>8} | "
+              f"{statistics.mean(r['tokens_entrada'] for r in registro) if registro else 0:>11.0f} | "
+              f"{statistics.mean(r['tokens_salida'] for r in registro) if registro else 0:>11.1f} | "
+              f"{percentil(latencias, 0.5):>7.0f} | {percentil(latencias, 0.95):>7.0f} | {errores:>12} | "
+              f"{aciertos[modo] / juzgadas[modo] if juzgadas[modo] else 0:>7.0%}")
+    comunes = veredictos["completo"].keys() & veredictos["compacto"].keys()
+    distintos = sum(1 for clave in comunes if veredictos["completo"][clave] != veredictos["compacto"][clave])
+    print(f"\nVeredictos distintos entre modos: {distintos}/{len(comunes)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Caché de validaciones compartida por todas las salas del proceso: una
+respuesta ya juzgada por la IA (misma categoría, letra y texto normalizado)
+no vuelve a costar una llamada a OpenAI. Detrás está la tabla de
+validaciones del almacén (segundo nivel), que sobrevive a los reinicios y se
+comparte entre instancias.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class CacheValidaciones:
+    """
+    LRU con caducidad: guarda hasta `capacidad` veredictos durante `ttl`
+    segundos. Cuenta aciertos y fallos, y el tiempo de las llamadas a la IA
+    para estimar cuántos segundos de espera se ahorraron.
+    """
+
+    def __init__(self, capacidad=20000, ttl=24 * 3600):
+        self.capacidad = capacidad
+        self.ttl = ttl
+        self._datos = OrderedDict()  # {clave: (instante de caducidad, veredicto)}
+        self._lock = threading.Lock()
+        self.metricas = {
+            "aciertos": 0,
+            "fallos": 0,
+            "caducadas": 0,
+            "expulsadas": 0,
+            "llamadas_ia": 0,
+            "segundos_ia": 0.0,
+            "consultadas_almacen": 0,
+            "aciertos_almacen": 0,
+            "guardadas_almacen": 0,
+        }
+
+    def obtener(self, clave):
+        """Veredicto guardado para `clave`, o None"""
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                self.metricas["fallos"] += 1
+                return None
+            caduca, veredicto = entrada
+            if caduca < time.monotonic():
+                del self._datos[clave]
+                self.metricas["caducadas"] += 1
+                self.metricas["fallos"] += 1
+                return None
+            self._datos.move_to_end(clave)
+            self.metricas["aciertos"] += 1
+            return veredicto
+
+    def ver(self, clave):
+        """Como obtener, pero sin contar ni refrescar la entrada"""
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None or entrada[0] < time.monotonic():
+                return None
+            return entrada[1]
+
+    def faltantes(self, claves):
+        """Las claves de `claves` que no tienen veredicto vigente"""
+        ahora = time.monotonic()
+        with self._lock:
+            return [c for c in claves if c not in self._datos or self._datos[c][0] < ahora]
+
+    def guardar(self, clave, veredicto):
+        with self._lock:
+            self._datos[clave] = (time.monotonic() + self.ttl, veredicto)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.capacidad:
+                self._datos.popitem(last=False)
+                self.metricas["expulsadas"] += 1
+
+    def registrar_llamada(self, segundos):
+        """Anota la duración de una llamada real a la IA (un fallo de caché)"""
+        with self._lock:
+            self.metricas["llamadas_ia"] += 1
+            self.metricas["segundos_ia"] += segundos
+
+    def registrar_almacen(self, consultadas=0, aciertos=0, guardadas=0):
+        """Anota las consultas y escrituras a la tabla de validaciones"""
+        with self._lock:
+            self.metricas["consultadas_almacen"] += consultadas
+            self.metricas["aciertos_almacen"] += aciertos
+            self.metricas["guardadas_almacen"] += guardadas
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+
+    def estadisticas(self):
+        with self._lock:
+            consultas = self.metricas["aciertos"] + self.metricas["fallos"]
+            llamadas = self.metricas["llamadas_ia"]
+            media = self.metricas["segundos_ia"] / llamadas if llamadas else 0.0
+            return {
+                **self.metricas,
+                "segundos_ia": round(self.metricas["segundos_ia"], 2),
+                "entradas": len(self._datos),
+                "capacidad": self.capacidad,
+                "ttl_s": self.ttl,
+                "tasa_aciertos": round(self.metricas["aciertos"] / consultas, 3) if consultas else 0.0,
+                "llamadas_ahorradas": self.metricas["aciertos"],
+                "segundos_ahorrados_estimados": round(self.metricas["aciertos"] * media, 2),
+            }
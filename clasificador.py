@@ -0,0 +1,327 @@
+"""
+Clasificador local por categoría: una regresión logística por categoría
+sobre n-gramas de caracteres (con hashing, sin vocabulario), entrenada con
+los veredictos de la tabla de validaciones. Responde "válida", "inválida" o
+"no sé"; solo decide cuando la probabilidad pasa los umbrales calibrados en
+datos apartados para una precisión objetivo, y lo demás sigue a la IA.
+
+Todo es NumPy y opcional: sin numpy (o sin modelo entrenado) el juego
+funciona igual que antes.
+
+Uso:
+    python clasificador.py entrenar [--salida data/clasificador.npz]
+    python clasificador.py informe [--modelo data/clasificador.npz]
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import time
+import zlib
+
+from lexico import nombre_archivo_categoria, normalizar_lexico
+
+# numpy es opcional: sin él no hay clasificador local y todo va a la IA
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+VERSION_MODELO = 1
+RUTA_MODELO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "clasificador.npz")
+# Peso de cada veredicto al entrenar según quién lo decidió
+PESO_FUENTE = {"ia": 1.0, "apelacion": 3.0, "admin": 3.0}
+# Métricas por categoría sobre los datos apartados (se guardan con el modelo)
+CAMPOS_INFORME = ("ejemplos", "prueba", "validas", "exactitud", "cobertura", "precision_decididas")
+
+
+def rasgos(texto, dimension, n_min=2, n_max=4):
+    """Posiciones (con hashing) de los n-gramas de ' texto ' y de la palabra completa"""
+    texto = f" {normalizar_lexico(texto)} "
+    mascara = dimension - 1
+    vistos = {zlib.crc32(("#" + texto).encode("utf-8")) & mascara}
+    for n in range(n_min, n_max + 1):
+        for i in range(len(texto) - n + 1):
+            vistos.add(zlib.crc32(texto[i:i + n].encode("utf-8")) & mascara)
+    return sorted(vistos)
+
+
+def _entrenar_logistica(filas, etiquetas, pesos_muestra, dimension, iteraciones=150, paso=0.5, l2=1e-3):
+    """
+    Regresión logística con AdaGrad a lote completo. Las filas son listas de
+    posiciones (rasgos binarios): el producto con los pesos es una suma por
+    tramos (reduceat) y el gradiente un bincount, sin matriz densa.
+    """
+    longitudes = np.fromiter((len(f) for f in filas), dtype=np.int64, count=len(filas))
+    indices = np.fromiter((i for f in filas for i in f), dtype=np.int64, count=int(longitudes.sum()))
+    inicios = np.concatenate(([0], np.cumsum(longitudes)[:-1]))
+    y = np.asarray(etiquetas, dtype=np.float64)
+    m = np.asarray(pesos_muestra, dtype=np.float64)
+    m /= m.sum()
+
+    previa = min(max(float((y * m).sum()), 1e-3), 1 - 1e-3)
+    w = np.zeros(dimension)
+    b = math.log(previa / (1 - previa))
+    acumulado_w = np.full(dimension, 1e-12)
+    acumulado_b = 1e-12
+    for _ in range(iteraciones):
+        z = np.clip(np.add.reduceat(w[indices], inicios) + b, -30, 30)
+        error = (1.0 / (1.0 + np.exp(-z)) - y) * m
+        gradiente_w = np.bincount(indices, weights=np.repeat(error, longitudes), minlength=dimension) + l2 * w
+        gradiente_b = float(error.sum())
+        acumulado_w += gradiente_w ** 2
+        acumulado_b += gradiente_b ** 2
+        w -= paso * gradiente_w / np.sqrt(acumulado_w)
+        b -= paso * gradiente_b / math.sqrt(acumulado_b)
+    return w.astype(np.float32), b
+
+
+def _umbrales(probabilidades, etiquetas, precision, minimo=5):
+    """
+    (umbral_si, umbral_no): el menor umbral con el que {p >= umbral_si} tiene
+    al menos `precision` de válidas de verdad, y el mayor con el que
+    {p <= umbral_no} tiene al menos `precision` de inválidas. Si no se llega,
+    ese lado no decide nunca (1.01 o -0.01).
+    """
+    orden = sorted(zip(probabilidades, etiquetas), key=lambda par: -par[0])
+    umbral_si, aciertos = 1.01, 0
+    for i, (p, y) in enumerate(orden, 1):
+        aciertos += y
+        if i >= minimo and aciertos / i >= precision:
+            umbral_si = p
+    umbral_no, aciertos = -0.01, 0
+    for i, (p, y) in enumerate(reversed(orden), 1):
+        aciertos += 1 - y
+        if i >= minimo and aciertos / i >= precision:
+            umbral_no = p
+    # Nunca decidir cerca de la duda, aunque los datos apartados lo permitan
+    return max(umbral_si, 0.8), min(umbral_no, 0.2)
+
+
+class ClasificadorCategorias:
+    """Pesos (una fila por categoría), sesgos y umbrales; se guarda en un .npz sin pickle"""
+
+    def __init__(self, categorias, pesos, sesgos, umbral_si, umbral_no, dimension, n_min=2, n_max=4, informe=None):
+        self.categorias = {nombre: i for i, nombre in enumerate(categorias)}
+        self.pesos = pesos
+        self.sesgos = [float(b) for b in sesgos]
+        self.umbral_si = [float(u) for u in umbral_si]
+        self.umbral_no = [float(u) for u in umbral_no]
+        self.dimension = int(dimension)
+        self.n_min = int(n_min)
+        self.n_max = int(n_max)
+        self.informe = informe or {}
+        self.metricas = {"consultas": 0, "decididas": 0, "validas": 0, "segundos": 0.0}
+
+    @classmethod
+    def cargar(cls, ruta):
+        with np.load(ruta, allow_pickle=False) as datos:
+            if int(datos["version"]) != VERSION_MODELO:
+                raise ValueError(f"versión de modelo {int(datos['version'])}, se esperaba {VERSION_MODELO}")
+            categorias = [str(c) for c in datos["categorias"]]
+            informe = {
+                nombre: {campo: float(datos[f"informe_{campo}"][i]) for campo in CAMPOS_INFORME}
+                for i, nombre in enumerate(categorias)
+            }
+            return cls(categorias, datos["pesos"], datos["sesgos"], datos["umbral_si"], datos["umbral_no"],
+                       datos["dimension"], datos["n_min"], datos["n_max"], informe)
+
+    def guardar(self, ruta):
+        categorias = sorted(self.categorias, key=self.categorias.get)
+        informe = {
+            f"informe_{campo}": np.array([self.informe.get(c, {}).get(campo, 0.0) for c in categorias])
+            for campo in CAMPOS_INFORME
+        }
+        directorio = os.path.dirname(os.path.abspath(ruta))
+        os.makedirs(directorio, exist_ok=True)
+        temporal = ruta + ".tmp.npz"
+        np.savez(temporal, version=VERSION_MODELO, categorias=np.array(categorias), pesos=self.pesos,
+                 sesgos=np.array(self.sesgos), umbral_si=np.array(self.umbral_si),
+                 umbral_no=np.array(self.umbral_no), dimension=self.dimension, n_min=self.n_min,
+                 n_max=self.n_max, **informe)
+        os.replace(temporal, ruta)
+
+    def probabilidad(self, categoria, respuesta):
+        """P(válida) según el modelo de la categoría, o None si la categoría no tiene modelo"""
+        fila = self.categorias.get(nombre_archivo_categoria(categoria))
+        if fila is None:
+            return None
+        z = float(self.pesos[fila][rasgos(respuesta, self.dimension, self.n_min, self.n_max)].sum()) + self.sesgos[fila]
+        return 1.0 / (1.0 + math.exp(-max(-30.0, min(30.0, z))))
+
+    def veredicto(self, categoria, respuesta):
+        """(es_valida, probabilidad) si el modelo está seguro, o None para preguntar a la IA"""
+        inicio = time.perf_counter()
+        p = self.probabilidad(categoria, respuesta)
+        self.metricas["segundos"] += time.perf_counter() - inicio
+        if p is None:
+            return None
+        self.metricas["consultas"] += 1
+        fila = self.categorias[nombre_archivo_categoria(categoria)]
+        if p >= self.umbral_si[fila]:
+            es_valida = True
+        elif p <= self.umbral_no[fila]:
+            es_valida = False
+        else:
+            return None
+        self.metricas["decididas"] += 1
+        self.metricas["validas"] += es_valida
+        return es_valida, p
+
+    def estado(self):
+        consultas = self.metricas["consultas"]
+        return {
+            **self.metricas,
+            "segundos": round(self.metricas["segundos"], 3),
+            "us_por_consulta": round(self.metricas["segundos"] * 1e6 / consultas, 1) if consultas else 0.0,
+            "categorias": {
+                nombre: {"umbral_si": round(self.umbral_si[i], 3), "umbral_no": round(self.umbral_no[i], 3),
+                         **self.informe.get(nombre, {})}
+                for nombre, i in self.categorias.items()
+            },
+            "kb": round(self.pesos.nbytes / 1024, 1),
+        }
+
+
+def entrenar(registros, dimension=2 ** 15, min_ejemplos=50, precision=0.97, fraccion_prueba=0.2, semilla=7):
+    """
+    Un modelo por categoría con al menos `min_ejemplos` veredictos (y de los
+    dos tipos) a partir de {clave: (veredicto, razón, confianza, fuente)}.
+    Los umbrales y el informe salen de la fracción apartada para prueba.
+    """
+    por_categoria = {}
+    for (categoria, _letra, respuesta), (veredicto, _razon, _confianza, fuente) in registros.items():
+        por_categoria.setdefault(nombre_archivo_categoria(categoria), {})[respuesta] = (
+            bool(veredicto), PESO_FUENTE.get(fuente, 1.0))
+
+    aleatorio = random.Random(semilla)
+    nombres, pesos, sesgos, umbrales_si, umbrales_no, informe = [], [], [], [], [], {}
+    for nombre, ejemplos in sorted(por_categoria.items()):
+        validas = sum(1 for veredicto, _ in ejemplos.values() if veredicto)
+        if len(ejemplos) < min_ejemplos or min(validas, len(ejemplos) - validas) < 5:
+            continue
+        respuestas = sorted(ejemplos)
+        aleatorio.shuffle(respuestas)
+        corte = max(1, int(len(respuestas) * fraccion_prueba))
+        prueba, entrenamiento = respuestas[:corte], respuestas[corte:]
+
+        w, b = _entrenar_logistica([rasgos(r, dimension) for r in entrenamiento],
+                                   [ejemplos[r][0] for r in entrenamiento],
+                                   [ejemplos[r][1] for r in entrenamiento], dimension)
+        probabilidades = [1.0 / (1.0 + math.exp(-max(-30.0, min(30.0, float(w[rasgos(r, dimension)].sum()) + b))))
+                          for r in prueba]
+        etiquetas = [int(ejemplos[r][0]) for r in prueba]
+        umbral_si, umbral_no = _umbrales(probabilidades, etiquetas, precision)
+
+        decididas = [(p >= umbral_si, y) for p, y in zip(probabilidades, etiquetas) if p >= umbral_si or p <= umbral_no]
+        nombres.append(nombre)
+        pesos.append(w)
+        sesgos.append(b)
+        umbrales_si.append(umbral_si)
+        umbrales_no.append(umbral_no)
+        informe[nombre] = {
+            "ejemplos": float(len(ejemplos)),
+            "prueba": float(len(prueba)),
+            "validas": round(validas / len(ejemplos), 3),
+            "exactitud": round(sum((p >= 0.5) == y for p, y in zip(probabilidades, etiquetas)) / len(prueba), 3),
+            "cobertura": round(len(decididas) / len(prueba), 3),
+            "precision_decididas": round(sum(d == y for d, y in decididas) / len(decididas), 3) if decididas else 0.0,
+        }
+
+    matriz = np.vstack(pesos) if pesos else np.zeros((0, dimension), dtype=np.float32)
+    return ClasificadorCategorias(nombres, matriz, sesgos, umbrales_si, umbrales_no, dimension, informe=informe)
+
+
+def cargar_clasificador(ruta):
+    """El modelo de `ruta`, o None si falta numpy o el archivo (sin clasificador local)"""
+    if np is None:
+        print("⚠️ Clasificador local desactivado: instala numpy")
+        return None
+    if not os.path.exists(ruta):
+        return None
+    try:
+        inicio = time.perf_counter()
+        clasificador = ClasificadorCategorias.cargar(ruta)
+        print(f"🧠 Clasificador local cargado: {len(clasificador.categorias)} categorías "
+              f"en {(time.perf_counter() - inicio) * 1000:.0f} ms")
+        return clasificador
+    except Exception as e:
+        print(f"⚠️ No se pudo cargar el clasificador local ({ruta}): {type(e).__name__}: {e}")
+        return None
+
+
+def imprimir_informe(clasificador):
+    print(f"{'categoría':>20} | {'ejemplos':>8} | {'prueba':>6} | {'válidas':>7} | {'exactitud':>9} | "
+          f"{'cobertura':>9} | {'precisión':>9} | {'umbral sí':>9} | {'umbral no':>9}")
+    print("-" * 110)
+    for nombre, i in sorted(clasificador.categorias.items()):
+        datos = clasificador.informe.get(nombre, {})
+        print(f"{nombre:>20} | {datos.get('ejemplos', 0):>8.0f} | {datos.get('prueba', 0):>6.0f} | "
+              f"{datos.get('validas', 0):>7.0%} | {datos.get('exactitud', 0):>9.1%} | "
+              f"{datos.get('cobertura', 0):>9.1%} | {datos.get('precision_decididas', 0):>9.1%} | "
+              f"{clasificador.umbral_si[i]:>9.3f} | {clasificador.umbral_no[i]:>9.3f}")
+
+    # Latencia de una consulta (lo que cuesta el clasificador delante de la IA)
+    consultas = [(nombre, "".join(random.Random(i).choices("abcdefghijklmnopqrstuvwxyz", k=7)))
+                 for i, nombre in enumerate(list(clasificador.categorias) * 200)]
+    if consultas:
+        inicio = time.perf_counter()
+        for nombre, texto in consultas:
+            clasificador.probabilidad(nombre, texto)
+        print(f"\nLatencia: {(time.perf_counter() - inicio) * 1e6 / len(consultas):.1f} µs por consulta; "
+              f"pesos: {clasificador.pesos.nbytes / 1024:.0f} KB")
+
+
+def registros_almacen():
+    """Veredictos del almacén configurado igual que el juego (BASTA_ALMACEN, AZURE_MYSQL_CONNECTIONSTRING...)"""
+    from flask import Flask
+
+    from almacen import crear_almacen, uri_almacen
+    from database import init_db
+
+    tipo = os.getenv("BASTA_ALMACEN", "mysql")
+    app = Flask("clasificador")
+    app.config["SQLALCHEMY_DATABASE_URI"] = uri_almacen(tipo)
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    init_db(app)
+    return crear_almacen(tipo, app).exportar_validaciones()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Clasificador local de respuestas por categoría")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+    entrenar_cmd = comandos.add_parser("entrenar", help="entrena con la tabla de validaciones y guarda el modelo")
+    entrenar_cmd.add_argument("--salida", default=RUTA_MODELO)
+    entrenar_cmd.add_argument("--min-ejemplos", type=int, default=50)
+    entrenar_cmd.add_argument("--precision", type=float, default=0.97,
+                              help="precisión mínima (en datos apartados) de lo que se decide sin IA")
+    entrenar_cmd.add_argument("--dimension", type=int, default=2 ** 15, help="potencia de 2")
+    informe_cmd = comandos.add_parser("informe", help="exactitud, cobertura y latencia de un modelo guardado")
+    informe_cmd.add_argument("--modelo", default=RUTA_MODELO)
+    args = parser.parse_args()
+
+    if np is None:
+        sys.exit("Hace falta numpy: pip install numpy")
+    if args.comando == "entrenar":
+        if args.dimension & (args.dimension - 1):
+            sys.exit("--dimension debe ser potencia de 2")
+        registros = registros_almacen()
+        print(f"📚 {len(registros)} veredictos en la tabla de validaciones")
+        inicio = time.perf_counter()
+        clasificador = entrenar(registros, dimension=args.dimension, min_ejemplos=args.min_ejemplos,
+                                precision=args.precision)
+        print(f"🧠 {len(clasificador.categorias)} categorías entrenadas en {time.perf_counter() - inicio:.1f} s")
+        if not clasificador.categorias:
+            sys.exit(f"Ninguna categoría tiene {args.min_ejemplos} veredictos de los dos tipos todavía")
+        clasificador.guardar(args.salida)
+        print(f"💾 Modelo guardado en {args.salida} ({os.path.getsize(args.salida) / 1024:.0f} KB)\n")
+    else:
+        inicio = time.perf_counter()
+        clasificador = ClasificadorCategorias.cargar(args.modelo)
+        print(f"Carga del modelo: {(time.perf_counter() - inicio) * 1000:.1f} ms\n")
+    imprimir_informe(clasificador)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""
+Envoltorio del cliente de OpenAI con límite de ritmo y cortacircuitos.
+
+Expone la misma interfaz que usa el juego (`cliente.chat.completions.create`)
+pero antes de cada llamada toma una petición y los tokens estimados de dos
+cubos (por minuto) y, si la API está fallando o va muy lenta, deja de
+llamarla durante un rato: las llamadas fallan al instante con
+CircuitoIAAbierto y el juego usa su validación local en vez de esperar 6 s
+de timeout por cada respuesta.
+"""
+import threading
+import time
+import types
+
+
+class CircuitoIAAbierto(Exception):
+    """La IA está en pausa tras varios errores o respuestas lentas seguidas"""
+
+
+class LimiteIAExcedido(Exception):
+    """No hay cupo de peticiones o tokens sin esperar más de lo permitido"""
+
+
+class CuboTokens:
+    """Cubo que se rellena a `por_minuto` unidades por minuto (ráfaga máxima: un minuto)"""
+
+    def __init__(self, por_minuto):
+        self.capacidad = float(por_minuto)
+        self.por_segundo = por_minuto / 60.0
+        self._disponibles = float(por_minuto)
+        self._instante = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _rellenar(self, ahora):
+        self._disponibles = min(self.capacidad, self._disponibles + (ahora - self._instante) * self.por_segundo)
+        self._instante = ahora
+
+    def tomar(self, cantidad, espera_max):
+        """
+        Descuenta `cantidad` (esperando a que haya cupo). Devuelve los segundos
+        esperados; LimiteIAExcedido si haría falta esperar más de `espera_max`.
+        """
+        cantidad = min(float(cantidad), self.capacidad)
+        with self._lock:
+            self._rellenar(time.monotonic())
+            espera = max(0.0, (cantidad - self._disponibles) / self.por_segundo)
+            if espera > espera_max:
+                raise LimiteIAExcedido(f"harían falta {espera:.1f} s de espera")
+            # Se reserva ya: quien llegue después espera detrás de esta petición
+            self._disponibles -= cantidad
+        if espera > 0:
+            time.sleep(espera)
+        return espera
+
+    def ajustar(self, diferencia):
+        """Corrige la estimación con lo consumido de verdad (positivo = se gastó más)"""
+        with self._lock:
+            self._rellenar(time.monotonic())
+            self._disponibles = min(self.capacidad, self._disponibles - diferencia)
+
+
+class _Completions:
+    def __init__(self, protegido):
+        self._protegido = protegido
+
+    def create(self, **kwargs):
+        return self._protegido.crear(**kwargs)
+
+
+class ClienteIAProtegido:
+    """
+    Cortacircuitos: se abre tras `fallos_seguidos` errores o `lentas_seguidas`
+    respuestas más lentas que `latencia_max` segundos; pasado `enfriamiento`
+    deja pasar una llamada de prueba (semiabierto) y, si va bien, se cierra.
+    """
+
+    def __init__(self, cliente, rpm=500, tpm=200000, fallos_seguidos=5, latencia_max=5.0,
+                 lentas_seguidas=3, enfriamiento=30, espera_max=10):
+        self.cliente = cliente
+        self.chat = types.SimpleNamespace(completions=_Completions(self))
+        self.peticiones = CuboTokens(rpm)
+        self.tokens = CuboTokens(tpm)
+        self.fallos_seguidos = fallos_seguidos
+        self.latencia_max = latencia_max
+        self.lentas_seguidas = lentas_seguidas
+        self.enfriamiento = enfriamiento
+        self.espera_max = espera_max
+        self.estado_circuito = "cerrado"  # "cerrado", "abierto" o "semiabierto"
+        self._abierto_hasta = 0.0
+        self._sonda_en_curso = False
+        self._fallos = 0
+        self._lentas = 0
+        self._lock = threading.Lock()
+        self.metricas = {
+            "llamadas": 0,
+            "errores": 0,
+            "lentas": 0,
+            "rechazadas_circuito": 0,
+            "rechazadas_limite": 0,
+            "aperturas": 0,
+            "segundos_esperando_cupo": 0.0,
+            "tokens_consumidos": 0,
+        }
+
+    def disponible(self):
+        """False si ahora mismo una llamada fallaría al instante por el cortacircuitos"""
+        with self._lock:
+            if self.estado_circuito == "cerrado":
+                return True
+            if self.estado_circuito == "abierto":
+                return time.monotonic() >= self._abierto_hasta
+            return not self._sonda_en_curso
+
+    def _permitir(self):
+        with self._lock:
+            if self.estado_circuito == "abierto":
+                if time.monotonic() < self._abierto_hasta:
+                    self.metricas["rechazadas_circuito"] += 1
+                    raise CircuitoIAAbierto(f"IA en pausa {self._abierto_hasta - time.monotonic():.1f} s más")
+                self.estado_circuito = "semiabierto"
+                self._sonda_en_curso = False
+            if self.estado_circuito == "semiabierto":
+                if self._sonda_en_curso:
+                    self.metricas["rechazadas_circuito"] += 1
+                    raise CircuitoIAAbierto("IA en prueba tras una pausa")
+                self._sonda_en_curso = True
+
+    def _abrir(self, motivo):
+        """Con el lock tomado"""
+        if self.estado_circuito != "abierto":
+            self.metricas["aperturas"] += 1
+            print(f"🔌 Cortacircuitos de IA abierto ({motivo}); validación local durante {self.enfriamiento} s")
+        self.estado_circuito = "abierto"
+        self._abierto_hasta = time.monotonic() + self.enfriamiento
+        self._sonda_en_curso = False
+        self._fallos = 0
+        self._lentas = 0
+
+    def _registrar(self, error, latencia=0.0):
+        with self._lock:
+            lenta = not error and latencia > self.latencia_max
+            if error:
+                self.metricas["errores"] += 1
+                self._fallos += 1
+            else:
+                self._fallos = 0
+            if lenta:
+                self.metricas["lentas"] += 1
+                self._lentas += 1
+            elif not error:
+                self._lentas = 0
+
+            if self.estado_circuito == "semiabierto":
+                if error or lenta:
+                    self._abrir("falló la llamada de prueba")
+                else:
+                    self.estado_circuito = "cerrado"
+                    self._sonda_en_curso = False
+                    print("🔌 Cortacircuitos de IA cerrado: la API responde de nuevo")
+            elif self._fallos >= self.fallos_seguidos:
+                self._abrir(f"{self._fallos} errores seguidos")
+            elif self._lentas >= self.lentas_seguidas:
+                self._abrir(f"{self._lentas} respuestas de más de {self.latencia_max:g} s seguidas")
+
+    @staticmethod
+    def _estimar_tokens(kwargs):
+        """~4 caracteres por token en la entrada más el máximo de salida pedido"""
+        entrada = sum(len(str(m.get("content", ""))) for m in kwargs.get("messages", [])) // 4
+        return entrada + int(kwargs.get("max_tokens") or 0)
+
+    def crear(self, **kwargs):
+        self._permitir()
+        estimados = self._estimar_tokens(kwargs)
+        peticion_tomada = False
+        try:
+            esperado = self.peticiones.tomar(1, self.espera_max)
+            peticion_tomada = True
+            esperado += self.tokens.tomar(estimados, self.espera_max)
+        except LimiteIAExcedido:
+            if peticion_tomada:
+                self.peticiones.ajustar(-1)  # La llamada no se hace: se devuelve su petición
+            self.metricas["rechazadas_limite"] += 1
+            with self._lock:
+                if self.estado_circuito == "semiabierto":
+                    self._sonda_en_curso = False
+            raise
+        self.metricas["segundos_esperando_cupo"] += esperado
+
+        inicio = time.perf_counter()
+        self.metricas["llamadas"] += 1
+        try:
+            respuesta = self.cliente.chat.completions.create(**kwargs)
+        except Exception:
+            self._registrar(error=True)
+            raise
+        self._registrar(error=False, latencia=time.perf_counter() - inicio)
+
+        uso = getattr(respuesta, "usage", None)
+        consumidos = getattr(uso, "total_tokens", 0) or 0
+        if consumidos:
+            self.metricas["tokens_consumidos"] += consumidos
+            self.tokens.ajustar(consumidos - estimados)
+        return respuesta
+
+    def estado(self):
+        with self._lock:
+            return {
+                **self.metricas,
+                "segundos_esperando_cupo": round(self.metricas["segundos_esperando_cupo"], 2),
+                "circuito": self.estado_circuito,
+                "reabre_en_s": round(max(0.0, self._abierto_hasta - time.monotonic()), 1)
+                if self.estado_circuito == "abierto" else 0.0,
+                "rpm": int(self.peticiones.capacidad),
+                "tpm": int(self.tokens.capacidad),
+            }
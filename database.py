@@ -1,24 +1,130 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
 from sqlalchemy.dialects.mysql import LONGTEXT
-from sqlalchemy.types import TypeDecorator
-import json
+from sqlalchemy.types import TypeDecorator, Text
+import base64, json, os, zlib
+
+# zstd es opcional: si no está instalado se usa zlib
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 db = SQLAlchemy()
 
+# ==========================================================
+# CODECS DE LA COLUMNA DATOS
+# ==========================================================
+# Cada valor guardado lleva un encabezado con su formato, así las filas
+# antiguas (JSON plano) se siguen leyendo aunque se cambie de codec:
+#   {...}            JSON plano (formato original)
+#   ~1<base64>       JSON comprimido con zlib
+#   ~2<base64>       JSON comprimido con zstd
+# La columna sigue siendo LONGTEXT, por eso el binario va en base64.
+PREFIJO_CODEC = "~"
+VERSIONES_CODEC = {"zlib": "1", "zstd": "2"}
+
+# Codec con el que se escriben las salas: "json", "zlib" o "zstd"
+CODEC_SALAS = os.getenv("BASTA_CODEC_SALAS", "json")
+if CODEC_SALAS == "zstd" and zstandard is None:
+    print("⚠️ zstandard no está instalado, se usará zlib para las salas")
+    CODEC_SALAS = "zlib"
+
+def codificar(valor, codec="json"):
+    """Serializa un documento con el codec indicado (texto apto para LONGTEXT)"""
+    if codec == "json":
+        return json.dumps(valor, separators=(",", ":"))
+    crudo = json.dumps(valor, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    if codec == "zstd":
+        comprimido = zstandard.ZstdCompressor(level=3).compress(crudo)
+    else:
+        codec = "zlib"
+        comprimido = zlib.compress(crudo, 6)
+    return PREFIJO_CODEC + VERSIONES_CODEC[codec] + base64.b64encode(comprimido).decode("ascii")
+
+def decodificar(texto):
+    """Lee un documento en cualquiera de los formatos soportados"""
+    if not texto.startswith(PREFIJO_CODEC):
+        return json.loads(texto)
+    version = texto[1:2]
+    comprimido = base64.b64decode(texto[2:])
+    if version == VERSIONES_CODEC["zlib"]:
+        return json.loads(zlib.decompress(comprimido))
+    if version == VERSIONES_CODEC["zstd"]:
+        if zstandard is None:
+            raise ValueError("Documento comprimido con zstd pero zstandard no está instalado")
+        return json.loads(zstandard.ZstdDecompressor().decompress(comprimido))
+    raise ValueError(f"Versión de codec desconocida: {version!r}")
+
 class JSONType(TypeDecorator):
     impl = LONGTEXT
+    cache_ok = True
+    def __init__(self, codec=None):
+        # Sin codec explícito se usa CODEC_SALAS
+        super().__init__()
+        self.codec = codec
+    def load_dialect_impl(self, dialect):
+        # LONGTEXT solo existe en MySQL; en SQLite (pruebas/benchmarks) basta TEXT
+        if dialect.name == "mysql":
+            return dialect.type_descriptor(LONGTEXT())
+        return dialect.type_descriptor(Text())
     def process_bind_param(self, value, dialect):
-        return json.dumps(value) if value is not None else None
+        return codificar(value, self.codec or CODEC_SALAS) if value is not None else None
     def process_result_value(self, value, dialect):
-        return json.loads(value) if value is not None else None
+        return decodificar(value) if value is not None else None
 
 class SalaDB(db.Model):
     __tablename__ = 'salas'
     codigo = db.Column(db.String(10), primary_key=True)
     datos = db.Column(JSONType)
 
+class SalaEstadoDB(db.Model):
+    """Índice ligero del estado de cada sala, para no leer los documentos completos"""
+    __tablename__ = 'salas_estado'
+    codigo = db.Column(db.String(10), primary_key=True)
+    finalizada = db.Column(db.Boolean, default=False, index=True)
+    en_curso = db.Column(db.Boolean, default=False)
+    actualizada = db.Column(db.Float)
+
+class SalaArchivadaDB(db.Model):
+    """Salas finalizadas que ya salieron de la tabla caliente (siempre comprimidas)"""
+    __tablename__ = 'salas_archivadas'
+    codigo = db.Column(db.String(10), primary_key=True)
+    datos = db.Column(JSONType(codec="zlib"))
+    archivada = db.Column(db.Float)
+
+class SalaEventoDB(db.Model):
+    """Registro de cambios de cada sala desde su último snapshot (tabla salas)"""
+    __tablename__ = 'salas_eventos'
+    id = db.Column(db.BigInteger().with_variant(db.Integer, "sqlite"), primary_key=True, autoincrement=True)
+    codigo = db.Column(db.String(10), index=True, nullable=False)
+    ops = db.Column(JSONType(codec="json"))
+    creado = db.Column(db.Float)
+
+class ValidacionDB(db.Model):
+    """Veredictos conocidos por (categoría, letra, respuesta normalizada), de la IA, apelaciones o el admin"""
+    __tablename__ = 'validaciones'
+    categoria = db.Column(db.String(60), primary_key=True)
+    letra = db.Column(db.String(2), primary_key=True)
+    respuesta = db.Column(db.String(120), primary_key=True)
+    veredicto = db.Column(db.Boolean, nullable=False)
+    confianza = db.Column(db.Float)
+    razon = db.Column(db.String(255))
+    fuente = db.Column(db.String(12), nullable=False)  # "ia", "apelacion" o "admin"
+    actualizada = db.Column(db.Float)
+
+def activar_wal(engine):
+    """SQLite en modo WAL: las lecturas no bloquean al escritor y cada commit es un append"""
+    @event.listens_for(engine, "connect")
+    def _pragmas(conexion, _registro):
+        cursor = conexion.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.close()
+
 def init_db(app):
     db.init_app(app)
     with app.app_context():
+        if db.engine.dialect.name == "sqlite":
+            activar_wal(db.engine)
         db.create_all()
-
@@ -0,0 +1,133 @@
+"""
+Ejecutor compartido para todo el trabajo con la IA (validación, moderación
+del chat y pistas). Un único límite de llamadas simultáneas para todo el
+proceso, prioridades (la puntuación de fin de ronda antes que una pista) y
+turno rotativo entre salas, para que una sala de 40 jugadores no deje sin
+IA a las demás que terminan la ronda a la vez.
+"""
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+
+# Prioridades: menor número = antes
+PRIORIDAD_PUNTUACION = 0  # Validación de fin de ronda (y la que empieza al ¡BASTA!)
+PRIORIDAD_INTERACTIVA = 1  # Un jugador esperando: moderación del chat, pistas
+PRIORIDAD_FONDO = 2  # Validación incremental durante la ronda
+
+NOMBRES_PRIORIDAD = {
+    PRIORIDAD_PUNTUACION: "puntuacion",
+    PRIORIDAD_INTERACTIVA: "interactiva",
+    PRIORIDAD_FONDO: "fondo",
+}
+
+
+class EjecutorIA:
+    """
+    Cola por prioridad y, dentro de cada prioridad, una cola por sala que se
+    atienden por turnos. `concurrencia` trabajadores sacan tareas de ahí, así
+    que nunca hay más llamadas a la IA en vuelo que ese número.
+    """
+
+    def __init__(self, concurrencia=48):
+        self.concurrencia = concurrencia
+        self._colas = {p: OrderedDict() for p in NOMBRES_PRIORIDAD}  # {prioridad: {sala: deque}}
+        self._pendientes = 0
+        self._en_curso = 0
+        self._condicion = threading.Condition()
+        self._trabajadores = []
+        self.metricas = {
+            "enviadas": 0,
+            "completadas": 0,
+            "errores": 0,
+            "max_pendientes": 0,
+            "max_en_curso": 0,
+            "segundos_espera": 0.0,
+            "max_espera_ms": 0.0,
+        }
+        self._por_prioridad = {p: {"enviadas": 0, "segundos_espera": 0.0} for p in NOMBRES_PRIORIDAD}
+
+    def _iniciar(self):
+        while len(self._trabajadores) < self.concurrencia:
+            hilo = threading.Thread(target=self._bucle, daemon=True)
+            hilo.start()
+            self._trabajadores.append(hilo)
+
+    def enviar(self, funcion, *args, sala="", prioridad=PRIORIDAD_PUNTUACION, **kwargs):
+        """Encola `funcion(*args, **kwargs)` y devuelve su Future (sirve con concurrent.futures.wait)"""
+        futuro = Future()
+        with self._condicion:
+            if not self._trabajadores:
+                self._iniciar()
+            self._colas[prioridad].setdefault(sala, deque()).append((futuro, funcion, args, kwargs, time.perf_counter()))
+            self._pendientes += 1
+            self.metricas["enviadas"] += 1
+            self._por_prioridad[prioridad]["enviadas"] += 1
+            self.metricas["max_pendientes"] = max(self.metricas["max_pendientes"], self._pendientes)
+            self._condicion.notify()
+        return futuro
+
+    def ejecutar(self, funcion, *args, sala="", prioridad=PRIORIDAD_INTERACTIVA, **kwargs):
+        """Como enviar, pero espera el resultado (o relanza su excepción)"""
+        return self.enviar(funcion, *args, sala=sala, prioridad=prioridad, **kwargs).result()
+
+    def _siguiente(self):
+        """La tarea más prioritaria, rotando entre salas (con la condición tomada)"""
+        for prioridad, salas in self._colas.items():
+            if not salas:
+                continue
+            sala, cola = next(iter(salas.items()))
+            tarea = cola.popleft()
+            del salas[sala]
+            if cola:
+                salas[sala] = cola  # La sala pasa al final del turno
+            return prioridad, tarea
+        return None
+
+    def _bucle(self):
+        while True:
+            with self._condicion:
+                siguiente = self._siguiente()
+                while siguiente is None:
+                    self._condicion.wait()
+                    siguiente = self._siguiente()
+                self._pendientes -= 1
+                self._en_curso += 1
+                self.metricas["max_en_curso"] = max(self.metricas["max_en_curso"], self._en_curso)
+            prioridad, (futuro, funcion, args, kwargs, encolada) = siguiente
+            espera = time.perf_counter() - encolada
+            self.metricas["segundos_espera"] += espera
+            self.metricas["max_espera_ms"] = round(max(self.metricas["max_espera_ms"], espera * 1000), 2)
+            self._por_prioridad[prioridad]["segundos_espera"] += espera
+            if futuro.set_running_or_notify_cancel():
+                try:
+                    futuro.set_result(funcion(*args, **kwargs))
+                    self.metricas["completadas"] += 1
+                except BaseException as e:
+                    futuro.set_exception(e)
+                    self.metricas["errores"] += 1
+            with self._condicion:
+                self._en_curso -= 1
+
+    def estado(self):
+        """Profundidad de las colas y esperas, para el panel de admin"""
+        with self._condicion:
+            colas = {
+                NOMBRES_PRIORIDAD[p]: {
+                    "pendientes": sum(len(c) for c in salas.values()),
+                    "salas_esperando": len(salas),
+                    "enviadas": self._por_prioridad[p]["enviadas"],
+                    "espera_media_ms": round(
+                        self._por_prioridad[p]["segundos_espera"] * 1000 / self._por_prioridad[p]["enviadas"], 2
+                    ) if self._por_prioridad[p]["enviadas"] else 0.0,
+                }
+                for p, salas in self._colas.items()
+            }
+            return {
+                **self.metricas,
+                "segundos_espera": round(self.metricas["segundos_espera"], 2),
+                "concurrencia": self.concurrencia,
+                "pendientes": self._pendientes,
+                "en_curso": self._en_curso,
+                "colas": colas,
+            }
@@ -0,0 +1,82 @@
+"""
+Enrutado de modelos de la IA: cada validación va primero a los niveles
+locales (léxico, corrección ortográfica, clasificador) y luego al modelo
+rápido y barato; solo sube al modelo fuerte cuando el veredicto llega con
+poca confianza o cuando un jugador lo apela. Cada decisión y la latencia de
+cada nivel quedan anotadas para poder ajustar el umbral.
+"""
+import threading
+import time
+from collections import deque
+
+NIVELES_LOCALES = ("lexico", "ortografia", "clasificador")
+NIVELES_MODELO = ("rapido", "fuerte")
+
+
+class EnrutadorModelos:
+    """
+    `rapido` y `fuerte` son nombres de modelo de OpenAI. Si son el mismo no
+    se escala nunca. `moderacion` es el modelo del chat.
+    """
+
+    def __init__(self, rapido="gpt-4o-mini", fuerte="gpt-4o", umbral_escalado=0.75, moderacion="gpt-3.5-turbo"):
+        self.modelos = {"rapido": rapido, "fuerte": fuerte}
+        self.moderacion = moderacion
+        self.umbral_escalado = umbral_escalado
+        self._lock = threading.Lock()
+        self.decisiones = {
+            **{nivel: 0 for nivel in NIVELES_LOCALES},
+            "rapido": 0,
+            "escalada_confianza": 0,
+            "escalada_apelacion": 0,
+            "escalada_cambio_veredicto": 0,
+        }
+        self.niveles = {nivel: {"llamadas": 0, "errores": 0, "segundos": 0.0, "max_ms": 0.0}
+                        for nivel in NIVELES_MODELO}
+        self.ultimas = deque(maxlen=200)
+
+    def modelo(self, nivel):
+        return self.modelos[nivel]
+
+    def puede_escalar(self):
+        return self.modelos["fuerte"] != self.modelos["rapido"]
+
+    def debe_escalar(self, confianza):
+        """True si un veredicto del modelo rápido con esta confianza hay que confirmarlo con el fuerte"""
+        return self.puede_escalar() and confianza < self.umbral_escalado
+
+    def registrar_decision(self, decision, categoria="", respuesta="", confianza=None, cambio=False):
+        """`decision`: un nivel local, "rapido", "escalada_confianza" o "escalada_apelacion"""
+        with self._lock:
+            self.decisiones[decision] += 1
+            if cambio:
+                self.decisiones["escalada_cambio_veredicto"] += 1
+            self.ultimas.append({
+                "decision": decision, "categoria": categoria, "respuesta": respuesta[:40],
+                "confianza": round(confianza, 2) if confianza is not None else None,
+                "cambio": cambio, "hora": time.time(),
+            })
+
+    def registrar_llamada(self, nivel, segundos, error=False):
+        with self._lock:
+            datos = self.niveles[nivel]
+            datos["llamadas"] += 1
+            datos["errores"] += error
+            datos["segundos"] += segundos
+            datos["max_ms"] = round(max(datos["max_ms"], segundos * 1000), 1)
+
+    def estado(self):
+        with self._lock:
+            return {
+                "modelos": dict(self.modelos),
+                "moderacion": self.moderacion,
+                "umbral_escalado": self.umbral_escalado,
+                "decisiones": dict(self.decisiones),
+                "niveles": {
+                    nivel: {**datos, "segundos": round(datos["segundos"], 2),
+                            "latencia_media_ms": round(datos["segundos"] * 1000 / datos["llamadas"], 1)
+                            if datos["llamadas"] else 0.0}
+                    for nivel, datos in self.niveles.items()
+                },
+                "ultimas": list(self.ultimas)[-20:],
+            }
@@ -0,0 +1,281 @@
+"""
+Instantánea local de las salas en memoria, para arrancar sin esperar a la BD.
+
+El archivo se escribe de forma atómica (archivo temporal + os.replace) y se
+lee con mmap. Formato (little-endian):
+    cabecera  "<4sHId"  magia b"BSNP", versión, número de salas, instante de escritura
+    índice    "<10sQI"  por sala: código (ASCII, relleno con \\0), offset, longitud
+    datos     el JSON compacto de cada sala, uno tras otro
+Al arrancar solo se lee el índice: las salas se sirven desde el archivo bajo
+demanda mientras en segundo plano se reconcilian con el almacén, que es la
+fuente de verdad compartida entre instancias.
+"""
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+
+from persistencia import a_nativo
+
+MAGIA = b"BSNP"
+VERSION = 1
+_CABECERA = struct.Struct("<4sHId")
+_ENTRADA = struct.Struct("<10sQI")
+
+
+def escribir_instantanea(ruta, documentos, creada=None):
+    """Escribe {codigo: bytes JSON} en `ruta` de forma atómica. Devuelve los bytes escritos"""
+    documentos = {c: d for c, d in documentos.items() if len(c.encode("ascii", "ignore")) <= 10}
+    offset = _CABECERA.size + _ENTRADA.size * len(documentos)
+    indice = []
+    for codigo, datos in documentos.items():
+        indice.append(_ENTRADA.pack(codigo.encode("ascii", "ignore"), offset, len(datos)))
+        offset += len(datos)
+    temporal = ruta + ".tmp"
+    with open(temporal, "wb") as f:
+        f.write(_CABECERA.pack(MAGIA, VERSION, len(documentos), creada or time.time()))
+        f.write(b"".join(indice))
+        for datos in documentos.values():
+            f.write(datos)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporal, ruta)
+    return offset
+
+
+def abrir_instantanea(ruta):
+    """
+    Mapea el archivo en memoria y lee solo la cabecera y el índice.
+    Devuelve (mapa, instante, {codigo: (offset, longitud)}), o None si no
+    existe o no es válido.
+    """
+    try:
+        with open(ruta, "rb") as f:
+            mapa = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Instantánea {ruta} ilegible ({e}), se ignora")
+        return None
+    try:
+        magia, version, num_salas, creada = _CABECERA.unpack_from(mapa, 0)
+        if magia != MAGIA or version != VERSION:
+            raise ValueError("formato desconocido")
+        indice = {}
+        for i in range(num_salas):
+            codigo, offset, longitud = _ENTRADA.unpack_from(mapa, _CABECERA.size + i * _ENTRADA.size)
+            if offset + longitud > len(mapa):
+                raise ValueError("archivo truncado")
+            indice[codigo.rstrip(b"\0").decode("ascii")] = (offset, longitud)
+        return mapa, creada, indice
+    except (ValueError, struct.error) as e:
+        mapa.close()
+        print(f"⚠️ Instantánea {ruta} ilegible ({e}), se ignora")
+        return None
+
+
+class _Recolector(dict):
+    """Recibe las salas de almacen.precargar sin envolverlas (solo para comparar)"""
+
+    def cargar(self, codigo, datos):
+        self[codigo] = datos
+
+
+_SOLO_INSTANTANEA = object()  # Sala que está en la instantánea pero no en la BD
+
+
+class InstantaneaSalas:
+    """
+    Mantiene el archivo de instantánea al día: cada `intervalo` segundos, si
+    hubo cambios, vuelve a serializar solo las salas modificadas (el resto se
+    reutiliza de la escritura anterior) y reescribe el archivo. Al arrancar no
+    se usa una instantánea de más de `edad_max` segundos.
+    """
+
+    def __init__(self, ruta, obtener_salas, almacen, intervalo=15, edad_max=900):
+        self.ruta = ruta
+        self.obtener_salas = obtener_salas
+        self.almacen = almacen
+        self.intervalo = intervalo
+        self.edad_max = edad_max
+        self._documentos = {}  # {codigo: JSON ya serializado}
+        self._mapa = None  # Archivo mapeado mientras se sirven salas desde él
+        self._indice = {}  # {codigo: (offset, longitud)} del archivo mapeado
+        self._creada = 0.0  # Instante en que se escribió el archivo mapeado
+        self._lock = threading.Lock()
+        self._hilo = None
+        self.metricas = {
+            "escrituras": 0,
+            "salas_serializadas": 0,
+            "ultima_escritura_ms": 0.0,
+            "ultimo_tamano_bytes": 0,
+            "salas_cargadas": 0,
+            "carga_ms": 0.0,
+            "reconciliadas": 0,
+            "reconciliacion_ms": 0.0,
+            "descartadas_por_edad": 0,
+            "conflictos_bd": 0,
+            "finalizadas_sin_bd": 0,
+            "errores": 0,
+        }
+
+    def iniciar(self):
+        if self._hilo is None:
+            self._hilo = threading.Thread(target=self._bucle, daemon=True)
+            self._hilo.start()
+
+    def _bucle(self):
+        while True:
+            time.sleep(self.intervalo)
+            self.escribir()
+
+    def cargar(self):
+        """
+        Abre el archivo para servir salas desde él (ver datos). Solo lee el
+        índice, así que tarda lo mismo con 10 que con 10.000 salas.
+        Devuelve cuántas salas contiene, o None si no hay instantánea.
+        """
+        inicio = time.perf_counter()
+        abierta = abrir_instantanea(self.ruta)
+        if abierta is None:
+            return None
+        self.cerrar()
+        mapa, creada, indice = abierta
+        edad = time.time() - creada
+        if self.edad_max and edad > self.edad_max:
+            # Demasiado vieja: otra instancia pudo cambiar o borrar muchas de sus salas
+            mapa.close()
+            self.metricas["descartadas_por_edad"] += 1
+            print(f"⚠️ Instantánea local de hace {edad:.0f} s (máximo {self.edad_max} s), se arranca desde la BD")
+            return None
+        self._mapa, self._creada, self._indice = mapa, creada, indice
+        self.metricas["salas_cargadas"] = len(self._indice)
+        self.metricas["carga_ms"] = round((time.perf_counter() - inicio) * 1000, 2)
+        print(f"⚡ Instantánea local con {len(self._indice)} salas ({edad:.0f} s de antigüedad) "
+              f"abierta en {self.metricas['carga_ms']:.1f} ms")
+        return len(self._indice)
+
+    def datos(self, codigo):
+        """Sala guardada en la instantánea (mientras no se haya reconciliado), o None"""
+        posicion = self._indice.get(codigo)
+        if posicion is None or self._mapa is None:
+            return None
+        offset, longitud = posicion
+        return json.loads(self._mapa[offset:offset + longitud])
+
+    def cerrar(self):
+        self._indice = {}
+        if self._mapa is not None:
+            self._mapa.close()
+            self._mapa = None
+
+    def reconciliar(self, salas, modo="activas", lote=100):
+        """
+        Deja en memoria lo mismo que una precarga desde el almacén: las salas
+        de `modo` en su versión de la BD, más las no finalizadas de la
+        instantánea que la BD no tiene (que se marcan para guardarlas).
+        Las salas modificadas aquí desde el arranque se quedan como están salvo
+        si se sirvieron desde la instantánea y la BD se escribió después de
+        crearse el archivo: la copia local partía de datos viejos y gana la BD.
+        """
+        inicio = time.perf_counter()
+        salas.seguir_cambios()
+        try:
+            desde_bd = _Recolector()
+            self.almacen.precargar(desde_bd, modo)
+            for codigo in self._indice.keys() - desde_bd.keys():
+                datos = self.almacen.cargar_sala(codigo)
+                desde_bd[codigo] = datos if datos is not None else _SOLO_INSTANTANEA
+            actualizadas = self.almacen.actualizaciones(self._indice.keys() & desde_bd.keys())
+        except Exception as e:
+            salas.dejar_de_seguir()
+            print(f"Error reconciliando la instantánea con la BD: {e}")
+            self.metricas["errores"] += 1
+            return 0
+        reconciliadas = 0
+        codigos = list(desde_bd)
+        for i in range(0, len(codigos), lote):
+            # Un lote sin E/S de por medio, y se cede el turno entre lotes
+            modificadas = salas.cambios_seguidos()
+            for codigo in codigos[i:i + lote]:
+                datos = desde_bd[codigo]
+                if codigo in modificadas:
+                    if datos is _SOLO_INSTANTANEA or actualizadas.get(codigo, 0.0) <= self._creada:
+                        continue  # La BD no cambió desde la instantánea: vale la versión local
+                    print(f"⚠️ Sala {codigo} cambiada aquí y en la BD después de la instantánea: gana la BD")
+                    salas.cargar(codigo, datos)
+                    salas.reescribir_entera(codigo)  # Sus rutas pendientes eran sobre la copia vieja
+                    self.metricas["conflictos_bd"] += 1
+                    reconciliadas += 1
+                    continue
+                if datos is _SOLO_INSTANTANEA:
+                    en_memoria = salas.cargadas(codigo)
+                    datos = dict.__getitem__(salas, codigo) if en_memoria else self.datos(codigo)
+                    if datos is None or datos.get("finalizada", False):
+                        # Terminada y ya no está en la BD (otra instancia la archivó o borró): no se resucita
+                        self.metricas["finalizadas_sin_bd"] += 1
+                        continue
+                    if not en_memoria:
+                        salas.cargar(codigo, datos)
+                    salas.marcar(codigo)
+                    continue
+                if salas.cargadas(codigo) and a_nativo(dict.__getitem__(salas, codigo)) == datos:
+                    continue
+                salas.cargar(codigo, datos)
+                if salas.cambiadas is not None:
+                    salas.cambiadas.add(codigo)
+                reconciliadas += 1
+            time.sleep(0)
+        salas.dejar_de_seguir()
+        self.cerrar()  # A partir de aquí las salas que falten se hidratan desde la BD
+        self.metricas["reconciliadas"] += reconciliadas
+        self.metricas["reconciliacion_ms"] = round((time.perf_counter() - inicio) * 1000, 2)
+        print(f"🔁 Instantánea reconciliada con {self.almacen.nombre}: {len(salas)} salas en memoria, "
+              f"{reconciliadas} actualizadas desde la BD en {self.metricas['reconciliacion_ms']:.0f} ms")
+        return reconciliadas
+
+    def reconciliar_en_segundo_plano(self, salas, modo="activas"):
+        threading.Thread(target=self.reconciliar, args=(salas, modo), daemon=True).start()
+
+    def escribir(self):
+        """Reescribe el archivo si alguna sala cambió desde la última vez"""
+        if self._mapa is not None:
+            return  # Hasta reconciliar, la memoria no tiene todas las salas del archivo
+        salas = self.obtener_salas()
+        with self._lock:
+            if salas.cambiadas is None:
+                salas.cambiadas = set()
+            cambiadas, salas.cambiadas = salas.cambiadas, set()
+            cargadas = set(dict.keys(salas))
+            nuevas = cargadas - self._documentos.keys()
+            eliminadas = self._documentos.keys() - cargadas
+            if not cambiadas and not nuevas and not eliminadas and self.metricas["escrituras"]:
+                return
+            inicio = time.perf_counter()
+            for codigo in eliminadas:
+                del self._documentos[codigo]
+            serializar = (cambiadas & cargadas) | nuevas
+            for codigo in serializar:
+                self._documentos[codigo] = json.dumps(dict.__getitem__(salas, codigo),
+                                                      separators=(",", ":")).encode("utf-8")
+            try:
+                tamano = escribir_instantanea(self.ruta, self._documentos)
+            except OSError as e:
+                print(f"Error escribiendo la instantánea {self.ruta}: {e}")
+                salas.cambiadas |= cambiadas
+                self.metricas["errores"] += 1
+                return
+            self.metricas["escrituras"] += 1
+            self.metricas["salas_serializadas"] += len(serializar)
+            self.metricas["ultima_escritura_ms"] = round((time.perf_counter() - inicio) * 1000, 2)
+            self.metricas["ultimo_tamano_bytes"] = tamano
+
+    def estado(self):
+        return {
+            **self.metricas,
+            "ruta": self.ruta,
+            "intervalo_s": self.intervalo,
+            "salas_en_archivo": len(self._documentos),
+        }
@@ -0,0 +1,251 @@
+"""
+Léxico local por categoría: listas de palabras conocidas (data/lexico/*.txt)
+cargadas en un trie compacto, para dar por válida una respuesta sin llamar a
+la IA. Solo responde "conocida" o "no sé": lo que no está en el léxico sigue
+su camino normal (caché, tabla de validaciones, IA).
+
+El trie se minimiza (los sufijos iguales se comparten, como en un DAWG) y se
+guarda en arrays planos en lugar de un dict por nodo. Para las respuestas mal
+escritas hay además un índice de borrados simétricos (como SymSpell) que
+encuentra la entrada conocida más parecida y a qué distancia está.
+"""
+import os
+import re
+import unicodedata
+from array import array
+
+_NO_ALFANUMERICO = re.compile(r"[^a-z0-9]+")
+
+
+def normalizar_lexico(texto):
+    """
+    Como la clave de la caché de validaciones (sin acentos ni diéresis ni
+    tilde de la ñ, minúsculas) y además sin signos: 'Guinea-Bisáu' → 'guinea bisau'
+    """
+    texto = unicodedata.normalize("NFD", texto.lower())
+    texto = "".join(c for c in texto if unicodedata.category(c) != "Mn")
+    return _NO_ALFANUMERICO.sub(" ", texto).strip()
+
+
+def nombre_archivo_categoria(categoria):
+    """'País o Ciudad' → 'pais_o_ciudad' (nombre del .txt en data/lexico)"""
+    return normalizar_lexico(categoria).replace(" ", "_")
+
+
+class TrieCompacto:
+    """
+    Conjunto de cadenas de solo lectura. Nodo i: sus aristas son las
+    posiciones inicio[i]..inicio[i+1] de `etiquetas` (un carácter cada una,
+    ordenadas) y `destinos` (el nodo al que llevan); final[i] marca fin de
+    palabra.
+    """
+
+    def __init__(self, palabras):
+        raiz = {}
+        total = 0
+        for palabra in sorted(set(palabras)):
+            if not palabra:
+                continue
+            nodo = raiz
+            for caracter in palabra:
+                nodo = nodo.setdefault(caracter, {})
+            nodo[""] = True
+            total += 1
+        self.palabras = total
+
+        # Minimizar: nodos con el mismo final y las mismas aristas se fusionan
+        firmas = []
+        raiz_id = self._registrar(raiz, {}, firmas)
+        # Renumerar con la raíz en 0
+        orden = [raiz_id] + [i for i in range(len(firmas)) if i != raiz_id]
+        nuevo = {viejo: i for i, viejo in enumerate(orden)}
+        self.inicio = array("I", [0])
+        self.destinos = array("I")
+        self.final = bytearray(len(firmas))
+        etiquetas = []
+        for i, viejo in enumerate(orden):
+            es_final, aristas = firmas[viejo]
+            self.final[i] = es_final
+            for caracter, hijo in aristas:
+                etiquetas.append(caracter)
+                self.destinos.append(nuevo[hijo])
+            self.inicio.append(len(self.destinos))
+        self.etiquetas = "".join(etiquetas)
+
+    @classmethod
+    def _registrar(cls, nodo, registro, firmas):
+        """Id del nodo minimizado equivalente a `nodo` (registro: {firma: id})"""
+        aristas = tuple((c, cls._registrar(hijo, registro, firmas)) for c, hijo in sorted(nodo.items()) if c)
+        firma = ("" in nodo, aristas)
+        if firma not in registro:
+            registro[firma] = len(firmas)
+            firmas.append(firma)
+        return registro[firma]
+
+    def __len__(self):
+        return self.palabras
+
+    def _nodo(self, texto):
+        buscar, inicio, destinos = self.etiquetas.find, self.inicio, self.destinos
+        nodo = 0
+        for caracter in texto:
+            posicion = buscar(caracter, inicio[nodo], inicio[nodo + 1])
+            if posicion < 0:
+                return None
+            nodo = destinos[posicion]
+        return nodo
+
+    def __contains__(self, texto):
+        nodo = self._nodo(texto)
+        return nodo is not None and bool(self.final[nodo])
+
+    def con_prefijo(self, prefijo=""):
+        """Todas las palabras que empiezan por `prefijo`, en orden"""
+        nodo = self._nodo(prefijo)
+        if nodo is None:
+            return
+        pila = [(nodo, prefijo)]
+        while pila:
+            nodo, texto = pila.pop()
+            if self.final[nodo]:
+                yield texto
+            for posicion in range(self.inicio[nodo + 1] - 1, self.inicio[nodo] - 1, -1):
+                pila.append((self.destinos[posicion], texto + self.etiquetas[posicion]))
+
+    def bytes_aprox(self):
+        return (self.inicio.itemsize * len(self.inicio) + self.destinos.itemsize * len(self.destinos)
+                + len(self.final) + len(self.etiquetas.encode("utf-8")))
+
+    def nodos(self):
+        return len(self.final)
+
+
+def distancia_edicion(a, b, maximo):
+    """
+    Distancia de Damerau-Levenshtein restringida (una transposición de letras
+    contiguas cuenta 1) entre `a` y `b`, o maximo + 1 si es mayor que `maximo`
+    """
+    if abs(len(a) - len(b)) > maximo:
+        return maximo + 1
+    anterior2 = None
+    anterior = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        actual = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            coste = 0 if a[i - 1] == b[j - 1] else 1
+            actual[j] = min(anterior[j] + 1, actual[j - 1] + 1, anterior[j - 1] + coste)
+            if anterior2 is not None and i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                actual[j] = min(actual[j], anterior2[j - 2] + 1)
+        if min(actual) > maximo:
+            return maximo + 1
+        anterior2, anterior = anterior, actual
+    return anterior[-1] if anterior[-1] <= maximo else maximo + 1
+
+
+class IndiceSymSpell:
+    """
+    Índice de borrados simétricos: cada palabra se guarda bajo todas las
+    cadenas que resultan de quitarle hasta `distancia_max` letras. Una
+    consulta genera los borrados de la respuesta, reúne las palabras que
+    comparten alguno y se queda con la de menor distancia real.
+    """
+
+    def __init__(self, palabras, distancia_max=2):
+        self.distancia_max = distancia_max
+        self.borrados = {}  # {borrado: palabra, o tupla de palabras si hay varias}
+        for palabra in palabras:
+            for borrado in self._borrados(palabra, distancia_max):
+                previo = self.borrados.get(borrado)
+                if previo is None:
+                    self.borrados[borrado] = palabra
+                elif isinstance(previo, tuple):
+                    self.borrados[borrado] = previo + (palabra,)
+                else:
+                    self.borrados[borrado] = (previo, palabra)
+
+    @staticmethod
+    def _borrados(palabra, distancia):
+        resultado = {palabra}
+        frontera = {palabra}
+        for _ in range(distancia):
+            frontera = {texto[:i] + texto[i + 1:] for texto in frontera for i in range(len(texto))} - resultado
+            resultado |= frontera
+        return resultado
+
+    def sugerir(self, texto, distancia_max=None):
+        """(palabra conocida más cercana, distancia) o None si no hay ninguna a distancia_max o menos"""
+        maximo = self.distancia_max if distancia_max is None else min(distancia_max, self.distancia_max)
+        candidatas = set()
+        for borrado in self._borrados(texto, maximo):
+            encontradas = self.borrados.get(borrado)
+            if encontradas is None:
+                continue
+            if isinstance(encontradas, tuple):
+                candidatas.update(encontradas)
+            else:
+                candidatas.add(encontradas)
+        mejor = None
+        for candidata in sorted(candidatas):
+            distancia = distancia_edicion(texto, candidata, maximo)
+            if distancia <= maximo and (mejor is None or distancia < mejor[1]):
+                mejor = (candidata, distancia)
+        return mejor
+
+
+class LexicoCategorias:
+    """
+    Un TrieCompacto por categoría, leído de `directorio`/<categoria>.txt (una
+    entrada por línea, '#' para comentarios). Las categorías sin archivo no
+    tienen léxico y siempre responden "no sé".
+    """
+
+    def __init__(self, directorio):
+        self.directorio = directorio
+        self.tries = {}
+        self.correctores = {}  # {categoria: IndiceSymSpell}, se crean al primer uso
+        self.metricas = {"consultas": 0, "aciertos": 0, "sugerencias_buscadas": 0, "sugerencias": 0}
+        if not os.path.isdir(directorio):
+            return
+        for archivo in sorted(os.listdir(directorio)):
+            if not archivo.endswith(".txt"):
+                continue
+            with open(os.path.join(directorio, archivo), encoding="utf-8") as f:
+                palabras = [normalizar_lexico(linea.split("#", 1)[0]) for linea in f]
+            self.tries[archivo[:-4]] = TrieCompacto(palabras)
+
+    def trie(self, categoria):
+        return self.tries.get(nombre_archivo_categoria(categoria))
+
+    def contiene(self, categoria, respuesta):
+        """True si `respuesta` es una entrada conocida de `categoria`"""
+        trie = self.trie(categoria)
+        if trie is None:
+            return False
+        self.metricas["consultas"] += 1
+        if normalizar_lexico(respuesta) in trie:
+            self.metricas["aciertos"] += 1
+            return True
+        return False
+
+    def sugerencia(self, categoria, respuesta):
+        """(entrada conocida más parecida, distancia) para una respuesta que no está en el léxico, o None"""
+        nombre = nombre_archivo_categoria(categoria)
+        trie = self.tries.get(nombre)
+        if trie is None:
+            return None
+        if nombre not in self.correctores:
+            self.correctores[nombre] = IndiceSymSpell(trie.con_prefijo())
+        self.metricas["sugerencias_buscadas"] += 1
+        encontrada = self.correctores[nombre].sugerir(normalizar_lexico(respuesta))
+        if encontrada and encontrada[1] > 0:
+            self.metricas["sugerencias"] += 1
+            return encontrada
+        return None
+
+    def estado(self):
+        return {
+            **self.metricas,
+            "categorias": {nombre: len(trie) for nombre, trie in self.tries.items()},
+            "nodos": sum(trie.nodos() for trie in self.tries.values()),
+            "kb": round(sum(trie.bytes_aprox() for trie in self.tries.values()) / 1024, 1),
+        }
@@ -0,0 +1,1091 @@
+"""
+Persistencia de salas: seguimiento de cambios sobre los dicts de sala para que
+cada guardado escriba en la BD solo las salas (y las claves) que se modificaron,
+un escritor en segundo plano que agrupa esas escrituras y un archivador que
+saca de memoria y de la tabla caliente las salas finalizadas. También guarda
+los veredictos de validación que sobreviven a las salas (tabla validaciones).
+"""
+import json
+import threading
+import time
+
+from sqlalchemy import text
+
+import database
+from database import db, SalaDB, SalaEstadoDB, SalaArchivadaDB, SalaEventoDB, ValidacionDB
+
+
+# ==========================================================
+# SEGUIMIENTO DE CAMBIOS (DIRTY TRACKING)
+# ==========================================================
+class _Marcador:
+    """
+    Avisa al registro de salas que la sala `codigo` fue modificada y en qué
+    ruta. Las rutas llegan hasta dos niveles (clave de la sala y clave del dict
+    que cuelga de ella); todo lo que está más abajo, o dentro de una lista, se
+    registra como un cambio del contenedor de esa profundidad. Solo el
+    marcador `propio` (cuya ruta es la del contenedor mismo) puede anotar
+    anexos; los heredados por contenedores más profundos marcan la ruta entera.
+    """
+    __slots__ = ("registro", "codigo", "ruta", "fija", "propio", "_hijos", "_fijo")
+
+    PROFUNDIDAD = 2
+
+    def __init__(self, registro, codigo, ruta=(), fija=False, propio=True):
+        self.registro = registro
+        self.codigo = codigo
+        self.ruta = ruta
+        self.fija = fija or len(ruta) >= self.PROFUNDIDAD
+        self.propio = propio
+        self._hijos = None
+        self._fijo = None
+
+    def hijo(self, clave):
+        """Marcador para los contenedores guardados bajo `clave`"""
+        if self.fija:
+            return self.fijo()
+        if self._hijos is None:
+            self._hijos = {}
+        marcador = self._hijos.get(clave)
+        if marcador is None:
+            marcador = self._hijos[clave] = _Marcador(self.registro, self.codigo, self.ruta + (clave,))
+        return marcador
+
+    def fijo(self):
+        """Marcador para los elementos de una lista: cualquier cambio es de la lista entera"""
+        if not self.propio:
+            return self
+        if self._fijo is None:
+            self._fijo = _Marcador(self.registro, self.codigo, self.ruta, fija=True, propio=False)
+        return self._fijo
+
+    def __call__(self, clave=None):
+        if clave is None or self.fija:
+            self.registro.marcar(self.codigo, self.ruta)
+        else:
+            self.registro.marcar(self.codigo, self.ruta + (clave,))
+
+    def anexo(self, inicio):
+        """Se añadieron elementos al final de la lista de esta ruta, desde `inicio`"""
+        # Una lista más profunda que la ruta: el anexo no es de esta ruta, se reescribe entera
+        self.registro.marcar(self.codigo, self.ruta, inicio if self.propio else None)
+
+
+def _envolver(valor, marcar):
+    """Convierte dicts/listas anidados en contenedores rastreados de la sala"""
+    if isinstance(valor, DictRastreado):
+        return valor if valor._marcar is marcar else DictRastreado(valor, marcar)
+    if isinstance(valor, ListaRastreada):
+        return valor if valor._marcar is marcar else ListaRastreada(valor, marcar)
+    if isinstance(valor, dict):
+        return DictRastreado(valor, marcar)
+    if isinstance(valor, list):
+        return ListaRastreada(valor, marcar)
+    return valor
+
+
+def a_nativo(valor):
+    """Copia profunda de una sala rastreada a dicts/listas normales"""
+    if isinstance(valor, dict):
+        return {k: a_nativo(v) for k, v in valor.items()}
+    if isinstance(valor, list):
+        return [a_nativo(v) for v in valor]
+    return valor
+
+
+class DictRastreado(dict):
+    """dict que marca su sala como modificada ante cualquier escritura"""
+    __slots__ = ("_marcar",)
+
+    def __init__(self, datos, marcar):
+        dict.__init__(self)
+        self._marcar = marcar
+        for clave, valor in datos.items():
+            dict.__setitem__(self, clave, _envolver(valor, marcar.hijo(clave)))
+
+    def __setitem__(self, clave, valor):
+        dict.__setitem__(self, clave, _envolver(valor, self._marcar.hijo(clave)))
+        self._marcar(clave)
+
+    def __delitem__(self, clave):
+        dict.__delitem__(self, clave)
+        self._marcar(clave)
+
+    def __ior__(self, otro):
+        self.update(otro)
+        return self
+
+    def __copy__(self):
+        return dict(self)
+
+    def __deepcopy__(self, memo):
+        return a_nativo(self)
+
+    def update(self, *args, **kwargs):
+        for clave, valor in dict(*args, **kwargs).items():
+            self[clave] = valor
+
+    def setdefault(self, clave, valor=None):
+        if clave not in self:
+            self[clave] = valor
+        return dict.__getitem__(self, clave)
+
+    def pop(self, clave, *default):
+        existia = clave in self
+        valor = dict.pop(self, clave, *default)
+        if existia:
+            self._marcar(clave)
+        return valor
+
+    def popitem(self):
+        item = dict.popitem(self)
+        self._marcar()
+        return item
+
+    def clear(self):
+        dict.clear(self)
+        self._marcar()
+
+
+class ListaRastreada(list):
+    """list que marca su sala como modificada ante cualquier escritura"""
+    __slots__ = ("_marcar",)
+
+    def __init__(self, datos, marcar):
+        elementos = marcar.fijo()
+        list.__init__(self, (_envolver(v, elementos) for v in datos))
+        self._marcar = marcar
+
+    def __setitem__(self, indice, valor):
+        if isinstance(indice, slice):
+            valor = [_envolver(v, self._marcar.fijo()) for v in valor]
+        else:
+            valor = _envolver(valor, self._marcar.fijo())
+        list.__setitem__(self, indice, valor)
+        self._marcar()
+
+    def __delitem__(self, indice):
+        list.__delitem__(self, indice)
+        self._marcar()
+
+    def __iadd__(self, otro):
+        self.extend(otro)
+        return self
+
+    def __imul__(self, n):
+        list.__imul__(self, n)
+        self._marcar()
+        return self
+
+    def __copy__(self):
+        return list(self)
+
+    def __deepcopy__(self, memo):
+        return a_nativo(self)
+
+    def append(self, valor):
+        list.append(self, _envolver(valor, self._marcar.fijo()))
+        self._marcar.anexo(len(self) - 1)
+
+    def extend(self, valores):
+        inicio = len(self)
+        list.extend(self, [_envolver(v, self._marcar.fijo()) for v in valores])
+        self._marcar.anexo(inicio)
+
+    def insert(self, indice, valor):
+        list.insert(self, indice, _envolver(valor, self._marcar.fijo()))
+        self._marcar()
+
+    def remove(self, valor):
+        list.remove(self, valor)
+        self._marcar()
+
+    def pop(self, *indice):
+        valor = list.pop(self, *indice)
+        self._marcar()
+        return valor
+
+    def clear(self):
+        list.clear(self)
+        self._marcar()
+
+    def sort(self, *args, **kwargs):
+        list.sort(self, *args, **kwargs)
+        self._marcar()
+
+    def reverse(self):
+        list.reverse(self)
+        self._marcar()
+
+
+class SalasRastreadas(dict):
+    """
+    Diccionario codigo -> sala que recuerda qué salas cambiaron desde el
+    último guardado. Cualquier escritura dentro de una sala (aunque sea en
+    una lista o dict anidado) la marca como sucia.
+
+    Con un `cargador`, las salas que no están en memoria se hidratan desde la
+    BD la primera vez que se consultan (get, [] o `in`). Iterar solo recorre
+    las salas ya cargadas.
+
+    Con `rutas` además se anotan las rutas modificadas (hasta dos niveles) y
+    los anexos al final de listas, que el registro de eventos convierte en
+    operaciones compactas.
+    """
+    AUSENCIA_TTL = 5.0  # Segundos que se recuerda que un código no existe en la BD
+
+    def __init__(self, salas=None, cargador=None, rutas=False):
+        dict.__init__(self)
+        self.cargador = cargador
+        self.rutas = rutas
+        self._ausentes = {}  # {codigo: instante hasta el que no se vuelve a consultar}
+        # {codigo: [instante de la primera modificación sin guardar,
+        #           claves de primer nivel modificadas o None si hay que reescribirla entera,
+        #           árbol de rutas modificadas (solo con `rutas`, ver _anotar_ruta)]}
+        self._sucias = {}
+        self.marcas_coalescidas = 0  # Escrituras absorbidas por una sala ya sucia
+        self.tamanos = {}  # Tamaño aproximado del documento JSON guardado de cada sala
+        self.eventos = {}  # Eventos registrados desde el último snapshot de cada sala
+        self.cambiadas = None  # set de salas modificadas para la instantánea local (si se usa)
+        self._seguidas = None  # Salas guardadas mientras se sigue la pista de cambios
+        for codigo, datos in (salas or {}).items():
+            self.cargar(codigo, datos)
+
+    def _envolver_sala(self, codigo, datos):
+        return DictRastreado(datos, _Marcador(self, codigo))
+
+    def cargar(self, codigo, datos):
+        """Inserta una sala leída de la BD sin marcarla como modificada"""
+        self._ausentes.pop(codigo, None)
+        dict.__setitem__(self, codigo, self._envolver_sala(codigo, datos))
+        return dict.__getitem__(self, codigo)
+
+    def _hidratar(self, codigo):
+        """Carga bajo demanda una sala que no está en memoria"""
+        if self.cargador is None or not isinstance(codigo, str) or not codigo:
+            return None
+        ahora = time.monotonic()
+        if self._ausentes.get(codigo, 0) > ahora:
+            return None
+        datos = self.cargador(codigo)
+        if dict.__contains__(self, codigo):
+            # Otro greenlet la cargó (o la creó) mientras se consultaba la BD
+            return dict.__getitem__(self, codigo)
+        if datos is None:
+            if len(self._ausentes) > 10000:
+                self._ausentes = {c: t for c, t in self._ausentes.items() if t > ahora}
+            self._ausentes[codigo] = ahora + self.AUSENCIA_TTL
+            return None
+        return self.cargar(codigo, datos)
+
+    def get(self, codigo, default=None):
+        if dict.__contains__(self, codigo):
+            return dict.__getitem__(self, codigo)
+        sala = self._hidratar(codigo)
+        return default if sala is None else sala
+
+    def __missing__(self, codigo):
+        sala = self._hidratar(codigo)
+        if sala is None:
+            raise KeyError(codigo)
+        return sala
+
+    def __contains__(self, codigo):
+        return dict.__contains__(self, codigo) or self._hidratar(codigo) is not None
+
+    def __setitem__(self, codigo, datos):
+        self._ausentes.pop(codigo, None)
+        dict.__setitem__(self, codigo, self._envolver_sala(codigo, datos))
+        self.marcar(codigo)
+
+    def __delitem__(self, codigo):
+        dict.__delitem__(self, codigo)
+        self._sucias.pop(codigo, None)
+        self.tamanos.pop(codigo, None)
+        self.eventos.pop(codigo, None)
+
+    def pop(self, codigo, *default):
+        self._sucias.pop(codigo, None)
+        self.tamanos.pop(codigo, None)
+        self.eventos.pop(codigo, None)
+        return dict.pop(self, codigo, *default)
+
+    def desalojar(self, codigo):
+        """Saca de memoria una sala ya guardada; se volverá a hidratar si se consulta"""
+        self.tamanos.pop(codigo, None)
+        self.eventos.pop(codigo, None)
+        return dict.pop(self, codigo, None)
+
+    def setdefault(self, codigo, datos=None):
+        if codigo not in self:
+            self[codigo] = datos if datos is not None else {}
+        return dict.__getitem__(self, codigo)
+
+    def update(self, *args, **kwargs):
+        for codigo, datos in dict(*args, **kwargs).items():
+            self[codigo] = datos
+
+    def cargadas(self, codigo):
+        """¿Está la sala en memoria? (sin consultar la BD)"""
+        return dict.__contains__(self, codigo)
+
+    def marcar(self, codigo, ruta=(), inicio=None):
+        """
+        Marca una sala como modificada en `ruta` (sin ruta se reescribirá
+        entera). `inicio` indica que solo se añadieron elementos al final de la
+        lista de esa ruta a partir de ese índice.
+        """
+        if self.cambiadas is not None:
+            self.cambiadas.add(codigo)
+        pendiente = self._sucias.get(codigo)
+        if pendiente is None:
+            if not ruta:
+                self._sucias[codigo] = [time.monotonic(), None, None]
+                return
+            arbol = {} if self.rutas else None
+            self._sucias[codigo] = pendiente = [time.monotonic(), {ruta[0]}, arbol]
+        else:
+            self.marcas_coalescidas += 1
+            if pendiente[1] is None:
+                return
+            if not ruta:
+                pendiente[1] = pendiente[2] = None
+                return
+            pendiente[1].add(ruta[0])
+        if pendiente[2] is not None:
+            _anotar_ruta(pendiente[2], ruta, inicio)
+
+    def tomar_sucias(self):
+        """Devuelve y limpia las salas pendientes ({codigo: [instante, claves, rutas]})"""
+        sucias, self._sucias = self._sucias, {}
+        if self._seguidas is not None:
+            self._seguidas.update(sucias)
+        return sucias
+
+    def seguir_cambios(self):
+        """Empieza a anotar qué salas se modifican (ver cambios_seguidos)"""
+        self._seguidas = set()
+
+    def cambios_seguidos(self):
+        """Salas modificadas desde seguir_cambios(), guardadas o no"""
+        return (self._seguidas or set()) | set(self._sucias)
+
+    def dejar_de_seguir(self):
+        self._seguidas = None
+
+    def reescribir_entera(self, codigo):
+        """Si la sala tiene cambios pendientes, se guardará entera en vez de por rutas"""
+        pendiente = self._sucias.get(codigo)
+        if pendiente is not None:
+            pendiente[1] = pendiente[2] = None
+
+    def restaurar(self, pendientes):
+        """Devuelve a la cola salas cuyo guardado falló, conservando su antigüedad"""
+        for codigo, pendiente in pendientes.items():
+            instante, claves = pendiente[0], pendiente[1]
+            arbol = pendiente[2] if len(pendiente) > 2 else None
+            actual = self._sucias.get(codigo)
+            if actual is None:
+                self._sucias[codigo] = [instante, claves, arbol]
+                continue
+            actual[0] = min(actual[0], instante)
+            if actual[1] is None or claves is None:
+                actual[1] = actual[2] = None
+                continue
+            actual[1] = actual[1] | claves
+            if actual[2] is None or arbol is None:
+                actual[2] = None
+            else:
+                for clave, cambio in arbol.items():
+                    if isinstance(cambio, dict):
+                        for subclave, subcambio in cambio.items():
+                            _anotar_ruta(actual[2], (clave, subclave), subcambio)
+                    else:
+                        _anotar_ruta(actual[2], (clave,), cambio)
+
+    def antiguedad_pendiente(self):
+        """Segundos que lleva sin guardarse la modificación más antigua"""
+        if not self._sucias:
+            return 0.0
+        return time.monotonic() - min(p[0] for p in self._sucias.values())
+
+    @property
+    def sucias(self):
+        return frozenset(self._sucias)
+
+    @property
+    def num_sucias(self):
+        return len(self._sucias)
+
+
+def _anotar_ruta(arbol, ruta, inicio=None):
+    """
+    Acumula un cambio en el árbol de rutas de una sala:
+    {clave: None (reescribir el valor) | int (anexos desde ese índice)
+            | {subclave: None | int}}
+    Reescribir un valor absorbe los cambios anotados debajo de él.
+    """
+    clave = ruta[0]
+    actual = arbol.get(clave, _FALTA)
+    if len(ruta) == 1:
+        if inicio is None or isinstance(actual, dict):
+            arbol[clave] = None
+        elif actual is _FALTA:
+            arbol[clave] = inicio
+        elif actual is not None:
+            arbol[clave] = min(actual, inicio)
+        return
+    if actual is None:
+        return
+    if actual is _FALTA:
+        arbol[clave] = {ruta[1]: inicio}
+    elif not isinstance(actual, dict):
+        arbol[clave] = None  # Era una lista con anexos y ahora se escribe dentro
+    elif inicio is None:
+        actual[ruta[1]] = None
+    else:
+        previo = actual.get(ruta[1], _FALTA)
+        if previo is _FALTA:
+            actual[ruta[1]] = inicio
+        elif previo is not None:
+            actual[ruta[1]] = min(previo, inicio)
+
+
+_FALTA = object()
+
+
+# ==========================================================
+# ESCRITURA EN BD
+# ==========================================================
+def guardar_salas(salas, pendientes, parcial=False, modo="upsert", eventos=0):
+    """
+    Escribe en la BD las salas pendientes en una sola transacción.
+
+    Con `eventos` (> 0) los cambios de cada sala se añaden a salas_eventos
+    como una lista compacta de operaciones, y cada `eventos` registros (o
+    cuando hay que reescribirla entera) se guarda un snapshot completo en
+    salas y se borra su registro.
+
+    Con `parcial` las salas de las que solo cambiaron algunas claves de primer
+    nivel se actualizan con JSON_SET/JSON_REMOVE enviando solo esas claves; si
+    el diff pesa más que el documento, o la fila no existe, se reescribe entera.
+    Es opcional: solo se usa sin `eventos` (los cambios ya van al registro) y
+    con el codec "json" (con uno comprimido la columna no es JSON).
+
+    Las reescrituras completas van en un único INSERT ... ON DUPLICATE KEY
+    UPDATE (ON CONFLICT en SQLite) con `modo="upsert"`, o con el bucle ORM
+    (SELECT + UPDATE/INSERT por sala) con `modo="orm"`.
+    Devuelve cuántas salas se escribieron de cada forma.
+    """
+    resultado = {"parciales": 0, "completas": 0, "bytes_parciales": 0, "eventos": 0}
+    rastreadas = isinstance(salas, SalasRastreadas)
+    completas = []
+    estados = []
+    filas_eventos = []
+    sin_registro = []  # Salas con snapshot nuevo cuyo registro de eventos hay que borrar
+    for codigo in pendientes:
+        datos_sala = dict.get(salas, codigo)
+        if datos_sala is None:
+            continue
+        pendiente = pendientes[codigo] if isinstance(pendientes, dict) else None
+        claves = pendiente[1] if pendiente else None
+        # Siempre: `actualizada` es el instante de la última escritura (ver instantes_actualizacion)
+        estados.append(_fila_estado(codigo, datos_sala))
+        # Sala recién hidratada: no se sabe cuántos eventos tiene detrás en la
+        # BD, así que la primera escritura es un snapshot que los absorbe
+        registrados = salas.eventos.get(codigo) if rastreadas else 0
+        if registrados is None:
+            claves = None
+        if eventos:
+            arbol = pendiente[2] if claves is not None and len(pendiente) > 2 else None
+            if arbol and registrados < eventos:
+                filas_eventos.append({"codigo": codigo, "ops": _operaciones(datos_sala, arbol), "creado": time.time()})
+                salas.eventos[codigo] = registrados + 1
+                resultado["eventos"] += 1
+                continue
+            claves = None
+        if claves is None:
+            # Sin eventos no hay registro que borrar, salvo el que hayan dejado
+            # escrituras anteriores de esta sala (registrados > 0)
+            if registrados or (eventos and registrados is None):
+                sin_registro.append(codigo)
+            if rastreadas:
+                salas.eventos[codigo] = 0
+        if not parcial:
+            claves = None
+        if claves is not None:
+            enviados = _actualizar_claves(salas, codigo, datos_sala, claves)
+            if enviados is not None:
+                resultado["parciales"] += 1
+                resultado["bytes_parciales"] += enviados
+                continue
+        completas.append(codigo)
+        if isinstance(salas, SalasRastreadas):
+            salas.tamanos.pop(codigo, None)
+
+    # Con eventos el snapshot se copia ya: si la sala cambia antes de serializarse,
+    # ese cambio también iría en el siguiente evento y se aplicaría dos veces
+    copiar = a_nativo if eventos else (lambda datos: datos)
+    filas = [{"codigo": codigo, "datos": copiar(dict.get(salas, codigo))} for codigo in completas]
+    if filas and not (modo == "upsert" and _upsert(SalaDB.__table__, filas, ["datos"])):
+        for fila in filas:
+            sala_existente = db.session.get(SalaDB, fila["codigo"])
+            if sala_existente:
+                sala_existente.datos = fila["datos"]
+            else:
+                db.session.add(SalaDB(**fila))
+    if estados and not (modo == "upsert" and _upsert(SalaEstadoDB.__table__, estados, ["finalizada", "en_curso", "actualizada"])):
+        for fila in estados:
+            _actualizar_estado(fila)
+    for i in range(0, len(sin_registro), 500):
+        SalaEventoDB.query.filter(SalaEventoDB.codigo.in_(sin_registro[i:i + 500])).delete(synchronize_session=False)
+    if filas_eventos:
+        db.session.execute(SalaEventoDB.__table__.insert(), filas_eventos)
+    resultado["completas"] = len(completas)
+    db.session.commit()
+    return resultado
+
+
+def _upsert(tabla, filas, columnas):
+    """
+    INSERT de varias filas que actualiza `columnas` si la clave primaria ya
+    existe (o deja la fila existente si `columnas` está vacío), en una sola
+    sentencia. False si el dialecto no lo soporta.
+    """
+    dialecto = db.engine.dialect.name
+    if dialecto == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+        sentencia = insert(tabla)
+        if columnas:
+            sentencia = sentencia.on_duplicate_key_update({c: sentencia.inserted[c] for c in columnas})
+        else:
+            sentencia = sentencia.prefix_with("IGNORE")
+    elif dialecto == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+        sentencia = insert(tabla)
+        if columnas:
+            sentencia = sentencia.on_conflict_do_update(
+                index_elements=[c.name for c in tabla.primary_key],
+                set_={c: sentencia.excluded[c] for c in columnas},
+            )
+        else:
+            sentencia = sentencia.on_conflict_do_nothing()
+    else:
+        return False
+    db.session.execute(sentencia, filas)
+    return True
+
+
+def _fila_estado(codigo, datos_sala):
+    return {
+        "codigo": codigo,
+        "finalizada": bool(datos_sala.get("finalizada", False)),
+        "en_curso": bool(datos_sala.get("en_curso", False)),
+        "actualizada": time.time(),
+    }
+
+
+def _actualizar_estado(fila):
+    estado = db.session.get(SalaEstadoDB, fila["codigo"])
+    if estado is None:
+        db.session.add(SalaEstadoDB(**fila))
+        return
+    estado.finalizada = fila["finalizada"]
+    estado.en_curso = fila["en_curso"]
+    estado.actualizada = fila["actualizada"]
+
+
+# ==========================================================
+# CARGA DESDE BD
+# ==========================================================
+def cargar_sala(codigo):
+    """
+    Lee una sala de la BD (hidratación bajo demanda): su snapshot más los
+    eventos posteriores, o la copia del archivo de salas finalizadas.
+    None si no existe
+    """
+    sala_db = db.session.get(SalaDB, codigo)
+    if sala_db and sala_db.datos:
+        reproducir_eventos({codigo: sala_db.datos})
+        return sala_db.datos
+    sala_db = db.session.get(SalaArchivadaDB, codigo)
+    return sala_db.datos if sala_db and sala_db.datos else None
+
+
+def instantes_actualizacion(codigos, lote=500):
+    """{codigo: instante de su última escritura en la BD} de las salas que tienen fila en salas_estado"""
+    codigos = list(codigos)
+    instantes = {}
+    for i in range(0, len(codigos), lote):
+        instantes.update(db.session.query(SalaEstadoDB.codigo, SalaEstadoDB.actualizada)
+                         .filter(SalaEstadoDB.codigo.in_(codigos[i:i + lote])))
+    return {codigo: instante for codigo, instante in instantes.items() if instante is not None}
+
+
+def indexar_salas():
+    """
+    Rellena salas_estado para las salas guardadas antes de que existiera la
+    tabla. Solo recorre la tabla `salas` (por lotes) si el índice está vacío.
+    """
+    if db.session.query(SalaEstadoDB.codigo).first() is not None:
+        return 0
+    estados = [_fila_estado(sala_db.codigo, sala_db.datos)
+               for sala_db in SalaDB.query.yield_per(200) if sala_db.datos]
+    if estados and not _upsert(SalaEstadoDB.__table__, estados, ["finalizada", "en_curso", "actualizada"]):
+        for fila in estados:
+            _actualizar_estado(fila)
+    db.session.commit()
+    return len(estados)
+
+
+def precargar_salas(salas, modo="activas"):
+    """
+    Carga en memoria las salas indicadas por `modo`:
+    - "ninguna": todo se hidrata bajo demanda
+    - "activas": solo salas no finalizadas según salas_estado
+    - "todas": la tabla completa (comportamiento anterior)
+    Devuelve cuántos eventos se reprodujeron sobre los snapshots.
+    """
+    if modo == "todas":
+        documentos = {sala_db.codigo: sala_db.datos for sala_db in SalaDB.query.all() if sala_db.datos}
+        reproducidos = reproducir_eventos(documentos)
+        for codigo, datos in documentos.items():
+            salas.cargar(codigo, datos)
+        return reproducidos
+    if modo != "activas":
+        return 0
+    indexar_salas()
+    reproducidos = 0
+    codigos = [c for (c,) in db.session.query(SalaEstadoDB.codigo).filter(SalaEstadoDB.finalizada.is_(False))]
+    for i in range(0, len(codigos), 500):
+        documentos = {sala_db.codigo: sala_db.datos
+                      for sala_db in SalaDB.query.filter(SalaDB.codigo.in_(codigos[i:i + 500])) if sala_db.datos}
+        reproducidos += reproducir_eventos(documentos)
+        for codigo, datos in documentos.items():
+            if not datos.get("finalizada", False):
+                salas.cargar(codigo, datos)
+    return reproducidos
+
+
+# ==========================================================
+# REGISTRO DE EVENTOS
+# ==========================================================
+# Operaciones de un evento (rutas de uno o dos niveles):
+#   ["s", ruta, valor]     asignar el valor
+#   ["b", ruta]            borrar la clave
+#   ["a", ruta, valores]   añadir valores al final de la lista
+def _operaciones(datos_sala, arbol):
+    """Convierte el árbol de rutas modificadas en operaciones con los valores actuales"""
+    ops = []
+    for clave, cambio in arbol.items():
+        if clave not in datos_sala:
+            ops.append(["b", [clave]])
+            continue
+        valor = datos_sala[clave]
+        if cambio is None or not isinstance(valor, (dict, list)) or isinstance(cambio, dict) != isinstance(valor, dict):
+            ops.append(["s", [clave], a_nativo(valor)])
+        elif isinstance(cambio, dict):
+            for subclave, subcambio in cambio.items():
+                if subclave not in valor:
+                    ops.append(["b", [clave, subclave]])
+                else:
+                    ops.append(_operacion_valor([clave, subclave], valor[subclave], subcambio))
+        else:
+            ops.append(_operacion_valor([clave], valor, cambio))
+    return ops
+
+
+def _operacion_valor(ruta, valor, inicio):
+    # Copias: el evento se serializa más tarde y la sala puede seguir cambiando
+    if inicio is not None and isinstance(valor, list) and inicio <= len(valor):
+        return ["a", ruta, a_nativo(valor[inicio:])]
+    return ["s", ruta, a_nativo(valor)]
+
+
+def aplicar_operaciones(datos_sala, ops):
+    """Reproduce sobre un documento de sala las operaciones de un evento"""
+    for op in ops:
+        tipo, ruta = op[0], op[1]
+        destino = datos_sala
+        if len(ruta) > 1:
+            destino = datos_sala.get(ruta[0])
+            if not isinstance(destino, dict):
+                if tipo == "b":
+                    continue
+                destino = datos_sala[ruta[0]] = {}
+        clave = ruta[-1]
+        if tipo == "s":
+            destino[clave] = op[2]
+        elif tipo == "b":
+            destino.pop(clave, None)
+        elif tipo == "a":
+            lista = destino.get(clave)
+            if isinstance(lista, list):
+                lista.extend(op[2])
+            else:
+                destino[clave] = list(op[2])
+
+
+def reproducir_eventos(documentos):
+    """
+    Aplica a cada snapshot ({codigo: datos}) los eventos registrados después,
+    en orden. Devuelve cuántos eventos se reprodujeron.
+    """
+    codigos = list(documentos)
+    reproducidos = 0
+    for i in range(0, len(codigos), 500):
+        consulta = (SalaEventoDB.query
+                    .filter(SalaEventoDB.codigo.in_(codigos[i:i + 500]))
+                    .order_by(SalaEventoDB.id))
+        for evento in consulta:
+            aplicar_operaciones(documentos[evento.codigo], evento.ops or [])
+            reproducidos += 1
+    return reproducidos
+
+
+# Funciones JSON por dialecto: (modificar, eliminar, convertir parámetro a JSON)
+_FUNCIONES_JSON = {
+    "mysql": ("JSON_SET", "JSON_REMOVE", "CAST({} AS JSON)"),
+    "sqlite": ("json_set", "json_remove", "json({})"),
+}
+
+
+def _ruta_json(clave):
+    return '$."' + str(clave).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _actualizar_claves(salas, codigo, datos_sala, claves):
+    """
+    UPDATE parcial de las `claves` de una sala. Devuelve los bytes enviados,
+    o None si conviene (o hace falta) reescribir el documento completo.
+    """
+    funciones = _FUNCIONES_JSON.get(db.engine.dialect.name)
+    if funciones is None or not claves or database.CODEC_SALAS != "json":
+        return None  # Con un codec comprimido la columna no es JSON: solo escrituras completas
+    json_set, json_remove, como_json = funciones
+
+    modificadas = {}
+    eliminadas = []
+    for clave in claves:
+        if clave in datos_sala:
+            modificadas[clave] = json.dumps(datos_sala[clave])
+        else:
+            eliminadas.append(clave)
+    bytes_diff = sum(len(v) for v in modificadas.values())
+
+    tamanos = salas.tamanos if isinstance(salas, SalasRastreadas) else {}
+    tamano_documento = tamanos.get(codigo)
+    if tamano_documento is None:
+        tamano_documento = tamanos[codigo] = len(json.dumps(datos_sala))
+    if bytes_diff >= tamano_documento:
+        return None
+
+    expresion = "datos"
+    parametros = {"codigo": codigo}
+    if modificadas:
+        argumentos = []
+        for i, (clave, valor) in enumerate(modificadas.items()):
+            parametros[f"r{i}"] = _ruta_json(clave)
+            parametros[f"v{i}"] = valor
+            argumentos.append(f":r{i}, " + como_json.format(f":v{i}"))
+        expresion = f"{json_set}({expresion}, {', '.join(argumentos)})"
+    if eliminadas:
+        for i, clave in enumerate(eliminadas):
+            parametros[f"e{i}"] = _ruta_json(clave)
+        rutas = ", ".join(f":e{i}" for i in range(len(eliminadas)))
+        expresion = f"{json_remove}({expresion}, {rutas})"
+
+    resultado = db.session.execute(
+        # LIKE '{%': las filas escritas antes con un codec comprimido no admiten JSON_SET
+        text(f"UPDATE salas SET datos = {expresion} WHERE codigo = :codigo AND datos LIKE '{{%'"), parametros
+    )
+    if resultado.rowcount == 0:
+        return None  # La fila no existe todavía (o está comprimida): escribir el documento completo
+    return bytes_diff
+
+
+# ==========================================================
+# ARCHIVO DE SALAS FINALIZADAS
+# ==========================================================
+def archivar_salas(limite, excluir=(), lote=200):
+    """
+    Mueve a salas_archivadas las salas finalizadas cuya última escritura es
+    anterior a `limite` (epoch) y las borra de salas y salas_estado.
+    Devuelve los códigos archivados.
+    """
+    codigos = [c for (c,) in db.session.query(SalaEstadoDB.codigo)
+               .filter(SalaEstadoDB.finalizada.is_(True), SalaEstadoDB.actualizada < limite)
+               .limit(lote)
+               if c not in excluir]
+    if not codigos:
+        return []
+    ahora = time.time()
+    documentos = {sala_db.codigo: sala_db.datos
+                  for sala_db in SalaDB.query.filter(SalaDB.codigo.in_(codigos)) if sala_db.datos}
+    reproducir_eventos(documentos)
+    filas = [{"codigo": codigo, "datos": datos, "archivada": ahora} for codigo, datos in documentos.items()]
+    if filas and not _upsert(SalaArchivadaDB.__table__, filas, ["datos", "archivada"]):
+        for fila in filas:
+            db.session.merge(SalaArchivadaDB(**fila))
+    SalaDB.query.filter(SalaDB.codigo.in_(codigos)).delete(synchronize_session=False)
+    SalaEstadoDB.query.filter(SalaEstadoDB.codigo.in_(codigos)).delete(synchronize_session=False)
+    SalaEventoDB.query.filter(SalaEventoDB.codigo.in_(codigos)).delete(synchronize_session=False)
+    db.session.commit()
+    return codigos
+
+
+class ArchivadorSalas:
+    """
+    Hilo que cada `intervalo` segundos archiva las salas que llevan más de
+    `gracia` segundos finalizadas: las copia comprimidas a salas_archivadas,
+    las borra de la tabla caliente y las saca de memoria. Siguen disponibles
+    bajo demanda (cargar_sala busca también en el archivo).
+    """
+
+    def __init__(self, almacen, obtener_salas, escritor, gracia=1800, intervalo=300):
+        self.almacen = almacen
+        self.obtener_salas = obtener_salas
+        self.escritor = escritor
+        self.gracia = gracia
+        self.intervalo = intervalo
+        self._hilo = None
+        self.metricas = {
+            "barridos": 0,
+            "salas_archivadas": 0,
+            "salas_desalojadas": 0,
+            "errores": 0,
+            "ultimo_barrido_ms": 0.0,
+        }
+
+    def iniciar(self):
+        if self._hilo is None:
+            self._hilo = threading.Thread(target=self._bucle, daemon=True)
+            self._hilo.start()
+
+    def _bucle(self):
+        while True:
+            time.sleep(self.intervalo)
+            self.barrer()
+
+    def barrer(self):
+        """Archiva y desaloja las salas finalizadas fuera del periodo de gracia"""
+        salas = self.obtener_salas()
+        if not isinstance(salas, SalasRastreadas):
+            return
+        inicio = time.perf_counter()
+        limite = time.time() - self.gracia
+        # Lo pendiente se guarda antes, para que el archivo tenga la última versión
+        self.escritor.descargar()
+        archivadas = []
+        with self.escritor._lock:
+            try:
+                archivadas = self.almacen.archivar(limite, excluir=salas.sucias)
+            except Exception as e:
+                print(f"Error archivando salas: {e}")
+                self.metricas["errores"] += 1
+        sucias = salas.sucias
+        archivadas_set = set(archivadas)
+        for codigo in archivadas:
+            # Su snapshot salió de la tabla caliente: la próxima escritura debe ser completa
+            salas.eventos.pop(codigo, None)
+        desalojadas = 0
+        for codigo, sala in list(dict.items(salas)):
+            if codigo in sucias or not sala.get("finalizada", False):
+                continue
+            if codigo in archivadas_set or sala.get("finalizada_en", 0) < limite:
+                salas.desalojar(codigo)
+                desalojadas += 1
+        self.metricas["barridos"] += 1
+        self.metricas["salas_archivadas"] += len(archivadas)
+        self.metricas["salas_desalojadas"] += desalojadas
+        self.metricas["ultimo_barrido_ms"] = round((time.perf_counter() - inicio) * 1000, 2)
+        if archivadas or desalojadas:
+            print(f"🗄️ {len(archivadas)} salas archivadas, {desalojadas} desalojadas de memoria")
+
+    def estado(self):
+        return {
+            **self.metricas,
+            "gracia_s": self.gracia,
+            "intervalo_s": self.intervalo,
+        }
+
+
+# ==========================================================
+# VEREDICTOS DE VALIDACIÓN
+# ==========================================================
+# Clave: (categoría, letra, respuesta) ya normalizadas (ver clave_validacion en
+# app.py). Registro: (veredicto, razón, confianza, fuente).
+FUENTES_VALIDACION = ("ia", "apelacion", "admin")
+
+
+def _clave_guardable(clave):
+    categoria, letra, respuesta = clave
+    return len(categoria) <= 60 and len(letra) <= 2 and len(respuesta) <= 120
+
+
+def buscar_validaciones(claves, lote=200):
+    """{clave: registro} de las claves que ya tienen veredicto en la tabla"""
+    por_grupo = {}
+    for clave in claves:
+        if _clave_guardable(clave):
+            por_grupo.setdefault(clave[:2], set()).add(clave[2])
+    encontradas = {}
+    for (categoria, letra), respuestas in por_grupo.items():
+        respuestas = list(respuestas)
+        for i in range(0, len(respuestas), lote):
+            filas = ValidacionDB.query.filter(
+                ValidacionDB.categoria == categoria,
+                ValidacionDB.letra == letra,
+                ValidacionDB.respuesta.in_(respuestas[i:i + lote]),
+            ).all()
+            for fila in filas:
+                encontradas[(fila.categoria, fila.letra, fila.respuesta)] = (
+                    fila.veredicto, fila.razon or "", fila.confianza if fila.confianza is not None else 0.5, fila.fuente)
+    return encontradas
+
+
+def guardar_validaciones(registros, sobrescribir=False):
+    """
+    Escribe {clave: registro} en una sola transacción. Sin `sobrescribir`
+    (veredictos de la IA) no se toca ninguna clave que ya tenga veredicto,
+    así una IA no deshace lo que decidió una apelación o el admin.
+    Devuelve cuántos registros se enviaron.
+    """
+    ahora = time.time()
+    filas = [
+        {"categoria": clave[0], "letra": clave[1], "respuesta": clave[2],
+         "veredicto": bool(veredicto), "razon": (razon or "")[:255], "confianza": confianza,
+         "fuente": fuente, "actualizada": ahora}
+        for clave, (veredicto, razon, confianza, fuente) in registros.items()
+        if _clave_guardable(clave)
+    ]
+    if not filas:
+        return 0
+    columnas = ["veredicto", "razon", "confianza", "fuente", "actualizada"] if sobrescribir else []
+    if not _upsert(ValidacionDB.__table__, filas, columnas):
+        for fila in filas:
+            existente = db.session.get(ValidacionDB, (fila["categoria"], fila["letra"], fila["respuesta"]))
+            if existente is None:
+                db.session.add(ValidacionDB(**fila))
+            elif sobrescribir:
+                for columna in columnas:
+                    setattr(existente, columna, fila[columna])
+    db.session.commit()
+    return len(filas)
+
+
+def exportar_validaciones(lote=5000):
+    """Todos los veredictos de la tabla como {clave: registro} (para entrenar el clasificador local)"""
+    registros = {}
+    for fila in ValidacionDB.query.yield_per(lote):
+        registros[(fila.categoria, fila.letra, fila.respuesta)] = (
+            fila.veredicto, fila.razon or "", fila.confianza if fila.confianza is not None else 0.5, fila.fuente)
+    return registros
+
+
+# ==========================================================
+# ESCRITOR DIFERIDO (WRITE-BEHIND)
+# ==========================================================
+class EscritorDiferido:
+    """
+    Greenlet que guarda las salas sucias en segundo plano. Tras la primera
+    modificación espera `intervalo` segundos para agrupar las escrituras
+    repetidas sobre la misma sala y las confirma en una sola transacción.
+
+    Si se acumulan más de `max_pendientes` salas sin guardar, el que notifica
+    guarda de forma síncrona (contrapresión) en lugar de dejar crecer la cola.
+    """
+
+    def __init__(self, almacen, obtener_salas, intervalo=0.2, max_pendientes=500, parcial=True, modo="upsert", eventos=0):
+        self.almacen = almacen
+        self.obtener_salas = obtener_salas
+        self.intervalo = intervalo
+        self.max_pendientes = max_pendientes
+        self.parcial = parcial
+        self.modo = modo
+        self.eventos = eventos
+        self._lock = threading.Lock()
+        self._despertar = threading.Event()
+        self._hilo = None
+        self.metricas = {
+            "descargas": 0,
+            "descargas_forzadas": 0,
+            "salas_escritas": 0,
+            "escrituras_parciales": 0,
+            "escrituras_completas": 0,
+            "bytes_parciales": 0,
+            "eventos_registrados": 0,
+            "errores": 0,
+            "ultima_descarga_ms": 0.0,
+            "max_descarga_ms": 0.0,
+            "max_retraso_ms": 0.0,
+        }
+
+    def iniciar(self):
+        if self._hilo is None:
+            self._hilo = threading.Thread(target=self._bucle, daemon=True)
+            self._hilo.start()
+
+    def notificar(self):
+        """Avisa de que hay salas modificadas; nunca bloquea salvo contrapresión"""
+        salas = self.obtener_salas()
+        if salas.num_sucias > self.max_pendientes:
+            self.metricas["descargas_forzadas"] += 1
+            self.descargar()
+        else:
+            self._despertar.set()
+
+    def _bucle(self):
+        while True:
+            self._despertar.wait()
+            time.sleep(self.intervalo)  # Ventana de agrupación
+            self._despertar.clear()
+            self.descargar()
+
+    def descargar(self):
+        """Guarda ya todas las salas sucias (descarga síncrona)"""
+        with self._lock:
+            salas = self.obtener_salas()
+            if not isinstance(salas, SalasRastreadas):
+                return
+            pendientes = salas.tomar_sucias()
+            if not pendientes:
+                return
+            salas_retraso = time.monotonic() - min(p[0] for p in pendientes.values())
+            inicio = time.perf_counter()
+            try:
+                escritas = self.almacen.guardar(salas, pendientes, parcial=self.parcial, modo=self.modo,
+                                                eventos=self.eventos)
+            except Exception as e:
+                print(f"Error guardando estado en BD: {e}")
+                salas.restaurar(pendientes)
+                self.metricas["errores"] += 1
+                return
+            duracion_ms = (time.perf_counter() - inicio) * 1000
+            self.metricas["descargas"] += 1
+            self.metricas["salas_escritas"] += len(pendientes)
+            self.metricas["escrituras_parciales"] += escritas["parciales"]
+            self.metricas["escrituras_completas"] += escritas["completas"]
+            self.metricas["bytes_parciales"] += escritas["bytes_parciales"]
+            self.metricas["eventos_registrados"] += escritas["eventos"]
+            self.metricas["ultima_descarga_ms"] = round(duracion_ms, 2)
+            self.metricas["max_descarga_ms"] = round(max(self.metricas["max_descarga_ms"], duracion_ms), 2)
+            self.metricas["max_retraso_ms"] = round(max(self.metricas["max_retraso_ms"], salas_retraso * 1000), 2)
+
+    def estado(self):
+        """Métricas de la cola para el panel de admin"""
+        salas = self.obtener_salas()
+        rastreadas = isinstance(salas, SalasRastreadas)
+        return {
+            **self.metricas,
+            "pendientes": salas.num_sucias if rastreadas else 0,
+            "max_pendientes": self.max_pendientes,
+            "retraso_actual_ms": round(salas.antiguedad_pendiente() * 1000, 2) if rastreadas else 0.0,
+            "escrituras_coalescidas": salas.marcas_coalescidas if rastreadas else 0,
+            "intervalo_ms": int(self.intervalo * 1000),
+            "parcial": self.parcial,
+            "modo": self.modo,
+            "almacen": self.almacen.nombre,
+            "codec": database.CODEC_SALAS,
+            "eventos_por_snapshot": self.eventos,
+        }
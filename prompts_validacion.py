@@ -0,0 +1,598 @@
+"""
+Prompts de validación precompilados. Las definiciones de cada categoría
+(reglas y ejemplos) se formatean una sola vez, la primera vez que se pide
+esa categoría, en una PlantillaPrompt: el texto ya troceado por los huecos
+que cambian en cada llamada (respuesta, letra, pista), así que validar una
+respuesta solo une trozos en lugar de reconstruir el diccionario de
+categorías y volver a formatear ejemplos y reglas.
+"""
+import re
+from functools import lru_cache
+
+# Categorías que llevan "una" en la pregunta
+CATEGORIAS_FEMENINAS = (
+    "fruta", "profesión", "canción", "marca", "comida", "película",
+    "serie", "universidad", "empresa", "ciudad"
+)
+
+# ==========================================================
+# DEFINICIONES ESTRICTAS POR CATEGORÍA
+# ==========================================================
+DEFINICIONES_CATEGORIAS = {
+    # BÁSICAS
+    "nombre": {
+        "definicion": "nombre propio de PERSONA (nombre de pila) real y usado en algún idioma",
+        "ejemplos_si": ["Roberto", "María", "Alejandro", "Sofía", "Ahmed", "Yuki"],
+        "ejemplos_no": [
+            ("Radio", "es un objeto, no nombre de persona"),
+            ("Río", "es un cuerpo de agua"),
+            ("Rápido", "es un adjetivo"),
+            ("Rugido", "es un sonido"),
+        ],
+        "requiere_existencia": False,
+        "reglas_extra": "Debe ser un nombre que personas reales usen.  NO aceptar objetos, lugares, adjetivos o verbos."
+    },
+    "animal": {
+        "definicion": "animal real que existe o existió (incluye extintos como dinosaurios)",
+        "ejemplos_si": ["Rinoceronte", "Rana", "Rata", "Tiburón", "Tiranosaurio"],
+        "ejemplos_no": [
+            ("Río", "es un cuerpo de agua"),
+            ("Reloj", "es un objeto"),
+            ("Rascacielos", "es un edificio"),
+            ("Dragón", "es un animal mitológico/ficticio"),
+            ("Unicornio", "es un animal ficticio"),
+        ],
+        "requiere_existencia": True,
+        "reglas_extra": "Debe ser un animal REAL.  NO aceptar animales mitológicos o ficticios (dragones, unicornios, etc.) a menos que existan en la realidad."
+    },
+    "país o ciudad": {
+        "definicion": "país reconocido internacionalmente O ciudad real que existe",
+        "ejemplos_si": ["Brasil", "Roma", "Tokio", "Argentina", "Rabat"],
+        "ejemplos_no": [
+            ("Manzana", "es una fruta"),
+            ("Río", "solo es un cuerpo de agua, 'Río de Janeiro' sí sería válido"),
+            ("Atlantida", "es una ciudad mitológica"),
+            ("NONDON", "mal escrito, sería 'Londres'"),
+            ("Perro", "es un animal"),
+        ],
+        "requiere_existencia": True,
+        "reglas_extra": "Debe ser un lugar REAL y existente.  Nombres deben estar correctamente escritos."
+    },
+    "fruta": {
+        "definicion": "fruta real comestible que existe botánicamente",
+        "ejemplos_si": ["Manzana", "Rambután", "Frambuesa", "Toronja", "Tamarindo"],
+        "ejemplos_no": [
+            ("Rascacielos", "es un edificio"),
+            ("Brasil", "es un país"),
+            ("Rosa", "es una flor, no una fruta"),
+            ("Tomate", "botánicamente es fruta pero se acepta"),
+            ("Rugido", "es un sonido"),
+        ],
+        "requiere_existencia": True,
+        "reglas_extra": "Debe ser una fruta REAL.  El tomate técnicamente es fruta y se acepta."
+    },
+    "objeto": {
+        "definicion": "objeto físico inanimado, fabricado o creado por humanos",
+        "ejemplos_si": ["Reloj", "Radio", "Televisor", "Silla", "Teléfono", "Raqueta"],
+        "ejemplos_no": [
+            ("Rinoceronte", "es un animal"),
+            ("Río", "es un elemento natural, no fabricado"),
+            ("Rugido", "es un sonido, no un objeto físico"),
+            ("Nariz", "es una parte del cuerpo"),
+            ("Árbol", "es un ser vivo natural"),
+        ],
+        "requiere_existencia": False,
+        "reglas_extra": "Debe ser algo FABRICADO/CREADO por humanos. NO partes del cuerpo, animales, plantas o elementos naturales."
+    },
+    "color": {
+        "definicion": "color real y reconocible (incluye tonalidades)",
+        "ejemplos_si": ["Rojo", "Rosa", "Rubí", "Turquesa", "Terracota", "Índigo"],
+        "ejemplos_no": [
+            ("Rugido", "es un sonido"),
+            ("Río", "es un cuerpo de agua"),
+            ("Rápido", "es un adjetivo de velocidad"),
+            ("Reloj", "es un objeto"),
+        ],
+        "requiere_existencia": False,
+        "reglas_extra": "Debe ser un color reconocido. Se aceptan tonalidades y colores menos comunes si son reales."
+    },
+    
+    # INTERMEDIAS
+    "profesión": {
+        "definicion": "profesión, oficio o trabajo real que personas ejercen",
+        "ejemplos_si": ["Médico", "Profesor", "Piloto", "Taxista", "Tornero", "Reportero"],
+        "ejemplos_no": [
+            ("Mago", "si es de fantasía no, si es ilusionista sí"),
+            ("Dragón", "es un animal ficticio"),
+            ("Teléfono", "es un objeto"),
+            ("Corredor", "depende del contexto - si es atleta sí"),
+        ],
+        "requiere_existencia": False,
+        "reglas_extra": "Debe ser un trabajo REAL que personas ejercen en la vida real."
+    },
+    "canción": {
+        "definicion": "canción real que existe, con título oficial correcto",
+        "ejemplos_si": ["Thriller", "Bohemian Rhapsody", "Despacito", "Toxic", "Titanium"],
+        "ejemplos_no": [
+            ("La Canción Bonita", "título genérico, verificar si existe"),
+            ("Música Alegre", "no es un título real"),
+            ("Song 12345", "inventado"),
+        ],
+        "requiere_existencia": True,
+        "reglas_extra": "DEBE ser una canción REAL y conocida. El título debe ser el oficial o muy reconocible."
+    },
+    "artista musical": {
+        "definicion": "cantante, banda o grupo musical REAL y verificable",
+        "ejemplos_si": ["Tito Doble P", "Taylor Swift", "The Beatles", "Thalía", "Timbiriche", "Twenty One Pilots"],
+        "ejemplos_no": [
+            ("Los Musicales", "banda inventada"),
+            ("DJ Fantasma", "nombre inventado"),
+            ("The Super Band", "no existe"),
+            ("Cantante Famoso", "no es un nombre de artista"),
+        ],
+        "requiere_existencia": True,
+        "reglas_extra": """CRÍTICO: El artista DEBE existir realmente. 
+- La CAPITALIZACIÓN NO IMPORTA ('Tito Doble P' = 'tito doble p' = 'TITO DOBLE P')
+- Verificar que sea un artista/banda REAL y conocido
+- Aceptar nombres artísticos en cualquier idioma"""
+    },
+    "videojuego": {
+        "definicion": "videojuego REAL con título oficial correcto que existe o existió",
+        "ejemplos_si": ["Tetris", "Tekken", "Tomb Raider", "Terraria", "The Last of Us", "Titanfall"],
+        "ejemplos_no": [
+            ("Trilogy GTA", "título incorrecto, sería 'GTA: The Trilogy'"),
+            ("Super Mario 3000", "no existe"),
+            ("Call of Duty Zombies War", "título inventado"),
+            ("FIFA 2099", "no existe"),
+            ("Zelda Adventures", "título incorrecto"),
+        ],
+        "requiere_existencia": True,
+        "reglas_extra": """CRÍTICO: DEBE ser el título OFICIAL o abreviación reconocida.
+- NO aceptar títulos con palabras en orden incorrecto
+- NO aceptar variaciones inventadas de juegos reales
+- 'GTA V' es válido, 'Trilogy GTA' NO es válido"""
+    },
+    "marca": {
+        "definicion": "marca comercial REAL y conocida que existe o existió",
+        "ejemplos_si": ["Toyota", "Tesla", "Target", "Tiffany", "TikTok", "Twitch"],
+        "ejemplos_no": [
+            ("Marcas Buenas", "no es una marca"),
+            ("Super Tienda", "nombre genérico"),
+            ("TechnoMax", "verificar si existe"),
+        ],
+        "requiere_existencia": True,
+        "reglas_extra": "Debe ser una marca REAL y reconocible a nivel nacional o internacional."
+    },
+    "comida": {
+        "definicion": "platillo, alimento o comida real (preparada o ingrediente)",
+        "ejemplos_si": ["Tacos", "Tiramisu", "Tortilla", "Tofu", "Tallarines", "Ternera"],
+        "ejemplos_no": [
+            ("Brasil", "es un país"),
+            ("Teléfono", "es un objeto"),
+            ("Tigre", "es un animal, no comida"),
+        ],
+        "requiere_existencia": True,
+        "reglas_extra": "Debe ser algo que se COME.  Incluye platillos, ingredientes, snacks, etc."
+    },
+    "película": {
+        "definicion": "película cinematográfica REAL con título oficial correcto",
+        "ejemplos_si": ["Titanic", "Toy Story", "Thor", "Transformers", "Trolls"],
+        "ejemplos_no": [
+            ("The Movie", "título genérico"),
+            ("Película de Acción", "no es un título"),
+            ("Avengers 10", "no existe"),
+            ("Zootopia Adventures", "no existe"),
+        ],
+        "requiere_existencia": True,
+        "reglas_extra": "DEBE ser una película REAL.  Usar título oficial en cualquier idioma."
+    },
+    "serie de tv": {
+        "definicion": "serie de televisión o streaming REAL que existe o existió",
+        "ejemplos_si": ["The Office", "True Detective", "The Crown", "Tuca & Bertie", "Ted Lasso"],
+        "ejemplos_no": [
+            ("Zootopia Adventures", "no existe, Zootopia es película"),
+            ("The Series", "título genérico"),
+            ("Netflix Show", "no es un título"),
+            ("Breaking Good", "no existe"),
+        ],
+        "requiere_existencia": True,
+        "reglas_extra": "DEBE ser una serie REAL de TV o streaming. NO confundir películas con series."
+    },
+    
+    # DIFÍCILES
+    "monumento": {
+        "definicion": "monumento, edificio histórico o lugar emblemático REAL",
+        "ejemplos_si": ["Torre Eiffel", "Taj Mahal", "Torre de Pisa", "Teotihuacán", "Teatro Colón"],
+        "ejemplos_no": [
+            ("Brasil", "es un país, no un monumento"),
+            ("Edificio Alto", "nombre genérico"),
+            ("La Torre", "muy genérico"),
+        ],
+        "requiere_existencia": True,
+        "reglas_extra": "Debe ser un monumento o lugar histórico REAL y reconocible."
+    },
+    "libro": {
+        "definicion": "libro REAL con título oficial correcto",
+        "ejemplos_si": ["Twilight", "The Hobbit", "To Kill a Mockingbird", "1984", "The Great Gatsby"],
+        "ejemplos_no": [
+            ("El Libro Bueno", "título genérico"),
+            ("Harry Potter 20", "no existe"),
+            ("The Story", "muy genérico"),
+        ],
+        "requiere_existencia": True,
+        "reglas_extra": "DEBE ser un libro REAL publicado.  Usar título oficial."
+    },
+    "deporte": {
+        "definicion": "deporte o actividad deportiva REAL reconocida",
+        "ejemplos_si": ["Tenis", "Taekwondo", "Triatlón", "Tiro con arco", "Tubing"],
+        "ejemplos_no": [
+            ("Correr Rápido", "es una acción, no un deporte con nombre"),
+            ("Jugar", "muy genérico"),
+            ("Quidditch", "es ficticio de Harry Potter"),
+        ],
+        "requiere_existencia": True,
+        "reglas_extra": "Debe ser un deporte REAL y reconocido oficialmente."
+    },
+    "evento histórico": {
+        "definicion": "evento histórico REAL documentado que ocurrió",
+        "ejemplos_si": ["Tratado de Versalles", "Terremoto de 1985", "Toma de la Bastilla", "Titanic hundimiento"],
+        "ejemplos_no": [
+            ("La Guerra", "muy genérico"),
+            ("Evento Importante", "no es específico"),
+            ("Batalla de los Dioses", "ficticio"),
+        ],
+        "requiere_existencia": True,
+        "reglas_extra": "DEBE ser un evento REAL de la historia.  Debe ser verificable y documentado."
+    },
+    "empresa": {
+        "definicion": "empresa o compañía REAL que existe o existió",
+        "ejemplos_si": ["Tesla", "Toyota", "Twitter", "TikTok", "Telmex", "Televisa"],
+        "ejemplos_no": [
+            ("Empresa Grande", "nombre genérico"),
+            ("Tech Company", "no es un nombre real"),
+            ("Super Corp", "verificar si existe"),
+        ],
+        "requiere_existencia": True,
+        "reglas_extra": "DEBE ser una empresa REAL. Similar a marca pero más enfocado en compañías."
+    },
+    "personaje famoso": {
+        "definicion": "persona famosa REAL (celebridad, histórico, deportista, etc.)",
+        "ejemplos_si": ["Taylor Swift", "Tom Hanks", "Teresa de Calcuta", "Thatcher Margaret", "Tupac"],
+        "ejemplos_no": [
+            ("Tony Stark", "es un personaje ficticio de Marvel"),
+            ("El Famoso", "no es un nombre"),
+            ("Persona Conocida", "no es específico"),
+        ],
+        "requiere_existencia": True,
+        "reglas_extra": "DEBE ser una persona REAL famosa. NO personajes de ficción."
+    },
+    "universidad": {
+        "definicion": "universidad o institución educativa superior REAL",
+        "ejemplos_si": ["UNAM", "Universidad de Tokio", "Trinity College", "Tecnológico de Monterrey", "UCLA"],
+        "ejemplos_no": [
+            ("Universidad Grande", "nombre genérico"),
+            ("Escuela de Magia", "ficticia"),
+            ("Hogwarts", "ficticia de Harry Potter"),
+        ],
+        "requiere_existencia": True,
+        "reglas_extra": "DEBE ser una universidad REAL que existe o existió."
+    },
+    "instrumento musical": {
+        "definicion": "instrumento musical REAL",
+        "ejemplos_si": ["Trompeta", "Tambor", "Triángulo", "Tuba", "Theremin", "Timbal"],
+        "ejemplos_no": [
+            ("Música", "no es un instrumento"),
+            ("Sonido", "no es un instrumento"),
+            ("El Instrumento", "muy genérico"),
+        ],
+        "requiere_existencia": True,
+        "reglas_extra": "Debe ser un instrumento REAL que se use para hacer música."
+    },
+    "superhéroe": {
+        "definicion": "superhéroe o superheroína de cómics, películas o series CONOCIDO",
+        "ejemplos_si": ["Thor", "Thanos", "Thing (La Cosa)", "Tigra", "Teen Titans"],
+        "ejemplos_no": [
+            ("Super Hombre Volador", "nombre inventado"),
+            ("El Héroe", "muy genérico"),
+            ("Captain Fantastico", "verificar si existe"),
+        ],
+        "requiere_existencia": True,
+        "reglas_extra": "DEBE ser un superhéroe REAL de cómics/películas/series conocidas (Marvel, DC, etc.).  NO inventados."
+    },
+}
+
+
+def datos_categoria_validacion(categoria):
+    """
+    Artículo y definición estricta (ejemplos y reglas) de una categoría, para
+    los prompts de validación. Retorna: (articulo: str, info_categoria: dict)
+    """
+    categoria_lower = categoria.lower()
+    articulo = "una" if any(palabra in categoria_lower for palabra in CATEGORIAS_FEMENINAS) else "un"
+
+    # Buscar la categoría en las definiciones
+    for key, value in DEFINICIONES_CATEGORIAS.items():
+        if key in categoria_lower:
+            return articulo, value
+
+    # Si no se encuentra, usar definición genérica
+    return articulo, {
+        "definicion": f"{categoria} real y reconocible",
+        "ejemplos_si": [],
+        "ejemplos_no": [],
+        "requiere_existencia": True,
+        "reglas_extra": "Debe ser real y verificable."
+    }
+
+def formatear_ejemplos_validacion(info_categoria):
+    """Texto de los ejemplos válidos e inválidos de una categoría"""
+    ejemplos_validos = ""
+    if info_categoria["ejemplos_si"]:
+        ejemplos_validos = "EJEMPLOS VÁLIDOS (SI): " + ", ".join(info_categoria["ejemplos_si"])
+    
+    ejemplos_invalidos = ""
+    if info_categoria["ejemplos_no"]:
+        ejemplos_invalidos = "EJEMPLOS INVÁLIDOS (NO):\n"
+        for ej, razon in info_categoria["ejemplos_no"]:
+            ejemplos_invalidos += f'   - "{ej}" → NO ({razon})\n'
+    
+    return ejemplos_validos, ejemplos_invalidos
+
+# ==========================================================
+# PLANTILLAS
+# ==========================================================
+_HUECO = re.compile("\x00([A-Za-z_]+)\x00")
+
+def hueco(nombre):
+    """Marca de un hueco de la plantilla (no puede aparecer en las definiciones)"""
+    return f"\x00{nombre}\x00"
+
+class PlantillaPrompt:
+    """
+    Texto con huecos ya partido en trozos fijos: rellenar() solo intercala
+    los valores. `letra` se rellena a la vez como "letra" y, en mayúsculas,
+    como "LETRA" (el prompt usa las dos).
+    """
+
+    def __init__(self, texto):
+        partes = _HUECO.split(texto)
+        self.fijos = partes[0::2]
+        self.huecos = partes[1::2]
+
+    def rellenar(self, valores):
+        trozos = [self.fijos[0]]
+        for nombre, fijo in zip(self.huecos, self.fijos[1:]):
+            trozos.append(valores[nombre])
+            trozos.append(fijo)
+        return "".join(trozos)
+
+def renderizar_prompt_validacion(respuesta, categoria, letra, pista_ortografia=""):
+    """Prompt de una respuesta formateado desde cero (lo que se precompila por categoría)"""
+    articulo, info_categoria = datos_categoria_validacion(categoria)
+    ejemplos_validos, ejemplos_invalidos = formatear_ejemplos_validacion(info_categoria)
+    
+    verificacion_existencia = ""
+    if info_categoria["requiere_existencia"]:
+        verificacion_existencia = f"""
+⚠️ VERIFICACIÓN DE EXISTENCIA (CRÍTICO):
+- "{respuesta}" DEBE EXISTIR en la realidad
+- Si NO reconoces que existe o tienes dudas → responde NO
+- NO aceptar nombres/títulos inventados, modificados o mal escritos
+- Si parece inventado o no lo puedes verificar → NO"""
+    
+    prompt = f"""Eres un validador ESTRICTO del juego "BASTA/Stop". 
+
+══════════════════════════════════════════════════════════
+PREGUNTA: ¿"{respuesta}" es {articulo} {categoria} válido/a que empieza con "{letra}"? 
+══════════════════════════════════════════════════════════
+{pista_ortografia}
+DEFINICIÓN DE "{categoria. upper()}": {info_categoria["definicion"]}
+
+{info_categoria["reglas_extra"]}
+
+══════════════════════════════════════════════════════════
+PROCESO DE VALIDACIÓN (sigue TODOS los pasos en orden):
+══════════════════════════════════════════════════════════
+
+PASO 1 - ¿ES UNA PALABRA/NOMBRE VÁLIDO Y BIEN ESCRITO?
+- ¿Está correctamente escrita sin errores ortográficos?
+- La CAPITALIZACIÓN NO IMPORTA (ignorar mayúsculas/minúsculas)
+- RECHAZA INMEDIATAMENTE si:
+  * Parece inventada o sin sentido: "Sasd", "asdas", "Xyzabc"
+  * Está mal escrita: "NONDON" (sería Londres), "Mécsico" (sería México)  
+  * Es combinación sin sentido: "Nohay", "NOse", "Nomanches"
+  * Tiene letras repetidas excesivas: "Holaaaaaa", "Siiiii"
+
+PASO 2 - ¿CORRESPONDE A LA CATEGORÍA "{categoria. upper()}"?
+- "{respuesta}" DEBE ser específicamente: {info_categoria["definicion"]}
+- NO debe ser otra cosa (país cuando piden fruta, objeto cuando piden animal, etc.)
+- Si es claramente OTRA categoría → NO
+{verificacion_existencia}
+
+PASO 3 - ¿EMPIEZA CON LA LETRA "{letra. upper()}"?
+- La primera letra (ignorando acentos) debe ser "{letra.upper()}"
+- Acentos no afectan: "Ángel" empieza con A, "Élefante" empieza con E
+
+══════════════════════════════════════════════════════════
+EJEMPLOS PARA "{categoria.upper()}":
+══════════════════════════════════════════════════════════
+{ejemplos_validos}
+
+{ejemplos_invalidos}
+
+══════════════════════════════════════════════════════════
+POLÍTICA: MUY ESTRICTO - ANTE LA DUDA, RECHAZAR
+══════════════════════════════════════════════════════════
+- Si no estás 100% seguro de que existe → NO
+- Si el nombre/título parece modificado o incorrecto → NO
+- Si no reconoces que es real → NO
+- Si hay CUALQUIER duda → NO
+- Es mejor rechazar 10 dudosas que aceptar 1 incorrecta
+
+══════════════════════════════════════════════════════════
+RESPUESTA REQUERIDA:
+══════════════════════════════════════════════════════════
+Responde ÚNICAMENTE con este JSON, sin texto adicional:
+{{"valida": true/false, "razon": "explicación breve", "confianza": 0.0-1.0}}
+"""
+    
+    return prompt
+
+def renderizar_prompt_lote(lista, total, categoria, letra, pista_ortografia=""):
+    """Prompt de un lote formateado desde cero (lo que se precompila por categoría)"""
+    articulo, info_categoria = datos_categoria_validacion(categoria)
+    ejemplos_validos, ejemplos_invalidos = formatear_ejemplos_validacion(info_categoria)
+    
+    verificacion_existencia = ""
+    if info_categoria["requiere_existencia"]:
+        verificacion_existencia = """
+⚠️ VERIFICACIÓN DE EXISTENCIA (CRÍTICO):
+- Cada respuesta DEBE EXISTIR en la realidad
+- Si NO reconoces que existe o tienes dudas → NO
+- NO aceptar nombres/títulos inventados, modificados o mal escritos"""
+    
+    prompt = f"""Eres un validador ESTRICTO del juego "BASTA/Stop". 
+
+══════════════════════════════════════════════════════════
+PREGUNTA: ¿Cuáles de estas {total} respuestas son {articulo} {categoria} válido/a que empieza con "{letra}"? 
+══════════════════════════════════════════════════════════
+{lista}
+
+DEFINICIÓN DE "{categoria.upper()}": {info_categoria["definicion"]}
+
+{info_categoria["reglas_extra"]}
+
+══════════════════════════════════════════════════════════
+PROCESO DE VALIDACIÓN (para CADA respuesta, por separado):
+══════════════════════════════════════════════════════════
+PASO 1 - ¿Es una palabra/nombre real y bien escrito? (la capitalización NO importa;
+  rechaza lo inventado, mal escrito o con letras repetidas: "Sasd", "NONDON", "Siiiii")
+PASO 2 - ¿Es específicamente: {info_categoria["definicion"]}? Si es OTRA categoría → NO
+{verificacion_existencia}
+PASO 3 - ¿Empieza con la letra "{letra.upper()}"? (ignorando acentos)
+{pista_ortografia}
+{ejemplos_validos}
+
+{ejemplos_invalidos}
+POLÍTICA: MUY ESTRICTO - ANTE LA DUDA, RECHAZAR. Cada respuesta se juzga sola,
+sin compararla con las demás.
+
+Responde ÚNICAMENTE con un array JSON de {total} objetos, uno por respuesta y en el mismo orden:
+[{{"n": 1, "valida": true/false, "razon": "explicación breve", "confianza": 0.0-1.0}}, ...]
+"""
+    
+    return prompt
+
+@lru_cache(maxsize=256)
+def plantilla_validacion(categoria):
+    return PlantillaPrompt(renderizar_prompt_validacion(hueco("respuesta"), categoria, hueco("letra"), hueco("pista")))
+
+@lru_cache(maxsize=256)
+def plantilla_validacion_lote(categoria):
+    return PlantillaPrompt(renderizar_prompt_lote(hueco("lista"), hueco("total"), categoria, hueco("letra"), hueco("pista")))
+
+def generar_prompt_validacion(respuesta, categoria, letra, sugerencia=None):
+    """
+    Prompt de validación de una respuesta con las reglas específicas de su categoría.
+    `sugerencia`: (palabra conocida parecida, distancia) del léxico local, si la hay
+    """
+    pista_ortografia = ""
+    if sugerencia:
+        pista_ortografia = (f'🔎 PISTA: "{respuesta}" se parece a "{sugerencia[0]}" ({sugerencia[1]} letra(s) de diferencia). '
+                            f'Si es esa palabra mal escrita → NO; si es otra palabra real, júzgala normalmente.\n')
+    return plantilla_validacion(categoria).rellenar({
+        "respuesta": respuesta, "letra": letra, "LETRA": letra.upper(), "pista": pista_ortografia
+    })
+
+def generar_prompt_validacion_lote(respuestas, categoria, letra, sugerencias=None):
+    """
+    Prompt para validar de una vez varias respuestas de la misma categoría y
+    letra: las reglas y ejemplos de la categoría van una sola vez y se pide un
+    array JSON con un veredicto por respuesta (numeradas desde 1).
+    `sugerencias`: {respuesta: (palabra conocida parecida, distancia)} del léxico local
+    """
+    sugerencias = sugerencias or {}
+    lista = "\n".join(
+        f'{i}. "{respuesta}"' + (f' (¿"{sugerencias[respuesta][0]}"?)' if respuesta in sugerencias else "")
+        for i, respuesta in enumerate(respuestas, 1)
+    )
+    pista_ortografia = ""
+    if sugerencias:
+        pista_ortografia = ('Las marcadas con (¿"..."?) se parecen a esa palabra conocida: '
+                            'si son esa palabra mal escrita → NO; si son otra palabra real, júzgalas normalmente.\n')
+    return plantilla_validacion_lote(categoria).rellenar({
+        "lista": lista, "total": str(len(respuestas)), "letra": letra, "LETRA": letra.upper(), "pista": pista_ortografia
+    })
+
+# ==========================================================
+# MODO COMPACTO: PROMPT CORTO Y SALIDA JSON CON ESQUEMA
+# ==========================================================
+SYSTEM_PROMPT_COMPACTO = """Juez del juego BASTA/Stop. Una respuesta vale solo si existe de verdad, \
+está bien escrita, es de la categoría pedida y empieza por la letra (sin contar acentos ni mayúsculas). \
+Inventada, mal escrita, de otra categoría o dudosa: no vale. razon: 2-6 palabras."""
+
+_VEREDICTO = {
+    "valida": {"type": "boolean"},
+    "confianza": {"type": "number"},
+    "razon": {"type": "string"},
+}
+
+def _formato_json(nombre, propiedades):
+    """response_format de OpenAI con esquema estricto"""
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": nombre,
+            "strict": True,
+            "schema": {"type": "object", "properties": propiedades,
+                       "required": list(propiedades), "additionalProperties": False},
+        },
+    }
+
+FORMATO_COMPACTO = _formato_json("veredicto", _VEREDICTO)
+FORMATO_COMPACTO_LOTE = _formato_json("veredictos", {
+    "veredictos": {
+        "type": "array",
+        "items": {"type": "object", "properties": {"n": {"type": "integer"}, **_VEREDICTO},
+                  "required": ["n", *_VEREDICTO], "additionalProperties": False},
+    },
+})
+
+def renderizar_prompt_compacto(respuesta, categoria, letra, pista_ortografia=""):
+    _, info_categoria = datos_categoria_validacion(categoria)
+    return (f'Categoría: {categoria} ({info_categoria["definicion"]})\n'
+            f'Letra: {letra.upper()}\n'
+            f'Respuesta: "{respuesta}"\n{pista_ortografia}')
+
+def renderizar_prompt_compacto_lote(lista, categoria, letra, pista_ortografia=""):
+    _, info_categoria = datos_categoria_validacion(categoria)
+    return (f'Categoría: {categoria} ({info_categoria["definicion"]})\n'
+            f'Letra: {letra.upper()}\n'
+            f'Respuestas (un veredicto por cada una, con su n):\n{lista}\n{pista_ortografia}')
+
+@lru_cache(maxsize=256)
+def plantilla_compacta(categoria):
+    return PlantillaPrompt(renderizar_prompt_compacto(hueco("respuesta"), categoria, hueco("letra"), hueco("pista")))
+
+@lru_cache(maxsize=256)
+def plantilla_compacta_lote(categoria):
+    return PlantillaPrompt(renderizar_prompt_compacto_lote(hueco("lista"), categoria, hueco("letra"), hueco("pista")))
+
+def generar_prompt_compacto(respuesta, categoria, letra, sugerencia=None):
+    """Versión corta de generar_prompt_validacion (las reglas van en SYSTEM_PROMPT_COMPACTO)"""
+    pista_ortografia = f'Se parece a "{sugerencia[0]}": si es esa palabra mal escrita, no vale.\n' if sugerencia else ""
+    return plantilla_compacta(categoria).rellenar({
+        "respuesta": respuesta, "LETRA": letra.upper(), "pista": pista_ortografia
+    })
+
+def generar_prompt_compacto_lote(respuestas, categoria, letra, sugerencias=None):
+    """Versión corta de generar_prompt_validacion_lote"""
+    sugerencias = sugerencias or {}
+    lista = "\n".join(
+        f'{i}. "{respuesta}"' + (f' (¿"{sugerencias[respuesta][0]}"?)' if respuesta in sugerencias else "")
+        for i, respuesta in enumerate(respuestas, 1)
+    )
+    pista_ortografia = "(¿\"...\"?): si es esa palabra mal escrita, no vale.\n" if sugerencias else ""
+    return plantilla_compacta_lote(categoria).rellenar({
+        "lista": lista, "LETRA": letra.upper(), "pista": pista_ortografia
+    })
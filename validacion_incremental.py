@@ -0,0 +1,169 @@
+"""
+Validación incremental: las respuestas se validan en segundo plano a medida
+que los jugadores las escriben durante la ronda, así al final de la ronda
+solo quedan por validar las que llegaron en el último momento.
+
+Los veredictos no se guardan aquí sino en la caché compartida de
+validaciones (la función `validar` ya los deja ahí); este módulo solo decide
+qué validar, evita repetir trabajo y permite esperar a lo que está en curso.
+Además de la cola respuesta a respuesta, acepta lotes (ver lanzar) para
+validar de golpe lo que hay en la sala cuando alguien grita ¡BASTA!.
+"""
+import queue
+import threading
+import time
+
+
+class ValidadorIncremental:
+    """
+    Cola de respuestas pendientes atendida por `hilos` trabajadores. Cada
+    respuesta se identifica por su clave de validación: si ya tiene veredicto
+    (`conocida(clave)`) o ya está en la cola o en curso, no se vuelve a encolar.
+    """
+
+    def __init__(self, validar, conocida, hilos=4):
+        self.validar = validar
+        self.conocida = conocida
+        self.hilos = hilos
+        self._cola = queue.Queue()
+        self._en_curso = {}  # {clave: threading.Event que se activa al terminar}
+        self._iniciadas = set()  # Claves de _en_curso que un trabajador ya está validando
+        self._lock = threading.Lock()
+        self._trabajadores = []
+        self.metricas = {
+            "encoladas": 0,
+            "lanzadas": 0,
+            "ya_conocidas": 0,
+            "repetidas": 0,
+            "validadas": 0,
+            "errores": 0,
+            "segundos_validando": 0.0,
+            "retiradas": 0,
+            "esperadas": 0,
+            "segundos_esperando": 0.0,
+        }
+
+    def iniciar(self):
+        with self._lock:
+            while len(self._trabajadores) < self.hilos:
+                hilo = threading.Thread(target=self._bucle, daemon=True)
+                hilo.start()
+                self._trabajadores.append(hilo)
+
+    def encolar(self, clave, *args):
+        """Valida `validar(*args)` en segundo plano salvo que ya se conozca o esté en curso"""
+        with self._lock:
+            if clave in self._en_curso:
+                self.metricas["repetidas"] += 1
+                return False
+            if self.conocida(clave):
+                self.metricas["ya_conocidas"] += 1
+                return False
+            self._en_curso[clave] = threading.Event()
+            self.metricas["encoladas"] += 1
+        self._cola.put((clave, args))
+        return True
+
+    def _bucle(self):
+        while True:
+            clave, args = self._cola.get()
+            with self._lock:
+                if clave not in self._en_curso or clave in self._iniciadas:
+                    continue  # Retirada (ver reclamar) o encolada dos veces
+                self._iniciadas.add(clave)
+            inicio = time.perf_counter()
+            try:
+                self.validar(*args)
+                self.metricas["validadas"] += 1
+            except Exception as e:
+                print(f"⚠️ Error en validación incremental de {clave}: {e}")
+                self.metricas["errores"] += 1
+            finally:
+                self.metricas["segundos_validando"] += time.perf_counter() - inicio
+                with self._lock:
+                    self._iniciadas.discard(clave)
+                    evento = self._en_curso.pop(clave, None)
+                if evento is not None:
+                    evento.set()
+
+    def lanzar(self, trabajos, funcion):
+        """
+        Valida de una vez, en un hilo aparte, los trabajos {clave: item} que no
+        tengan veredicto ni estén ya en curso: llama a `funcion(items)`. Las
+        claves que esperaban en la cola pasan a este lote. Mientras dura, sus
+        claves cuentan como en curso (ver reclamar). Devuelve cuántas tomó.
+        """
+        tomadas = {}
+        with self._lock:
+            for clave, item in trabajos.items():
+                if clave in self._iniciadas:
+                    continue
+                if clave not in self._en_curso:
+                    if self.conocida(clave):
+                        continue
+                    self._en_curso[clave] = threading.Event()
+                self._iniciadas.add(clave)
+                tomadas[clave] = item
+            self.metricas["lanzadas"] += len(tomadas)
+        if tomadas:
+            threading.Thread(target=self._ejecutar_lote, args=(tomadas, funcion), daemon=True).start()
+        return len(tomadas)
+
+    def _ejecutar_lote(self, tomadas, funcion):
+        inicio = time.perf_counter()
+        try:
+            funcion(list(tomadas.values()))
+            self.metricas["validadas"] += len(tomadas)
+        except Exception as e:
+            print(f"⚠️ Error validando un lote de {len(tomadas)} respuestas: {e}")
+            self.metricas["errores"] += 1
+        finally:
+            self.metricas["segundos_validando"] += time.perf_counter() - inicio
+            with self._lock:
+                eventos = []
+                for clave in tomadas:
+                    self._iniciadas.discard(clave)
+                    evento = self._en_curso.pop(clave, None)
+                    if evento is not None:
+                        eventos.append(evento)
+            for evento in eventos:
+                evento.set()
+
+    def reclamar(self, claves, limite):
+        """
+        Al final de la ronda: retira de la cola las claves de `claves` que aún
+        no empezaron (las valida quien llama, junto con el resto) y espera
+        hasta `limite` segundos a las que ya están en curso, para no pedirlas
+        dos veces a la IA. Devuelve (esperadas, retiradas).
+        """
+        eventos = []
+        retiradas = 0
+        with self._lock:
+            for clave in claves:
+                if clave not in self._en_curso:
+                    continue
+                if clave in self._iniciadas:
+                    eventos.append(self._en_curso[clave])
+                else:
+                    self._en_curso.pop(clave).set()
+                    retiradas += 1
+            self.metricas["retiradas"] += retiradas
+            self.metricas["esperadas"] += len(eventos)
+        if eventos:
+            inicio = time.perf_counter()
+            fin = time.monotonic() + limite
+            for evento in eventos:
+                if not evento.wait(max(0.0, fin - time.monotonic())):
+                    break
+            self.metricas["segundos_esperando"] += time.perf_counter() - inicio
+        return len(eventos), retiradas
+
+    def estado(self):
+        return {
+            **self.metricas,
+            "segundos_validando": round(self.metricas["segundos_validando"], 2),
+            "segundos_esperando": round(self.metricas["segundos_esperando"], 2),
+            "pendientes": len(self._en_curso) - len(self._iniciadas),
+            "en_curso": len(self._iniciadas),
+            "hilos": self.hilos,
+        }
@@ -0,0 +1,120 @@
+"""
+Llamadas a la IA en curso compartidas por todas las salas del proceso: si
+varias salas con la misma letra terminan a la vez, todas preguntan por
+"Roma" en "País o ciudad" antes de que haya nada en la caché. Con este
+registro la primera que pregunta hace la llamada y las demás esperan su
+resultado en vez de repetirla.
+"""
+import threading
+
+
+class _Vuelo:
+    """Una llamada en curso: quien la hace la termina y despierta a los que esperan"""
+    __slots__ = ("evento", "resultado", "error", "esperando")
+
+    def __init__(self):
+        self.evento = threading.Event()
+        self.resultado = None
+        self.error = None
+        self.esperando = 0
+
+
+class LlamadasEnCurso:
+    """
+    Registro {clave: llamada en curso}. Un resultado None significa "sin
+    veredicto" (p. ej. un lote que no cubrió esa respuesta): quien esperaba
+    hace entonces su propia llamada. Quien espera más de `espera_max`
+    segundos deja de esperar y también la hace. Con `activo=False` cada uno
+    hace su llamada (para comparar).
+    """
+
+    def __init__(self, espera_max=30.0, activo=True):
+        self.espera_max = espera_max
+        self.activo = activo
+        self._vuelos = {}
+        self._lock = threading.Lock()
+        self.metricas = {
+            "propias": 0,
+            "compartidas": 0,
+            "sin_resultado": 0,
+            "esperas_agotadas": 0,
+            "errores": 0,
+            "max_esperando": 0,
+        }
+
+    def tomar(self, claves):
+        """
+        Reserva las claves libres. Devuelve (propias, ajenas): las propias hay
+        que terminarlas siempre con terminar(); las ajenas ({clave: vuelo}) ya
+        las está pidiendo otro y se esperan con esperar().
+        """
+        propias, ajenas = [], {}
+        if not self.activo:
+            return list(dict.fromkeys(claves)), ajenas
+        with self._lock:
+            for clave in claves:
+                vuelo = self._vuelos.get(clave)
+                if clave in propias:
+                    continue  # Repetida en la misma petición
+                if vuelo is None:
+                    self._vuelos[clave] = _Vuelo()
+                    propias.append(clave)
+                    self.metricas["propias"] += 1
+                elif clave not in ajenas:
+                    vuelo.esperando += 1
+                    ajenas[clave] = vuelo
+                    self.metricas["compartidas"] += 1
+                    self.metricas["max_esperando"] = max(self.metricas["max_esperando"], vuelo.esperando)
+        return propias, ajenas
+
+    def terminar(self, clave, resultado=None, error=None):
+        """Publica el resultado (o la excepción) de una clave propia y la libera"""
+        if not self.activo:
+            return
+        with self._lock:
+            vuelo = self._vuelos.pop(clave, None)
+            if error is not None:
+                self.metricas["errores"] += 1
+        if vuelo is not None:
+            vuelo.resultado = resultado
+            vuelo.error = error
+            vuelo.evento.set()
+
+    def esperar(self, vuelo):
+        """Resultado de una llamada ajena; None si no lo hubo o si se agotó la espera"""
+        if not vuelo.evento.wait(self.espera_max):
+            self.metricas["esperas_agotadas"] += 1
+            return None
+        if vuelo.error is not None:
+            raise vuelo.error
+        if vuelo.resultado is None:
+            self.metricas["sin_resultado"] += 1
+        return vuelo.resultado
+
+    def ejecutar(self, clave, funcion, *args, **kwargs):
+        """
+        funcion(*args, **kwargs) una sola vez para todos los que la pidan a la
+        vez con la misma clave. `funcion` no debe devolver None.
+        """
+        while True:
+            propias, ajenas = self.tomar([clave])
+            if propias:
+                break
+            vuelo = ajenas[clave]
+            resultado = self.esperar(vuelo)
+            if resultado is not None:
+                return resultado
+            if not vuelo.evento.is_set():
+                # Espera agotada y la otra llamada sigue en curso: se llama sin registrarla
+                return funcion(*args, **kwargs)
+        try:
+            resultado = funcion(*args, **kwargs)
+        except BaseException as e:
+            self.terminar(clave, error=e)
+            raise
+        self.terminar(clave, resultado)
+        return resultado
+
+    def estado(self):
+        with self._lock:
+            return {**self.metricas, "en_curso": len(self._vuelos)}